@@ -5,6 +5,7 @@ from django.conf import settings
 import uuid
 import os
 from django.core.exceptions import ValidationError
+from .utils.field_tracking import FieldTrackerMixin
 
 try:
     from .utils.email_service import AdvancedEmailService
@@ -67,7 +68,9 @@ def user_profile_image_path(instance, filename):
     filename = f'profile_{instance.id}_{uuid.uuid4().hex[:8]}.{ext}'
     return f'users/{instance.id}/profile/{filename}'
 
-class User(AbstractUser):
+class User(FieldTrackerMixin, AbstractUser):
+    tracked_fields = ('profile_image',)
+    
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     address = models.CharField(max_length=100, blank=True, null=True)
@@ -97,16 +100,25 @@ class User(AbstractUser):
     
     def save(self, *args, **kwargs):
         # Delete old profile image when new one is uploaded
-        if self.pk:
-            try:
-                old_instance = User.objects.get(pk=self.pk)
-                if old_instance.profile_image and old_instance.profile_image != self.profile_image:
-                    if os.path.isfile(old_instance.profile_image.path):
-                        os.remove(old_instance.profile_image.path)
-            except User.DoesNotExist:
-                pass
+        update_fields = kwargs.get('update_fields')
+        if self.pk and (update_fields is None or 'profile_image' in update_fields):
+            self._delete_replaced_profile_image()
         super().save(*args, **kwargs)
     
+    def _delete_replaced_profile_image(self):
+        """Remove the previous profile image file if it is being replaced"""
+        if self.has_original('profile_image'):
+            # Loaded from the database: compare with the snapshot, no query needed
+            old_name = self.get_original('profile_image')
+        else:
+            old_name = User.objects.filter(pk=self.pk).values_list('profile_image', flat=True).first()
+        
+        if not old_name or old_name == self.profile_image.name:
+            return
+        old_path = self.profile_image.storage.path(old_name)
+        if os.path.isfile(old_path):
+            os.remove(old_path)
+    
     def get_profile_image_url(self):
         """Get profile image URL or return default"""
         if self.profile_image and hasattr(self.profile_image, 'url'):
@@ -1,3 +1,29 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .models import User
+
+
+class UserDirtyFieldTrackingTests(TestCase):
+    """User.save compares profile_image with the loaded snapshot"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='member', email='member@example.com', password='secret'
+        )
+
+    def test_update_last_login_is_a_single_update(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.update_last_login()
+
+    def test_save_loaded_user_runs_no_extra_select(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Changed'
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_profile_image_change_detected_from_snapshot(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.has_changed('profile_image'))
+        user.profile_image = 'users/1/profile/new.png'
+        self.assertTrue(user.has_changed('profile_image'))
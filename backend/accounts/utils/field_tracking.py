@@ -0,0 +1,80 @@
+# backend/accounts/utils/field_tracking.py
+"""
+Dirty-field tracking for models.
+
+Remembers the values a model instance had when it was loaded from the
+database, so save() overrides and signal handlers can see what changed
+without running another SELECT for the same row.
+"""
+import copy
+from django.db.models import FileField
+
+
+class FieldTrackerMixin:
+    """
+    Model mixin that snapshots ``tracked_fields`` when an instance is loaded.
+
+    Usage:
+        class Transaction(FieldTrackerMixin, models.Model):
+            tracked_fields = ('status', 'amount')
+
+    The snapshot is refreshed after every save() and refresh_from_db(), so
+    it always reflects what is currently stored in the database. Fields that
+    were deferred (``.only()`` / ``.defer()``) are not tracked until they
+    are loaded.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._store_original_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._store_original_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._store_original_values(fields)
+
+    def has_original(self, field_name):
+        """Return True if the loaded value of field_name is known."""
+        return field_name in self.__dict__.get('_original_values', {})
+
+    def get_original(self, field_name, default=None):
+        """Return the value field_name had in the database (attname value for FKs)."""
+        return self.__dict__.get('_original_values', {}).get(field_name, default)
+
+    def has_changed(self, field_name):
+        """Return True if field_name differs from the loaded value (or is unknown)."""
+        if not self.has_original(field_name):
+            return True
+        return self._current_value(field_name) != self.get_original(field_name)
+
+    def get_changed_fields(self):
+        """Return the names of tracked fields whose values differ from the loaded ones."""
+        return [name for name in self.tracked_fields if self.has_changed(name)]
+
+    def _current_value(self, field_name):
+        field = self._meta.get_field(field_name)
+        value = getattr(self, field.attname)
+        if isinstance(field, FileField):
+            return value.name or None
+        if isinstance(value, (list, dict)):
+            # Copied, so in-place edits of JSON values show up as changes
+            return copy.deepcopy(value)
+        return value
+
+    def _store_original_values(self, field_names=None):
+        deferred = self.get_deferred_fields()
+        originals = self.__dict__.setdefault('_original_values', {})
+        for name in self.tracked_fields:
+            attname = self._meta.get_field(name).attname
+            if field_names is not None and name not in field_names and attname not in field_names:
+                continue
+            if attname in deferred:
+                originals.pop(name, None)
+                continue
+            originals[name] = self._current_value(name)
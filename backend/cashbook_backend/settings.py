@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from decouple import config
 from pathlib import Path
@@ -179,4 +180,59 @@ DEFAULT_FROM_EMAIL = 'jitendrakhadka444@gmail.com'
 SUPPORT_EMAIL = 'nishanaweb@gmail.com'
 # ===============================================================
 
-FRONTEND_URL = 'http://192.168.0.92:3000'
\ No newline at end of file
+FRONTEND_URL = 'http://192.168.0.92:3000'
+# Transactions
+# Rows per INSERT when bulk creating transactions
+TRANSACTION_BULK_CREATE_BATCH_SIZE = 1000
+# Rows validated and inserted per chunk by the CSV/XLSX import
+TRANSACTION_IMPORT_CHUNK_SIZE = 1000
+
+# Store access
+# Seconds a user's cached {store_id: role} map is kept between requests
+# (only when the store access cache is shared between workers, see below)
+STORE_ACCESS_CACHE_TIMEOUT = 60
+# Cache alias holding the store access maps
+STORE_ACCESS_CACHE = 'store_access'
+
+# Caches
+# The 'store_access' alias holds the users' store access maps and must be
+# shared by every worker, or a revoked membership could be served by the
+# workers that didn't see the change. The file based default is shared by
+# the workers of one host; with several hosts use a cache all of them
+# reach, e.g.
+#   STORE_ACCESS_CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+#   STORE_ACCESS_CACHE_LOCATION=cashbook_store_access_cache
+# A local-memory cache is accepted, but then store access is only cached
+# per request.
+#
+# Transaction reports (summary, by_category, by_type, ...) are cached in
+# the 'reports' alias, also file based by default so every worker sees the
+# same entries, generations and hit/miss counters. Override it with e.g.
+#   REPORT_CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+#   REPORT_CACHE_LOCATION=cashbook_report_cache
+# (the entrypoint runs `python manage.py createcachetable`). Local memory
+# only suits a single process: other workers would serve their stale
+# reports until TRANSACTION_REPORT_CACHE_TIMEOUT.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'store_access': {
+        'BACKEND': config(
+            'STORE_ACCESS_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': config(
+            'STORE_ACCESS_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'cashbook_backend', 'store_access')
+        ),
+    },
+    'reports': {
+        'BACKEND': config('REPORT_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config(
+            'REPORT_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'cashbook_backend', 'reports')
+        ),
+    },
+}
+# Cache alias and entry lifetime (seconds) for transaction reports
+TRANSACTION_REPORT_CACHE = 'reports'
+TRANSACTION_REPORT_CACHE_TIMEOUT = 300
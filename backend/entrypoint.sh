@@ -4,6 +4,9 @@ set -e
 echo "📦 Running migrations..."
 python manage.py migrate --noinput
 
+echo "🗄️ Creating cache tables..."
+python manage.py createcachetable
+
 echo "📂 Collecting static files..."
 python manage.py collectstatic --noinput || true
 
@@ -0,0 +1,115 @@
+# backend/store/access.py
+"""
+Store access resolution.
+
+A user's store memberships are loaded as a {store_id: role} map once per
+request and kept on the user object, so every permission check after the
+first is a dictionary lookup. When the STORE_ACCESS_CACHE alias is shared
+between processes (see CACHES in settings) the map is also kept there
+between requests, and StoreUser save/delete signals invalidate it.
+
+A per-process cache (local memory, dummy) is never used across requests:
+a signal only reaches the worker that made the change, so another worker
+would keep granting a revoked membership until the entry expired. Those
+setups load the map once per request instead.
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+ROLE_OWNER = 'owner'
+ROLE_MANAGER = 'manager'
+ROLE_STAFF = 'staff'
+
+# Roles allowed to manage a store's users and cashbooks
+MANAGER_ROLES = (ROLE_OWNER, ROLE_MANAGER)
+
+# Attribute the per-request map is kept under on the user object
+_USER_ATTRIBUTE = '_store_roles'
+
+
+def _cache_key(user_id):
+    return f'store_access:{user_id}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_ACCESS_CACHE', DEFAULT_CACHE_ALIAS)]
+
+
+def is_shared_cache(backend):
+    """Whether writes to a cache backend are seen by every worker process"""
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+
+def get_store_roles(user):
+    """
+    Return the {store_id: role} map for a user.
+    Anonymous users have no memberships.
+    """
+    if user is None or not user.is_authenticated:
+        return {}
+
+    roles = getattr(user, _USER_ATTRIBUTE, None)
+    if roles is None:
+        key = _cache_key(user.pk)
+        cache = get_cache()
+        shared = is_shared_cache(cache)
+        roles = cache.get(key) if shared else None
+        if roles is None:
+            from .models import StoreUser
+            roles = dict(
+                StoreUser.objects.filter(user_id=user.pk).values_list('store_id', 'role')
+            )
+            if shared:
+                cache.set(key, roles, getattr(settings, 'STORE_ACCESS_CACHE_TIMEOUT', 60))
+        setattr(user, _USER_ATTRIBUTE, roles)
+    return roles
+
+
+def get_store_ids(user):
+    """Return the ids of the stores a user is assigned to"""
+    return list(get_store_roles(user))
+
+
+def get_store_role(user, store_id):
+    """Return the user's role in a store, or None without access"""
+    try:
+        store_id = int(store_id)
+    except (TypeError, ValueError):
+        return None
+    return get_store_roles(user).get(store_id)
+
+
+def has_store_access(user, store_id, roles=None):
+    """
+    Check whether a user is assigned to a store.
+
+    Args:
+        user: User to check
+        store_id: Store primary key (int or numeric string)
+        roles: Optional iterable of roles the user must have
+    """
+    role = get_store_role(user, store_id)
+    if role is None:
+        return False
+    return roles is None or role in roles
+
+
+def invalidate_store_access(user_id, user=None):
+    """
+    Drop a user's cached memberships.
+    Runs again on commit, so a request that reloads the map before the
+    change is committed can't leave stale data in the cache.
+
+    Args:
+        user_id: Primary key of the user whose memberships changed
+        user: Optional loaded user object whose per-request map is cleared too
+    """
+    key = _cache_key(user_id)
+    cache = get_cache()
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+    if user is not None:
+        user.__dict__.pop(_USER_ATTRIBUTE, None)
@@ -127,8 +127,12 @@ class CashbookAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        # Optimize queryset to reduce database queries
-        return super().get_queryset(request).select_related('store')
+        # Optimize queryset to reduce database queries: balance totals for
+        # every listed cashbook come from one GROUP BY query
+        from transactions.balance import annotate_balance_reports
+        return annotate_balance_reports(
+            super().get_queryset(request).select_related('store')
+        )
     
     def calculated_balance(self, obj):
         """Display calculated balance in list view"""
@@ -241,13 +245,9 @@ class CashbookAdmin(admin.ModelAdmin):
     def transaction_count_display(self, obj):
         """Display transaction counts in detail view"""
         try:
-            from transactions.models import Transaction
-            completed_count = obj.transactions.filter(
-                status=Transaction.STATUS_COMPLETED
-            ).count()
-            pending_count = obj.transactions.filter(
-                status=Transaction.STATUS_PENDING
-            ).count()
+            summary = obj.get_balance_summary()
+            completed_count = summary['transaction_count']
+            pending_count = summary['pending_count']
             total_count = obj.transactions.count()
             
             html = f"""
@@ -1,9 +1,124 @@
 # backend/store/management/commands/recalculate_balances.py
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from store.models import Cashbook
+import time
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+from store.models import Cashbook, Store
+from transactions.balance import annotate_balance_reports, report_from_annotations
+
+
+def _reconcile_store_range(store_range, apply_changes):
+    """
+    Worker entry point: reconcile every cashbook whose store id falls in
+    store_range. Runs in its own process with its own database connection.
+    """
+    connections.close_all()
+    first_store_id, last_store_id = store_range
+    cashbooks = Cashbook.objects.filter(
+        store_id__gte=first_store_id,
+        store_id__lte=last_store_id
+    )
+    return reconcile_cashbooks(cashbooks, apply_changes)
+
+
+# Cashbooks locked and fixed per transaction when applying changes
+RECONCILE_CHUNK_SIZE = 500
+
+
+def reconcile_cashbooks(cashbooks, apply_changes):
+    """
+    Compare stored and expected balances for a set of cashbooks.
+
+    Expected balances for all cashbooks come from one GROUP BY query. The
+    mismatches are then fixed in chunks: each chunk locks its cashbook rows
+    (SELECT ... FOR UPDATE, in id order like the balance flushes), computes
+    the expected balances again under the lock and bulk updates the rows
+    that still differ. A current_balance + delta update committed after the
+    first read is therefore never overwritten with a stale total.
+
+    Returns:
+        dict with counts, timings and the details of every mismatch
+    """
+    started = time.perf_counter()
+    reports = annotate_balance_reports(
+        cashbooks.select_related('store').order_by('id')
+    )
+
+    processed = 0
+    mismatch_ids = []
+    inconsistent = []
+    for cashbook in reports:
+        processed += 1
+        summary = report_from_annotations(cashbook)
+        calculated_balance = summary['calculated_balance']
+        difference = abs(cashbook.current_balance - calculated_balance)
+
+        # Check if there's a significant difference (more than 1 cent)
+        if difference >= Decimal('0.01'):
+            inconsistent.append({
+                'id': cashbook.id,
+                'name': cashbook.name,
+                'store_name': cashbook.store.name,
+                'current_balance': cashbook.current_balance,
+                'calculated_balance': calculated_balance,
+                'difference': difference,
+                'summary': summary,
+            })
+            mismatch_ids.append(cashbook.id)
+    query_time = time.perf_counter() - started
+
+    updated_count = 0
+    started = time.perf_counter()
+    if apply_changes:
+        for index in range(0, len(mismatch_ids), RECONCILE_CHUNK_SIZE):
+            updated_count += _fix_balances(mismatch_ids[index:index + RECONCILE_CHUNK_SIZE])
+    update_time = time.perf_counter() - started
+
+    return {
+        'processed': processed,
+        'inconsistent': inconsistent,
+        'updated': updated_count,
+        'query_time': query_time,
+        'update_time': update_time,
+    }
+
+
+def _fix_balances(cashbook_ids):
+    """Lock the given cashbooks and set the balances that are still wrong"""
+    with transaction.atomic():
+        # FOR UPDATE can't be combined with the GROUP BY, so lock first
+        list(Cashbook.objects.select_for_update().filter(pk__in=cashbook_ids).order_by('id').values_list('id'))
+
+        mismatches = []
+        for cashbook in annotate_balance_reports(Cashbook.objects.filter(pk__in=cashbook_ids)):
+            calculated_balance = report_from_annotations(cashbook)['calculated_balance']
+            if abs(cashbook.current_balance - calculated_balance) >= Decimal('0.01'):
+                cashbook.current_balance = calculated_balance
+                cashbook.updated_at = timezone.now()
+                mismatches.append(cashbook)
+        if not mismatches:
+            return 0
+        return Cashbook.objects.bulk_update(mismatches, ['current_balance', 'updated_at'])
+
+
+def split_store_ranges(store_ids, parts):
+    """Split sorted store ids into at most `parts` contiguous (first, last) ranges"""
+    if not store_ids:
+        return []
+    parts = max(1, min(parts, len(store_ids)))
+    size, remainder = divmod(len(store_ids), parts)
+    ranges = []
+    start = 0
+    for index in range(parts):
+        end = start + size + (1 if index < remainder else 0)
+        ranges.append((store_ids[start], store_ids[end - 1]))
+        start = end
+    return ranges
+
 
 class Command(BaseCommand):
     help = 'Recalculate current_balance for all cashbooks based on transactions'
@@ -29,99 +144,108 @@ class Command(BaseCommand):
             action='store_true',
             help='Only check for inconsistencies without updating',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Split all stores into ranges processed by this many worker processes (default: 1; not with --cashbook-id or --store-id)',
+        )
 
     def handle(self, *args, **options):
         cashbook_id = options.get('cashbook_id')
         store_id = options.get('store_id')
         dry_run = options.get('dry_run')
         check_only = options.get('check_only')
+        workers = max(1, options.get('workers') or 1)
+        apply_changes = not check_only and not dry_run
+
+        if workers > 1 and (cashbook_id or store_id):
+            self.stdout.write(self.style.ERROR(
+                '--workers splits all stores between processes and cannot be combined '
+                'with --cashbook-id or --store-id'
+            ))
+            return
 
         # Get cashbooks to process
+        filters = {}
         if cashbook_id:
-            cashbooks = Cashbook.objects.filter(id=cashbook_id)
-            if not cashbooks.exists():
+            filters['id'] = cashbook_id
+            if not Cashbook.objects.filter(**filters).exists():
                 self.stdout.write(self.style.ERROR(f'Cashbook with ID {cashbook_id} not found'))
                 return
         elif store_id:
-            cashbooks = Cashbook.objects.filter(store_id=store_id)
-            if not cashbooks.exists():
+            filters['store_id'] = store_id
+            if not Cashbook.objects.filter(**filters).exists():
                 self.stdout.write(self.style.ERROR(f'No cashbooks found for store ID {store_id}'))
                 return
-        else:
-            cashbooks = Cashbook.objects.all()
 
-        total_count = cashbooks.count()
-        updated_count = 0
-        inconsistent_count = 0
+        self.stdout.write(f'Processing cashbooks with {workers} worker(s)...\n')
+        started = time.perf_counter()
         errors = []
 
-        self.stdout.write(f'Processing {total_count} cashbook(s)...\n')
-
-        for cashbook in cashbooks:
-            try:
-                with transaction.atomic():
-                    old_balance = cashbook.current_balance
-                    calculated_balance = cashbook.calculate_balance()
-                    difference = abs(old_balance - calculated_balance)
-
-                    # Check if there's a significant difference (more than 1 cent)
-                    if difference >= Decimal('0.01'):
-                        inconsistent_count += 1
-                        
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f'\n[{cashbook.id}] {cashbook.name} ({cashbook.store.name})'
-                            )
-                        )
-                        self.stdout.write(f'  Current Balance: ${old_balance}')
-                        self.stdout.write(f'  Calculated Balance: ${calculated_balance}')
-                        self.stdout.write(
-                            self.style.ERROR(f'  Difference: ${difference}')
-                        )
-
-                        # Show transaction summary
-                        summary = cashbook.get_balance_summary()
-                        self.stdout.write(f'  Initial Balance: ${summary["initial_balance"]}')
-                        self.stdout.write(f'  Total Income: ${summary["total_income"]}')
-                        self.stdout.write(f'  Total Expense: ${summary["total_expense"]}')
-                        self.stdout.write(f'  Total Transfer: ${summary["total_transfer"]}')
-                        self.stdout.write(f'  Transaction Count: {summary["transaction_count"]}')
-
-                        if not check_only and not dry_run:
-                            cashbook.current_balance = calculated_balance
-                            cashbook.save()
-                            updated_count += 1
-                            self.stdout.write(
-                                self.style.SUCCESS('  ✓ Updated')
-                            )
-                        elif dry_run:
-                            self.stdout.write('  → Would update (dry-run mode)')
-                        elif check_only:
-                            self.stdout.write('  → Inconsistency detected (check-only mode)')
-                    else:
-                        # Balance is accurate
-                        if options.get('verbosity', 1) >= 2:
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f'[{cashbook.id}] {cashbook.name} - Balance OK (${old_balance})'
-                                )
-                            )
-
-            except Exception as e:
-                errors.append((cashbook.id, cashbook.name, str(e)))
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'\n[{cashbook.id}] {cashbook.name} - ERROR: {str(e)}'
-                    )
+        results = []
+        if workers == 1:
+            results.append(reconcile_cashbooks(Cashbook.objects.filter(**filters), apply_changes))
+        else:
+            store_ids = list(Store.objects.order_by('id').values_list('id', flat=True))
+            store_ranges = split_store_ranges(store_ids, workers)
+            # No more processes than there are stores to split
+            workers = max(1, len(store_ranges))
+
+            # Workers use the platform's default start method. Forked ones
+            # must not share the parent's database connection; spawned ones
+            # run django.setup before importing this module, which loads models
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+                futures = {
+                    executor.submit(_reconcile_store_range, store_range, apply_changes): store_range
+                    for store_range in store_ranges
+                }
+                for future, store_range in futures.items():
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        errors.append((store_range, str(e)))
+
+        total_time = time.perf_counter() - started
+
+        total_count = sum(result['processed'] for result in results)
+        updated_count = sum(result['updated'] for result in results)
+        inconsistent = [item for result in results for item in result['inconsistent']]
+        inconsistent_count = len(inconsistent)
+
+        for item in inconsistent:
+            summary = item['summary']
+            self.stdout.write(
+                self.style.WARNING(
+                    f'\n[{item["id"]}] {item["name"]} ({item["store_name"]})'
                 )
+            )
+            self.stdout.write(f'  Current Balance: ${item["current_balance"]}')
+            self.stdout.write(f'  Calculated Balance: ${item["calculated_balance"]}')
+            self.stdout.write(
+                self.style.ERROR(f'  Difference: ${item["difference"]}')
+            )
+            self.stdout.write(f'  Initial Balance: ${summary["initial_balance"]}')
+            self.stdout.write(f'  Total Income: ${summary["total_income"]}')
+            self.stdout.write(f'  Total Expense: ${summary["total_expense"]}')
+            self.stdout.write(f'  Total Transfer: ${summary["total_transfer"]}')
+            self.stdout.write(f'  Transaction Count: {summary["transaction_count"]}')
+
+            if apply_changes:
+                self.stdout.write(self.style.SUCCESS('  ✓ Updated'))
+            elif dry_run:
+                self.stdout.write('  → Would update (dry-run mode)')
+            elif check_only:
+                self.stdout.write('  → Inconsistency detected (check-only mode)')
 
         # Summary
         self.stdout.write('\n' + '=' * 60)
         self.stdout.write(self.style.SUCCESS(f'\nSummary:'))
         self.stdout.write(f'  Total Cashbooks Processed: {total_count}')
         self.stdout.write(f'  Inconsistencies Found: {inconsistent_count}')
-        
-        if not check_only and not dry_run:
+
+        if apply_changes:
             self.stdout.write(self.style.SUCCESS(f'  Balances Updated: {updated_count}'))
         elif dry_run:
             self.stdout.write(self.style.WARNING(f'  Would Update: {inconsistent_count} (dry-run mode)'))
@@ -130,8 +254,18 @@ class Command(BaseCommand):
 
         if errors:
             self.stdout.write(self.style.ERROR(f'\n  Errors: {len(errors)}'))
-            for cashbook_id, name, error in errors:
-                self.stdout.write(f'    - [{cashbook_id}] {name}: {error}')
+            for (first_store_id, last_store_id), error in errors:
+                self.stdout.write(f'    - Stores {first_store_id}-{last_store_id}: {error}')
+
+        # Timing
+        self.stdout.write('\nTiming:')
+        self.stdout.write(f'  Workers: {workers}')
+        if results:
+            query_time = max(result['query_time'] for result in results)
+            update_time = max(result['update_time'] for result in results)
+            self.stdout.write(f'  Balance Query: {query_time:.2f}s (slowest worker)')
+            self.stdout.write(f'  Bulk Update: {update_time:.2f}s (slowest worker)')
+        self.stdout.write(f'  Total: {total_time:.2f}s')
 
         self.stdout.write('=' * 60 + '\n')
 
@@ -140,4 +274,4 @@ class Command(BaseCommand):
                 self.style.WARNING(
                     '\nTo fix these inconsistencies, run without --check-only flag'
                 )
-            )
\ No newline at end of file
+            )
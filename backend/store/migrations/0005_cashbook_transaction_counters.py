@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_store_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashbook',
+            name='completed_transaction_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cashbook',
+            name='pending_transaction_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,8 +1,7 @@
 # backend/store/models.py (updated Cashbook class)
-from django.db import models
-from django.db.models import Sum, Q
-from decimal import Decimal
+from django.db import models, transaction as db_transaction
 from accounts.models import User
+from accounts.utils.field_tracking import FieldTrackerMixin
 
 
 class Store(models.Model):
@@ -29,12 +28,17 @@ class Store(models.Model):
         return self.name
 
 
-class StoreUser(models.Model):
+class StoreUser(FieldTrackerMixin, models.Model):
     ROLE_CHOICES = (
         ('owner', 'Owner'),
         ('manager', 'Manager'),
         ('staff', 'Staff'),
     )
+    
+    # The loaded user is remembered so reassigning a membership also
+    # invalidates the previous user's cached store access
+    tracked_fields = ('user',)
+    
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="store_users")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="user_stores")
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
@@ -60,6 +64,9 @@ class Cashbook(models.Model):
     description = models.TextField(blank=True, null=True)
     initial_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     current_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Maintained by the transaction signals together with current_balance
+    completed_transaction_count = models.IntegerField(default=0, editable=False)
+    pending_transaction_count = models.IntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -83,83 +90,77 @@ class Cashbook(models.Model):
         Calculate the current balance based on initial balance and all completed transactions.
         This method doesn't save - it just returns the calculated balance.
         """
-        from transactions.models import Transaction, TransactionType
-        
-        balance = self.initial_balance
-        
-        # Get all completed transactions
-        transactions = self.transactions.filter(
-            status=Transaction.STATUS_COMPLETED
-        ).select_related('type').order_by('transaction_date', 'created_at')
-        
-        for trans in transactions:
-            amount = Decimal(str(trans.amount))
-            
-            if trans.type.nature == TransactionType.INCOME:
-                balance += amount
-            elif trans.type.nature == TransactionType.EXPENSE:
-                balance -= amount
-            elif trans.type.nature == TransactionType.TRANSFER:
-                balance -= amount
-        
-        return balance
+        from transactions.balance import calculate_balance
+        return calculate_balance(self)
 
     def recalculate_and_save_balance(self):
         """
         Recalculate balance and save the cashbook.
         Use this method when you want to force a balance update.
+        Returns the balance summary the new balance was taken from.
+
+        The cashbook row is locked while the balance is recomputed, so a
+        balance delta written concurrently is either already counted or
+        applied on top of the new balance, never both.
         """
-        self.current_balance = self.calculate_balance()
-        self.save()
+        from transactions.balance import balance_aggregates, build_balance_report
+        from transactions.models import Transaction
 
-    def get_balance_summary(self):
+        with db_transaction.atomic():
+            self.initial_balance = Cashbook.objects.select_for_update().values_list(
+                'initial_balance', flat=True
+            ).get(pk=self.pk)
+            # Recomputed under the lock rather than taken from annotations
+            totals = Transaction.objects.filter(
+                cashbook_id=self.pk
+            ).aggregate(**balance_aggregates())
+            report = build_balance_report(self.initial_balance, totals)
+            self.current_balance = report['calculated_balance']
+            # Only the balance: the transaction counters are maintained separately
+            self.save(update_fields=['current_balance', 'updated_at'])
+        return self.get_balance_summary(report)
+
+    def get_balance_summary(self, report=None):
         """
         Get a detailed summary of the cashbook balance including totals.
         Returns a dictionary with balance information.
+        Pass a report from transactions.balance.get_balance_report() to
+        reuse it instead of querying again.
         """
-        from transactions.models import Transaction, TransactionType
-        
-        completed_transactions = self.transactions.filter(
-            status=Transaction.STATUS_COMPLETED
-        ).select_related('type')
-        
-        # Calculate totals by transaction type
-        income_total = Decimal('0.00')
-        expense_total = Decimal('0.00')
-        transfer_total = Decimal('0.00')
-        
-        for trans in completed_transactions:
-            amount = Decimal(str(trans.amount))
-            if trans.type.nature == TransactionType.INCOME:
-                income_total += amount
-            elif trans.type.nature == TransactionType.EXPENSE:
-                expense_total += amount
-            elif trans.type.nature == TransactionType.TRANSFER:
-                transfer_total += amount
-        
+        from transactions.balance import get_balance_report
+
+        if report is None:
+            report = get_balance_report(self)
+        report = dict(report)
         return {
-            'initial_balance': self.initial_balance,
+            'initial_balance': report.pop('initial_balance'),
             'current_balance': self.current_balance,
-            'calculated_balance': self.calculate_balance(),
-            'total_income': income_total,
-            'total_expense': expense_total,
-            'total_transfer': transfer_total,
-            'net_change': income_total - expense_total - transfer_total,
-            'transaction_count': completed_transactions.count(),
-            'pending_count': self.transactions.filter(
-                status=Transaction.STATUS_PENDING
-            ).count()
+            **report
         }
 
+    def balance_at(self, date):
+        """
+        Get the balance at the end of the given day.
+        Uses the nearest daily balance snapshot and only the transactions after it.
+        """
+        from transactions.snapshots import balance_at
+        return balance_at(self, date)
+
+    def balance_series(self, dates):
+        """
+        Get end-of-day balances for several dates at once.
+        Returns a list of (date, balance) tuples sorted by date.
+        """
+        from transactions.snapshots import balance_series
+        return balance_series(self, dates)
+
     @property
     def transaction_count(self):
         """
         Property to get the count of completed transactions.
+        Reads the maintained counter, so it runs no query.
         """
-        from transactions.models import Transaction
-        return self.transactions.filter(
-            status=Transaction.STATUS_COMPLETED
-        ).count()
+        return self.completed_transaction_count
 
     @property
     def balance_is_accurate(self):
@@ -167,5 +168,5 @@ class Cashbook(models.Model):
         Check if the stored current_balance matches the calculated balance.
         Useful for detecting data inconsistencies.
         """
-        calculated = self.calculate_balance()
-        return abs(self.current_balance - calculated) < Decimal('0.01')  # Allow 1 cent difference for rounding
\ No newline at end of file
+        from transactions.balance import balance_matches
+        return balance_matches(self.current_balance, self.calculate_balance())
\ No newline at end of file
@@ -1,6 +1,7 @@
 # backend/store/serializers.py
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .access import get_store_role
 from .models import Store, StoreUser, Cashbook
 
 User = get_user_model()
@@ -23,23 +24,28 @@ class StoreSerializer(serializers.ModelSerializer):
         model = Store
         fields = '__all__'
     
+    # Stores loaded by StoreViewSet carry annotated_* values for these
+    # fields; other instances (e.g. a freshly created store) fall back to queries
+    
     def get_user_role(self, obj):
         """Get the current user's role in this store"""
+        if hasattr(obj, 'annotated_user_role'):
+            return obj.annotated_user_role
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            store_user = StoreUser.objects.filter(
-                user=request.user, 
-                store=obj
-            ).first()
-            return store_user.role if store_user else None
+            return get_store_role(request.user, obj.pk)
         return None
     
     def get_cashbook_count(self, obj):
         """Get the number of cashbooks in this store"""
+        if hasattr(obj, 'annotated_cashbook_count'):
+            return obj.annotated_cashbook_count
         return obj.cashbooks.count()
     
     def get_user_count(self, obj):
         """Get the number of users assigned to this store"""
+        if hasattr(obj, 'annotated_user_count'):
+            return obj.annotated_user_count
         return obj.store_users.count()
 
 
@@ -94,7 +100,7 @@ class CashbookSerializer(serializers.ModelSerializer):
     
     # ✅ NEW: Balance-related fields
     balance_summary = serializers.SerializerMethodField(read_only=True)
-    balance_is_accurate = serializers.BooleanField(read_only=True)
+    balance_is_accurate = serializers.SerializerMethodField(read_only=True)
     calculated_balance = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
@@ -104,37 +110,46 @@ class CashbookSerializer(serializers.ModelSerializer):
     
     def get_transaction_count(self, obj):
         """Get the number of completed transactions in this cashbook"""
-        # ✅ UPDATED: Only count completed transactions
-        try:
-            from transactions.models import Transaction
-            return obj.transactions.filter(
-                status=Transaction.STATUS_COMPLETED
-            ).count()
-        except:
-            # Fallback if transactions app not available
-            return obj.transactions.count()
+        return obj.transaction_count
     
     def get_user_role(self, obj):
         """Get the current user's role in the parent store"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            store_user = StoreUser.objects.filter(
-                user=request.user, 
-                store=obj.store
-            ).first()
-            return store_user.role if store_user else None
+            return get_store_role(request.user, obj.store_id)
         return None
     
+    def get_balance_report(self, obj):
+        """
+        Get the balance report for a cashbook, computed once per request.
+        calculated_balance, balance_is_accurate and balance_summary all
+        read from it, so they cost one aggregate query between them.
+        """
+        from transactions.balance import get_balance_report
+        
+        reports = self.context.setdefault('balance_reports', {})
+        if obj.pk not in reports:
+            reports[obj.pk] = get_balance_report(obj)
+        return reports[obj.pk]
+    
     def get_calculated_balance(self, obj):
         """
         Get the calculated balance (what the balance should be).
         Useful for detecting inconsistencies.
         """
         try:
-            return str(obj.calculate_balance())
+            return str(self.get_balance_report(obj)['calculated_balance'])
         except:
             return None
     
+    def get_balance_is_accurate(self, obj):
+        """Check the stored balance against the calculated one"""
+        from transactions.balance import balance_matches
+        
+        return balance_matches(
+            obj.current_balance, self.get_balance_report(obj)['calculated_balance']
+        )
+    
     def get_balance_summary(self, obj):
         """
         Get detailed balance information.
@@ -160,7 +175,7 @@ class CashbookSerializer(serializers.ModelSerializer):
         
         if include_summary:
             try:
-                return obj.get_balance_summary()
+                return obj.get_balance_summary(self.get_balance_report(obj))
             except Exception as e:
                 # Return basic info if full summary fails
                 return {
@@ -243,5 +258,5 @@ class CashbookListSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at', 'current_balance')
     
     def get_transaction_count(self, obj):
-        """Get count of completed transactions using property"""
+        """Get count of completed transactions from the maintained counter"""
         return obj.transaction_count
\ No newline at end of file
@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from .access import invalidate_store_access
 from .models import Store, StoreUser
 
 @receiver(post_save, sender=Store)
@@ -10,4 +11,16 @@ def create_store_user(sender, instance, created, **kwargs):
             store=instance,
             user=instance.store_owner,
             defaults={'role': 'owner'}
-        )
\ No newline at end of file
+        )
+
+@receiver(post_save, sender=StoreUser)
+@receiver(post_delete, sender=StoreUser)
+def invalidate_store_user_access(sender, instance, **kwargs):
+    """Forget the cached store access of the user whose membership changed"""
+    user = instance.user if StoreUser.user.is_cached(instance) else None
+    invalidate_store_access(instance.user_id, user)
+    
+    # A membership moved to another user
+    old_user_id = instance.get_original('user')
+    if old_user_id is not None and old_user_id != instance.user_id:
+        invalidate_store_access(old_user_id)
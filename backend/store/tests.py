@@ -1,3 +1,59 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import User
+from .access import get_cache
+from .models import Store, StoreUser, Cashbook
+
+
+class StoreListQueryTests(TestCase):
+    """The store list annotates counts and roles instead of querying per store"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(
+            username='owner', email='owner@example.com', password='secret'
+        )
+        self.other = User.objects.create_user(
+            username='staff', email='staff@example.com', password='secret'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_stores(self, count):
+        start = Store.objects.count()
+        for index in range(start, start + count):
+            store = Store.objects.create(name=f'Store {index}')
+            StoreUser.objects.create(store=store, user=self.user, role='manager' if index % 2 else 'owner')
+            StoreUser.objects.create(store=store, user=self.other, role='staff')
+            for cashbook in range(index % 3 + 1):
+                Cashbook.objects.create(store=store, name=f'Cashbook {cashbook}')
+
+    def list_stores(self):
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/stores/')
+        self.assertEqual(response.status_code, 200)
+        return response, context.captured_queries
+
+    def test_query_count_is_constant(self):
+        self.add_stores(2)
+        _, small = self.list_stores()
+
+        self.add_stores(8)
+        response, large = self.list_stores()
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(response.data['count'], 10)
+
+    def test_annotated_values_match_relations(self):
+        self.add_stores(4)
+        response, _ = self.list_stores()
+
+        for row in response.data['results']:
+            store = Store.objects.get(pk=row['id'])
+            self.assertEqual(row['cashbook_count'], store.cashbooks.count())
+            self.assertEqual(row['user_count'], 2)
+            self.assertEqual(row['user_role'], store.store_users.get(user=self.user).role)
@@ -1,11 +1,15 @@
 # backend/store/views.py (CashbookViewSet update)
-from rest_framework import viewsets
+from datetime import date
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q
+from django.db.models import Q, Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from transactions.conditional import ConditionalListMixin
+from .access import MANAGER_ROLES, ROLE_OWNER, get_store_ids, get_store_role, has_store_access
 from .models import Store, StoreUser, Cashbook
 from .serializers import (
     StoreSerializer, 
@@ -32,11 +36,33 @@ class StoreViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         if user.is_superuser:
-            return Store.objects.all()
+            queryset = Store.objects.all()
+        else:
+            # Get stores where user is assigned through StoreUser
+            queryset = Store.objects.filter(id__in=get_store_ids(user))
+        
+        return self.annotate_store_details(queryset, user)
+    
+    def annotate_store_details(self, queryset, user):
+        """
+        Annotate the counts and role StoreSerializer shows, so a page of
+        stores is loaded in one query instead of three queries per store.
+        Counts use correlated subqueries, joining both relations would
+        multiply the rows.
+        """
+        def count(model):
+            rows = model.objects.filter(store=OuterRef('pk')).order_by().values('store')
+            return Coalesce(
+                Subquery(rows.annotate(total=Count('pk')).values('total'), output_field=IntegerField()),
+                Value(0)
+            )
         
-        # Get stores where user is assigned through StoreUser
-        user_store_ids = StoreUser.objects.filter(user=user).values_list('store_id', flat=True)
-        return Store.objects.filter(id__in=user_store_ids)
+        role = StoreUser.objects.filter(store=OuterRef('pk'), user_id=user.pk).values('role')[:1]
+        return queryset.select_related('store_owner').annotate(
+            annotated_cashbook_count=count(Cashbook),
+            annotated_user_count=count(StoreUser),
+            annotated_user_role=Subquery(role),
+        )
 
     def perform_create(self, serializer):
         """
@@ -59,13 +85,7 @@ class StoreViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if not user.is_superuser:
-            store_user = StoreUser.objects.filter(
-                user=user, 
-                store=instance, 
-                role='owner'
-            ).first()
-            
-            if not store_user:
+            if not has_store_access(user, instance.pk, roles=[ROLE_OWNER]):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied("Only store owners can delete stores.")
         
@@ -77,13 +97,7 @@ class StoreViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if not user.is_superuser:
-            store_user = StoreUser.objects.filter(
-                user=user, 
-                store=serializer.instance, 
-                role__in=['owner', 'manager']
-            ).first()
-            
-            if not store_user:
+            if not has_store_access(user, serializer.instance.pk, roles=MANAGER_ROLES):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied("Only store owners and managers can update stores.")
         
@@ -151,10 +165,8 @@ class StoreUserViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return StoreUser.objects.all()
         
-        # Get stores where user is assigned
-        user_store_ids = StoreUser.objects.filter(user=user).values_list('store_id', flat=True)
-        # Return StoreUser records for those stores
-        return StoreUser.objects.filter(store_id__in=user_store_ids)
+        # Return StoreUser records for the stores the user is assigned to
+        return StoreUser.objects.filter(store_id__in=get_store_ids(user))
 
     @action(detail=False, methods=['get'])
     def my_stores(self, request):
@@ -176,19 +188,15 @@ class StoreUserViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         # Check if the current user has owner or manager role in this store
-        store_user = StoreUser.objects.filter(
-            user=user, 
-            store=store,
-            role__in=['owner', 'manager']
-        ).first()
+        current_role = get_store_role(user, store.pk)
         
-        if not store_user:
+        if current_role not in MANAGER_ROLES:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You need owner or manager role to add users to this store.")
         
         # Owners can assign any role, managers can only assign staff role
         new_user_role = serializer.validated_data.get('role')
-        if store_user.role == 'manager' and new_user_role in ['owner', 'manager']:
+        if current_role == 'manager' and new_user_role in ['owner', 'manager']:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Managers can only assign staff role.")
         
@@ -207,19 +215,15 @@ class StoreUserViewSet(viewsets.ModelViewSet):
         current_user = self.request.user
         
         # Check if the current user has appropriate permissions
-        user_permissions = StoreUser.objects.filter(
-            user=current_user,
-            store=store_user_instance.store,
-            role__in=['owner', 'manager']
-        ).first()
+        current_role = get_store_role(current_user, store_user_instance.store_id)
         
-        if not user_permissions:
+        if current_role not in MANAGER_ROLES:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You need owner or manager role to modify user roles.")
         
         # Additional role-based restrictions
         new_role = serializer.validated_data.get('role', store_user_instance.role)
-        if user_permissions.role == 'manager' and new_role in ['owner', 'manager']:
+        if current_role == 'manager' and new_role in ['owner', 'manager']:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Managers can only assign staff role.")
         
@@ -238,30 +242,33 @@ class StoreUserViewSet(viewsets.ModelViewSet):
             return
         
         # Users can remove themselves from any store
-        if instance.user == current_user:
+        if instance.user_id == current_user.pk:
             super().perform_destroy(instance)
             return
         
         # Check if current user has owner or manager role in this store
-        user_permissions = StoreUser.objects.filter(
-            user=current_user,
-            store=instance.store,
-            role__in=['owner', 'manager']
-        ).first()
+        current_role = get_store_role(current_user, instance.store_id)
         
-        if not user_permissions:
+        if current_role not in MANAGER_ROLES:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You need owner or manager role to remove users from this store.")
         
         # Managers cannot remove owners or other managers
-        if user_permissions.role == 'manager' and instance.role in ['owner', 'manager']:
+        if current_role == 'manager' and instance.role in ['owner', 'manager']:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Managers cannot remove owners or other managers.")
         
         super().perform_destroy(instance)
 
 
-class CashbookViewSet(viewsets.ModelViewSet):
+class CashbookViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    """
+    list answers 304 Not Modified to a matching If-None-Match
+    (see transactions.conditional)
+    """
+    # Upper bound for the number of dates in one balance_at series request
+    MAX_BALANCE_DATES = 1000
+    
     serializer_class = CashbookSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -280,10 +287,14 @@ class CashbookViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return Cashbook.objects.all().select_related('store')
         
-        # Get stores where user is assigned
-        user_store_ids = StoreUser.objects.filter(user=user).values_list('store_id', flat=True)
-        # Return cashbooks for those stores
-        return Cashbook.objects.filter(store_id__in=user_store_ids).select_related('store')
+        # Return cashbooks for the stores the user is assigned to
+        return Cashbook.objects.filter(store_id__in=get_store_ids(user)).select_related('store')
+
+    def get_etag_store_ids(self):
+        """Superusers list the cashbooks of every store"""
+        if self.request.user.is_superuser:
+            return Store.objects.values_list('pk', flat=True)
+        return super().get_etag_store_ids()
 
     def get_serializer_class(self):
         """
@@ -308,8 +319,7 @@ class CashbookViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         # Check if the current user has access to this store
-        store_user = StoreUser.objects.filter(user=user, store=store).first()
-        if not store_user:
+        if not has_store_access(user, store.pk):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You don't have permission to create cashbooks for this store.")
         
@@ -328,13 +338,7 @@ class CashbookViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         # Check if user has owner or manager role in the store
-        store_user = StoreUser.objects.filter(
-            user=user,
-            store=cashbook.store,
-            role__in=['owner', 'manager']
-        ).first()
-        
-        if not store_user:
+        if not has_store_access(user, cashbook.store_id, roles=MANAGER_ROLES):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You need owner or manager role to update cashbooks.")
         
@@ -347,13 +351,7 @@ class CashbookViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         if not user.is_superuser:
-            store_user = StoreUser.objects.filter(
-                user=user,
-                store=instance.store,
-                role='owner'
-            ).first()
-            
-            if not store_user:
+            if not has_store_access(user, instance.store_id, roles=[ROLE_OWNER]):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied("Only store owners can delete cashbooks.")
         
@@ -382,19 +380,13 @@ class CashbookViewSet(viewsets.ModelViewSet):
         
         # Permission check
         if not user.is_superuser:
-            store_user = StoreUser.objects.filter(
-                user=user,
-                store=cashbook.store,
-                role__in=['owner', 'manager']
-            ).first()
-            
-            if not store_user:
+            if not has_store_access(user, cashbook.store_id, roles=MANAGER_ROLES):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied("You need owner or manager role to recalculate balance.")
         
         # Recalculate
         old_balance = cashbook.current_balance
-        cashbook.recalculate_and_save_balance()
+        balance_summary = cashbook.recalculate_and_save_balance()
         new_balance = cashbook.current_balance
         
         return Response({
@@ -403,5 +395,61 @@ class CashbookViewSet(viewsets.ModelViewSet):
             'old_balance': str(old_balance),
             'new_balance': str(new_balance),
             'difference': str(new_balance - old_balance),
-            'balance_summary': cashbook.get_balance_summary()
-        })
\ No newline at end of file
+            'balance_summary': balance_summary
+        })
+
+    @action(detail=True, methods=['get'])
+    def balance_at(self, request, pk=None):
+        """
+        Get the cashbook balance at the end of one or more days.
+        Query params:
+        - date: a single day (YYYY-MM-DD)
+        - dates: comma-separated days for a balance series
+        """
+        cashbook = self.get_object()
+        date_param = request.query_params.get('date')
+        dates_param = request.query_params.get('dates')
+        
+        if not date_param and not dates_param:
+            return Response(
+                {"error": "Either date or dates parameter is required (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            if date_param:
+                dates = [date.fromisoformat(date_param)]
+            else:
+                dates = [date.fromisoformat(value.strip()) for value in dates_param.split(',') if value.strip()]
+        except ValueError as e:
+            return Response(
+                {"error": f"Invalid date format: {str(e)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not dates:
+            return Response(
+                {"error": "dates must list at least one day (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(dates) > self.MAX_BALANCE_DATES:
+            return Response(
+                {"error": f"Cannot request more than {self.MAX_BALANCE_DATES} dates at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if date_param:
+            return Response({
+                'cashbook': cashbook.id,
+                'date': dates[0],
+                'balance': str(cashbook.balance_at(dates[0]))
+            })
+        
+        return Response({
+            'cashbook': cashbook.id,
+            'balances': [
+                {'date': day, 'balance': str(balance)}
+                for day, balance in cashbook.balance_series(dates)
+            ]
+        })
@@ -0,0 +1,238 @@
+# backend/transactions/accumulator.py
+"""
+Coalesces the balance changes made inside a database transaction.
+
+The transaction signals don't touch Cashbook or CashbookBalance rows
+directly. They record signed deltas here, and the accumulated changes are
+applied in one go at the end of the block that made them: one
+UPDATE ... SET current_balance = current_balance + delta per touched
+cashbook (which also shifts its transaction counters), a fixed number of
+snapshot queries per touched cashbook however many days it touches (see
+transactions.snapshots.apply_daily_deltas), one monthly rollup upsert per
+touched (month, type, category, status) and one counter UPDATE per touched
+type and category. A 500-row import into one cashbook therefore does a
+single balance write.
+Once the database transaction commits, the report cache generations of the
+touched stores are bumped (see transactions.report_cache).
+
+Code that writes transactions wraps its work in atomic_with_balances(), which
+applies the changes before the block commits, so the rows and the balances
+commit (or fail) together. Changes recorded in an atomic block nobody
+flushes are applied by an on_commit callback as a fallback, and outside an
+atomic block (autocommit) they are applied immediately. Deltas recorded
+inside a savepoint that is rolled back are discarded together with the
+savepoint, like any other on_commit callback.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from threading import local
+from django.db import transaction as db_transaction
+
+from .balance import ZERO, apply_balance_delta, balance_deltas
+from .counters import CASHBOOK, apply_counter_delta, counter_deltas
+from .report_cache import invalidate_cashbooks
+from .rollups import apply_monthly_delta, monthly_deltas, rollup_sort_key
+from .snapshots import apply_daily_deltas, daily_deltas
+
+
+_state = local()
+
+
+class BalanceAccumulator:
+    """Signed balance, daily snapshot and counter deltas waiting for commit"""
+
+    def __init__(self):
+        self.balances = defaultdict(Decimal)
+        self.days = defaultdict(lambda: [ZERO, ZERO, ZERO])
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.months = defaultdict(lambda: [ZERO, 0])
+        # Every cashbook written to, including writes that leave the balance alone
+        self.cashbook_ids = set()
+        self.callback = None
+
+    def add(self, old_state=None, new_state=None):
+        """Record the change between two TransactionStates"""
+        for state in (old_state, new_state):
+            if state is not None:
+                self.cashbook_ids.add(state.cashbook_id)
+
+        for cashbook_id, delta in balance_deltas(old_state, new_state).items():
+            self.balances[cashbook_id] += delta
+
+        for key, values in daily_deltas(old_state, new_state).items():
+            entry = self.days[key]
+            for index, value in enumerate(values):
+                entry[index] += value
+
+        for key, (amount, count) in monthly_deltas(old_state, new_state).items():
+            entry = self.months[key]
+            entry[0] += amount
+            entry[1] += count
+
+        for key, fields in counter_deltas(old_state, new_state).items():
+            for field, value in fields.items():
+                self.counters[key][field] += value
+
+    def merge(self, other):
+        """Move the changes recorded by another accumulator into this one"""
+        self.cashbook_ids.update(other.cashbook_ids)
+        for cashbook_id, delta in other.balances.items():
+            self.balances[cashbook_id] += delta
+        for key, values in other.days.items():
+            entry = self.days[key]
+            for index, value in enumerate(values):
+                entry[index] += value
+        for key, (amount, count) in other.months.items():
+            entry = self.months[key]
+            entry[0] += amount
+            entry[1] += count
+        for key, fields in other.counters.items():
+            for field, value in fields.items():
+                self.counters[key][field] += value
+        other.clear()
+
+    def clear(self):
+        self.balances.clear()
+        self.days.clear()
+        self.counters.clear()
+        self.months.clear()
+        self.cashbook_ids.clear()
+
+    def flush(self):
+        """
+        Apply the accumulated changes. Cashbooks are updated in id order so
+        concurrent flushes always lock rows in the same order.
+        """
+        if not self.cashbook_ids:
+            return
+
+        cashbook_ids = set(self.balances)
+        cashbook_ids.update(pk for kind, pk in self.counters if kind == CASHBOOK)
+
+        with db_transaction.atomic():
+            for cashbook_id in sorted(cashbook_ids):
+                apply_balance_delta(
+                    cashbook_id,
+                    self.balances.get(cashbook_id, ZERO),
+                    self.counters.get((CASHBOOK, cashbook_id))
+                )
+
+            days_by_cashbook = defaultdict(dict)
+            for (cashbook_id, date), values in self.days.items():
+                if any(values):
+                    days_by_cashbook[cashbook_id][date] = values
+            for cashbook_id in sorted(days_by_cashbook):
+                apply_daily_deltas(cashbook_id, days_by_cashbook[cashbook_id])
+
+            for key in sorted(self.months, key=rollup_sort_key):
+                amount, count = self.months[key]
+                if amount or count:
+                    apply_monthly_delta(*key, amount, count)
+
+            for (kind, pk) in sorted(self.counters):
+                if kind != CASHBOOK:
+                    apply_counter_delta(kind, pk, self.counters[(kind, pk)])
+
+        touched = set(self.cashbook_ids)
+        db_transaction.on_commit(lambda: invalidate_cashbooks(touched))
+        self.clear()
+
+
+def record_balance_change(old_state=None, new_state=None):
+    """
+    Record the balance effect of a transaction write.
+
+    Args:
+        old_state: TransactionState before the write (None on create)
+        new_state: TransactionState after the write (None on delete)
+    """
+    record_balance_changes([(old_state, new_state)])
+
+
+def record_balance_changes(changes):
+    """
+    Record the balance effect of many writes, e.g. rows inserted with
+    bulk_create (which doesn't send signals).
+
+    Args:
+        changes: iterable of (old_state, new_state) pairs
+    """
+    connection = db_transaction.get_connection()
+    if connection.in_atomic_block:
+        accumulator = _get_accumulator(connection)
+    else:
+        accumulator = BalanceAccumulator()
+
+    for old_state, new_state in changes:
+        accumulator.add(old_state, new_state)
+
+    if not connection.in_atomic_block:
+        accumulator.flush()
+
+
+@contextmanager
+def atomic_with_balances():
+    """
+    atomic() that applies the balance changes recorded inside it when the
+    block ends, before it commits. A failing balance update rolls back the
+    rows with it instead of leaving them committed without their deltas.
+    """
+    with db_transaction.atomic():
+        yield
+        flush_pending()
+
+
+def flush_pending():
+    """
+    Apply the changes recorded in the current savepoint and the savepoints
+    nested inside it. Their on_commit callbacks find nothing left to do.
+    """
+    connection = db_transaction.get_connection()
+    if not connection.in_atomic_block:
+        return
+
+    accumulators = _live_accumulators(connection)
+    prefix = tuple(connection.savepoint_ids)
+    # One flush for all of them, so cashbooks are still locked in id order
+    pending = BalanceAccumulator()
+    for key in list(accumulators):
+        if key[:len(prefix)] == prefix:
+            pending.merge(accumulators.pop(key))
+    pending.flush()
+
+
+def _live_accumulators(connection):
+    """
+    Return this thread's accumulators, forgetting those whose callback was
+    discarded by a rollback.
+    """
+    accumulators = _state.__dict__.setdefault('accumulators', {})
+
+    pending = [func for _, func, _ in connection.run_on_commit]
+    for key, accumulator in list(accumulators.items()):
+        if not any(func is accumulator.callback for func in pending):
+            del accumulators[key]
+    return accumulators
+
+
+def _get_accumulator(connection):
+    """
+    Return the accumulator for the current savepoint, registering its
+    on_commit flush the first time it is used.
+    """
+    accumulators = _live_accumulators(connection)
+
+    key = tuple(connection.savepoint_ids)
+    accumulator = accumulators.get(key)
+    if accumulator is None:
+        accumulator = accumulators[key] = BalanceAccumulator()
+
+        def flush_on_commit():
+            if accumulators.get(key) is accumulator:
+                del accumulators[key]
+            accumulator.flush()
+
+        accumulator.callback = flush_on_commit
+        db_transaction.on_commit(flush_on_commit)
+    return accumulator
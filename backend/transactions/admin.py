@@ -8,6 +8,7 @@ from django.urls import path
 from django.http import JsonResponse
 from datetime import datetime, timedelta
 from .models import TransactionType, TransactionCategory, Transaction, CashbookBalance
+from .accumulator import atomic_with_balances
 
 
 class StoreFilter(SimpleListFilter):
@@ -92,10 +93,9 @@ class TransactionTypeAdmin(admin.ModelAdmin):
     nature_badge.short_description = 'Nature'
     
     def transaction_count(self, obj):
-        count = obj.transactions.count()
-        return format_html('<strong>{}</strong>', count)
+        return format_html('<strong>{}</strong>', obj.transaction_count)
     transaction_count.short_description = 'Transactions'
-    transaction_count.admin_order_field = 'transactions_count'
+    transaction_count.admin_order_field = 'transaction_count'
     
     def total_amount(self, obj):
         """Total amount for all transactions of this type"""
@@ -164,11 +164,6 @@ class TransactionTypeAdmin(admin.ModelAdmin):
         return format_html(html)
     transaction_stats.short_description = 'Statistics'
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            transactions_count=Count('transactions')
-        )
-
 
 @admin.register(TransactionCategory)
 class TransactionCategoryAdmin(admin.ModelAdmin):
@@ -199,10 +194,9 @@ class TransactionCategoryAdmin(admin.ModelAdmin):
     )
     
     def transaction_count(self, obj):
-        count = obj.transaction_set.count()
-        return format_html('<strong>{}</strong>', count)
+        return format_html('<strong>{}</strong>', obj.transaction_count)
     transaction_count.short_description = 'Transactions'
-    transaction_count.admin_order_field = 'transactions_count'
+    transaction_count.admin_order_field = 'transaction_count'
     
     def total_amount(self, obj):
         """Total amount for all transactions in this category"""
@@ -263,11 +257,6 @@ class TransactionCategoryAdmin(admin.ModelAdmin):
         return format_html(html)
     category_stats.short_description = 'Statistics'
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            transactions_count=Count('transaction')
-        )
-
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
@@ -624,30 +613,34 @@ class TransactionAdmin(admin.ModelAdmin):
     
     def mark_as_completed(self, request, queryset):
         """Mark selected transactions as completed"""
-        for transaction in queryset:
-            if transaction.status != 'completed':
-                transaction.status = 'completed'
-                transaction.save()
+        # One database transaction, so balance changes are applied once
+        with atomic_with_balances():
+            for transaction in queryset:
+                if transaction.status != 'completed':
+                    transaction.status = 'completed'
+                    transaction.save()
         
         self.message_user(request, f'{queryset.count()} transactions marked as completed.')
     mark_as_completed.short_description = 'Mark selected as completed'
     
     def mark_as_cancelled(self, request, queryset):
         """Mark selected transactions as cancelled"""
-        for transaction in queryset:
-            if transaction.status != 'cancelled':
-                transaction.status = 'cancelled'
-                transaction.save()
+        with atomic_with_balances():
+            for transaction in queryset:
+                if transaction.status != 'cancelled':
+                    transaction.status = 'cancelled'
+                    transaction.save()
         
         self.message_user(request, f'{queryset.count()} transactions marked as cancelled.')
     mark_as_cancelled.short_description = 'Mark selected as cancelled'
     
     def mark_as_pending(self, request, queryset):
         """Mark selected transactions as pending"""
-        for transaction in queryset:
-            if transaction.status != 'pending':
-                transaction.status = 'pending'
-                transaction.save()
+        with atomic_with_balances():
+            for transaction in queryset:
+                if transaction.status != 'pending':
+                    transaction.status = 'pending'
+                    transaction.save()
         
         self.message_user(request, f'{queryset.count()} transactions marked as pending.')
     mark_as_pending.short_description = 'Mark selected as pending'
@@ -655,7 +648,14 @@ class TransactionAdmin(admin.ModelAdmin):
     def update_to_today(self, request, queryset):
         """Update transaction dates to today"""
         today = timezone.now().date()
-        updated = queryset.update(transaction_date=today)
+        updated = 0
+        # Saved one by one so the daily snapshots and rollups follow the dates
+        with atomic_with_balances():
+            for transaction in queryset:
+                if transaction.transaction_date != today:
+                    transaction.transaction_date = today
+                    transaction.save()
+                    updated += 1
         self.message_user(request, f'{updated} transactions updated to today.')
     update_to_today.short_description = 'Update transaction date to today'
     
@@ -0,0 +1,301 @@
+# backend/transactions/balance.py
+"""
+Balance engine shared by cashbooks, signals, serializers, admin and
+management commands.
+
+Every figure is computed in the database with a single conditional aggregate
+query instead of iterating over transactions in Python. Only completed
+transactions affect the balance; transfers are treated as outflows (money
+leaving the cashbook), matching the rule used by the transaction signals.
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from django.db.models import (
+    Sum, Count, Q, F, Value, Case, When, Window, DecimalField, ExpressionWrapper
+)
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+ZERO = Decimal('0.00')
+
+AMOUNT_FIELD = DecimalField(max_digits=15, decimal_places=2)
+
+REPORT_TOTALS = (
+    'total_income', 'total_expense', 'total_transfer',
+    'transaction_count', 'pending_count',
+)
+
+# Prefix for annotations added to Cashbook querysets, so they don't clash
+# with model attributes such as Cashbook.transaction_count
+ANNOTATION_PREFIX = 'report_'
+
+
+def to_money(value):
+    """Normalize a database sum to two decimal places (SQLite returns extra digits)."""
+    return (value or ZERO).quantize(ZERO)
+
+
+def _sum_amount(prefix, condition):
+    return Coalesce(
+        Sum(f'{prefix}amount', filter=condition),
+        Value(ZERO),
+        output_field=AMOUNT_FIELD
+    )
+
+
+def balance_aggregates(prefix=''):
+    """
+    Return the aggregate expressions used to compute a balance report.
+
+    Args:
+        prefix: Lookup prefix pointing at the transaction relation, e.g. ''
+            when aggregating a Transaction queryset or 'transactions__'
+            when annotating a Cashbook queryset.
+    """
+    from .models import Transaction, TransactionType
+
+    completed = Q(**{f'{prefix}status': Transaction.STATUS_COMPLETED})
+    pending = Q(**{f'{prefix}status': Transaction.STATUS_PENDING})
+
+    def nature(value):
+        return completed & Q(**{f'{prefix}type__nature': value})
+
+    return {
+        'total_income': _sum_amount(prefix, nature(TransactionType.INCOME)),
+        'total_expense': _sum_amount(prefix, nature(TransactionType.EXPENSE)),
+        'total_transfer': _sum_amount(prefix, nature(TransactionType.TRANSFER)),
+        'transaction_count': Count(f'{prefix}id', filter=completed),
+        'pending_count': Count(f'{prefix}id', filter=pending),
+    }
+
+
+def signed_amount_expression():
+    """
+    Expression for the signed effect of each transaction row on its
+    cashbook balance (see transaction_effect()).
+    """
+    from .models import Transaction, TransactionType
+
+    completed = Q(status=Transaction.STATUS_COMPLETED)
+    return Case(
+        When(completed & Q(type__nature=TransactionType.INCOME), then=F('amount')),
+        When(completed, then=-F('amount')),
+        default=Value(ZERO),
+        output_field=AMOUNT_FIELD
+    )
+
+
+def annotate_running_balance(queryset, opening_balance):
+    """
+    Annotate each transaction with ``running_balance``: the cashbook balance
+    right after that transaction, ordered by (transaction_date, created_at, id).
+
+    The running sum is a SQL window function, so it is computed before
+    pagination slices the queryset and stays correct on every page. Rows
+    filtered out of the queryset are not counted, so pass the balance at
+    the start of the filtered period as opening_balance.
+    """
+    running_total = Window(
+        expression=Sum(signed_amount_expression()),
+        partition_by=[F('cashbook_id')],
+        order_by=[F('transaction_date').asc(), F('created_at').asc(), F('id').asc()],
+        frame=RowRange(start=None, end=0)
+    )
+    return queryset.annotate(
+        running_balance=ExpressionWrapper(
+            Value(Decimal(str(opening_balance)), output_field=AMOUNT_FIELD) + running_total,
+            output_field=AMOUNT_FIELD
+        )
+    )
+
+
+def build_balance_report(initial_balance, totals):
+    """
+    Build a balance report dictionary from an initial balance and the
+    values produced by balance_aggregates().
+    """
+    initial_balance = Decimal(str(initial_balance))
+    total_income = to_money(totals.get('total_income'))
+    total_expense = to_money(totals.get('total_expense'))
+    total_transfer = to_money(totals.get('total_transfer'))
+    net_change = total_income - total_expense - total_transfer
+
+    return {
+        'initial_balance': initial_balance,
+        'calculated_balance': initial_balance + net_change,
+        'total_income': total_income,
+        'total_expense': total_expense,
+        'total_transfer': total_transfer,
+        'net_change': net_change,
+        'transaction_count': totals.get('transaction_count') or 0,
+        'pending_count': totals.get('pending_count') or 0,
+    }
+
+
+def balance_matches(current_balance, calculated_balance):
+    """Check a stored balance against a calculated one, allowing 1 cent for rounding."""
+    return abs(current_balance - calculated_balance) < Decimal('0.01')
+
+
+def get_balance_report(cashbook):
+    """
+    Compute the balance report for a single cashbook in one query.
+    Cashbooks loaded through annotate_balance_reports() need no query at all.
+
+    Args:
+        cashbook: Cashbook instance
+    """
+    from .models import Transaction
+
+    if has_report_annotations(cashbook):
+        return report_from_annotations(cashbook)
+
+    totals = Transaction.objects.filter(
+        cashbook_id=cashbook.pk
+    ).aggregate(**balance_aggregates())
+    return build_balance_report(cashbook.initial_balance, totals)
+
+
+def calculate_balance(cashbook):
+    """Return the balance a cashbook should have according to its transactions."""
+    return get_balance_report(cashbook)['calculated_balance']
+
+
+def annotate_balance_reports(queryset):
+    """
+    Annotate a Cashbook queryset with the balance aggregates so reports for
+    many cashbooks are computed in a single GROUP BY query.
+    Use report_from_annotations() to read the result for each row.
+    """
+    return queryset.annotate(**{
+        f'{ANNOTATION_PREFIX}{key}': expression
+        for key, expression in balance_aggregates('transactions__').items()
+    })
+
+
+def report_from_annotations(cashbook):
+    """Build a balance report from a cashbook annotated by annotate_balance_reports()."""
+    totals = {
+        key: getattr(cashbook, f'{ANNOTATION_PREFIX}{key}', None)
+        for key in REPORT_TOTALS
+    }
+    return build_balance_report(cashbook.initial_balance, totals)
+
+
+def has_report_annotations(cashbook):
+    """Check whether a cashbook was loaded through annotate_balance_reports()."""
+    return hasattr(cashbook, f'{ANNOTATION_PREFIX}total_income')
+
+
+class TransactionState(namedtuple(
+    'TransactionState',
+    ['cashbook_id', 'status', 'amount', 'nature', 'transaction_date', 'type_id', 'category_id'],
+    defaults=(None, None)
+)):
+    """
+    The parts of a transaction that affect its cashbook's balance and the
+    maintained transaction counters.
+    Signals compare the state before and after a write to work out the delta.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_instance(cls, transaction):
+        return cls(
+            cashbook_id=transaction.cashbook_id,
+            status=transaction.status,
+            amount=transaction.amount,
+            nature=transaction.type.nature,
+            transaction_date=transaction.transaction_date,
+            type_id=transaction.type_id,
+            category_id=transaction.category_id,
+        )
+
+    @classmethod
+    def from_database(cls, pk):
+        """
+        The stored state of a transaction, read with SELECT ... FOR UPDATE
+        so no other writer can change the row before this write commits.
+        Must run inside a database transaction. Returns None when the row
+        doesn't exist.
+        """
+        from .models import Transaction
+
+        values = Transaction.objects.select_for_update(of=('self',)).filter(pk=pk).values(
+            'cashbook_id', 'status', 'amount', 'type__nature', 'transaction_date',
+            'type_id', 'category_id'
+        ).first()
+        if values is None:
+            return None
+        return cls(
+            cashbook_id=values['cashbook_id'],
+            status=values['status'],
+            amount=values['amount'],
+            nature=values['type__nature'],
+            transaction_date=values['transaction_date'],
+            type_id=values['type_id'],
+            category_id=values['category_id'],
+        )
+
+    @property
+    def effect(self):
+        return transaction_effect(self.status, self.amount, self.nature)
+
+
+def transaction_effect(status, amount, nature):
+    """
+    Return the signed amount a transaction in the given state contributes to
+    its cashbook balance: income adds, expense and transfer subtract, and
+    anything that isn't completed contributes nothing.
+    """
+    from .models import Transaction, TransactionType
+
+    if status != Transaction.STATUS_COMPLETED:
+        return ZERO
+    amount = Decimal(str(amount))
+    return amount if nature == TransactionType.INCOME else -amount
+
+
+def balance_deltas(old_state=None, new_state=None):
+    """
+    Work out the balance change per cashbook caused by a write.
+
+    Args:
+        old_state: TransactionState before the write (None on create)
+        new_state: TransactionState after the write (None on delete)
+
+    Returns:
+        dict mapping cashbook id to a non-zero signed delta
+    """
+    deltas = defaultdict(Decimal)
+    if old_state is not None:
+        deltas[old_state.cashbook_id] -= old_state.effect
+    if new_state is not None:
+        deltas[new_state.cashbook_id] += new_state.effect
+    return {cashbook_id: delta for cashbook_id, delta in deltas.items() if delta}
+
+
+def apply_balance_delta(cashbook_id, delta, counters=None):
+    """
+    Atomically shift a cashbook's current_balance by delta with a single
+    UPDATE ... SET current_balance = current_balance + delta.
+
+    Args:
+        cashbook_id: Cashbook primary key
+        delta: Signed balance change
+        counters: Optional {field: delta} for the cashbook's transaction
+            counters, applied in the same UPDATE
+    """
+    from store.models import Cashbook
+
+    changes = {
+        field: F(field) + value
+        for field, value in (counters or {}).items() if value
+    }
+    if delta:
+        changes['current_balance'] = F('current_balance') + delta
+    if not changes:
+        return
+    Cashbook.objects.filter(pk=cashbook_id).update(updated_at=timezone.now(), **changes)
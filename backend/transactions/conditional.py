@@ -0,0 +1,103 @@
+# backend/transactions/conditional.py
+"""
+Conditional GET for polled list endpoints.
+
+A list response gets a weak ETag computed without serializing any rows,
+from:
+- the request path and query params (filters, ordering and page all
+  change the body)
+- the row count and max(updated_at) of the filtered queryset, in one
+  aggregate query; views with keyset pages aggregate only the rows of
+  the requested page (see get_etag_queryset)
+- the write generations of the stores the user can see, bumped after
+  every committed transaction write and on cashbook/store changes (see
+  transactions.report_cache); they cover related rows the listed model
+  has no timestamp for, like a renamed cashbook
+
+When the client sends a matching If-None-Match the view answers
+304 Not Modified and the page is never loaded or serialized.
+"""
+import hashlib
+import json
+from django.db.models import Count, Max
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import report_cache
+
+
+def compute_etag(request, queryset, store_ids, timestamp_field='updated_at'):
+    """
+    Build the validator of a list response.
+
+    Args:
+        request: DRF request
+        queryset: The filtered queryset the page is taken from
+        store_ids: Stores whose generations the response depends on
+        timestamp_field: Field changed by every write to a listed row, or
+            None when the model has none
+    """
+    aggregates = {'row_count': Count('pk')}
+    if timestamp_field:
+        aggregates['last_modified'] = Max(timestamp_field)
+    values = queryset.order_by().aggregate(**aggregates)
+
+    generations = report_cache.get_generations(report_cache.store_generation_names(store_ids))
+    payload = json.dumps(
+        [request.path, sorted(request.query_params.lists()), values, sorted(generations.items())],
+        default=str
+    )
+    return f'W/"{hashlib.sha256(payload.encode()).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    """Check the request's If-None-Match against etag (weak comparison)"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+class ConditionalListMixin:
+    """
+    Answer list requests with 304 Not Modified when nothing they cover
+    has changed. Views call conditional_response() from list actions;
+    list() itself is wrapped.
+    """
+    # Field whose max() moves on every write to a listed row
+    etag_timestamp_field = 'updated_at'
+
+    def get_etag_store_ids(self):
+        from store.access import get_store_ids
+        return get_store_ids(self.request.user)
+
+    def get_etag_queryset(self, queryset):
+        """Rows the validator's aggregate runs over (all listed rows by default)"""
+        return queryset
+
+    def conditional_response(self, queryset, render):
+        """
+        Return 304 when the client's copy is current, otherwise render()
+        with the ETag attached.
+
+        Args:
+            queryset: The filtered queryset the response lists
+            render: Callable building the full response
+        """
+        etag = compute_etag(
+            self.request, self.get_etag_queryset(queryset), self.get_etag_store_ids(), self.etag_timestamp_field
+        )
+        if etag_matches(self.request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = render()
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        render = super().list
+        return self.conditional_response(queryset, lambda: render(request, *args, **kwargs))
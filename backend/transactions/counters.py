@@ -0,0 +1,128 @@
+# backend/transactions/counters.py
+"""
+Denormalized transaction counters.
+
+Cashbook.completed_transaction_count / pending_transaction_count and
+TransactionType.transaction_count / TransactionCategory.transaction_count
+are kept up to date by the same write path as the balances: the signals
+record the change between two TransactionStates in the balance accumulator
+and the deltas are applied on commit with UPDATE ... SET count = count + n
+(the cashbook counters in the same UPDATE as current_balance).
+
+rebuild_counters() recomputes every counter from the transactions table.
+"""
+from collections import defaultdict
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .report_cache import invalidate_cashbooks
+
+
+CASHBOOK = 'cashbook'
+TYPE = 'type'
+CATEGORY = 'category'
+
+
+def _cashbook_status_counters():
+    from .models import Transaction
+
+    return {
+        Transaction.STATUS_COMPLETED: 'completed_transaction_count',
+        Transaction.STATUS_PENDING: 'pending_transaction_count',
+    }
+
+
+def counter_deltas(old_state=None, new_state=None):
+    """
+    Work out the counter changes caused by a write.
+
+    Args:
+        old_state: TransactionState before the write (None on create)
+        new_state: TransactionState after the write (None on delete)
+
+    Returns:
+        dict mapping (CASHBOOK/TYPE/CATEGORY, pk) to {field: delta},
+        leaving out counters that don't change
+    """
+    status_counters = _cashbook_status_counters()
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        field = status_counters.get(state.status)
+        if field:
+            deltas[(CASHBOOK, state.cashbook_id)][field] += sign
+        if state.type_id is not None:
+            deltas[(TYPE, state.type_id)]['transaction_count'] += sign
+        if state.category_id is not None:
+            deltas[(CATEGORY, state.category_id)]['transaction_count'] += sign
+
+    return {
+        key: {field: value for field, value in fields.items() if value}
+        for key, fields in deltas.items() if any(fields.values())
+    }
+
+
+def apply_counter_delta(kind, pk, fields):
+    """
+    Shift the counters of a transaction type or category.
+    Cashbook counters go through balance.apply_balance_delta instead.
+    """
+    from .models import TransactionType, TransactionCategory
+
+    model = {TYPE: TransactionType, CATEGORY: TransactionCategory}[kind]
+    changes = {field: F(field) + value for field, value in fields.items() if value}
+    if changes:
+        model.objects.filter(pk=pk).update(**changes)
+
+
+def _count(related_filter, **conditions):
+    from .models import Transaction
+
+    rows = (
+        Transaction.objects.filter(**{related_filter: OuterRef('pk')}, **conditions)
+        .order_by()
+        .values(related_filter)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def rebuild_counters(cashbooks=None):
+    """
+    Recompute the counters from the transactions table, one UPDATE per
+    model with a correlated COUNT subquery per column.
+
+    Args:
+        cashbooks: Optional Cashbook queryset to limit the cashbook counters
+            to; type and category counters are always rebuilt in full
+
+    Returns:
+        dict with the number of cashbooks, types and categories updated
+    """
+    from store.models import Cashbook
+    from .models import TransactionType, TransactionCategory
+
+    if cashbooks is None:
+        cashbooks = Cashbook.objects.all()
+
+    updates = {
+        CASHBOOK: (cashbooks, {
+            field: _count('cashbook', status=status)
+            for status, field in _cashbook_status_counters().items()
+        }),
+        TYPE: (TransactionType.objects.all(), {'transaction_count': _count('type')}),
+        CATEGORY: (TransactionCategory.objects.all(), {'transaction_count': _count('category')}),
+    }
+
+    with db_transaction.atomic():
+        updated = {
+            kind: queryset.update(**expressions)
+            for kind, (queryset, expressions) in updates.items()
+        }
+        # The counters are listed with the cashbooks
+        cashbook_ids = list(cashbooks.values_list('pk', flat=True))
+        db_transaction.on_commit(lambda: invalidate_cashbooks(cashbook_ids))
+    return updated
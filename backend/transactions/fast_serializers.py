@@ -0,0 +1,82 @@
+# backend/transactions/fast_serializers.py
+"""
+Read-only fast path for serializer output.
+
+ValuesSerializer produces the same dicts as a ModelSerializer's
+to_representation(), but from .values() rows: every serializer field is
+mapped to a lookup built from its source ('cashbook.store.name' becomes
+'cashbook__store__name') and converted with the field's own
+to_representation(), so decimals, dates and UUIDs render exactly as they
+do through DRF. No model instances and no per-row field binding are
+involved, which is where most of the time goes on large lists and
+exports.
+
+Only fields that read model columns can be expressed this way; method
+fields and source='*' fields raise ValueError.
+"""
+from rest_framework import serializers
+
+
+# Fields whose values() value is already what DRF would output
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValuesSerializer:
+    """
+    Serialize .values() rows the way serializer_class serializes instances.
+
+    Args:
+        serializer_class: ModelSerializer class to mirror
+        context: Serializer context (honours the sparse 'fields' entry)
+    """
+
+    def __init__(self, serializer_class, context=None):
+        self.columns = []
+        for name, field in serializer_class(context=context or {}).fields.items():
+            if field.write_only:
+                continue
+            if not field.source_attrs or isinstance(field, serializers.SerializerMethodField):
+                raise ValueError(f'{serializer_class.__name__}.{name} does not read a model column')
+            if isinstance(field, PASSTHROUGH_FIELDS) and not getattr(field, 'pk_field', None):
+                convert = None
+            else:
+                convert = field.to_representation
+            attrs = field.source_attrs
+            # Relations the source goes through: like DRF, a field reached
+            # through a null relation is left out (or null with allow_null)
+            parents = [] if field.allow_null else ['__'.join(attrs[:depth]) for depth in range(1, len(attrs))]
+            self.columns.append((name, '__'.join(attrs), convert, parents))
+
+    @property
+    def lookups(self):
+        lookups = []
+        for _, lookup, _, parents in self.columns:
+            lookups.extend(parents)
+            lookups.append(lookup)
+        return list(dict.fromkeys(lookups))
+
+    def values(self, queryset, extra=()):
+        """
+        Return queryset as .values() rows with the columns the fields read.
+
+        Args:
+            extra: Additional columns to fetch (e.g. for a paginator)
+        """
+        return queryset.values(*dict.fromkeys([*self.lookups, *extra]))
+
+    def to_representation(self, row):
+        data = {}
+        for name, lookup, convert, parents in self.columns:
+            if parents and any(row[parent] is None for parent in parents):
+                continue
+            value = row[lookup]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
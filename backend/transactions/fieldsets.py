@@ -0,0 +1,115 @@
+# backend/transactions/fieldsets.py
+"""
+Sparse fieldsets: ?fields=id,amount,transaction_date limits a response
+to the named serializer fields, and the queryset is pruned to match with
+.only() and a select_related() of just the relations those fields read.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+FIELDS_PARAM = 'fields'
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin dropping every field not listed in the 'fields'
+    context entry (all fields are kept when it's missing).
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get(FIELDS_PARAM)
+        if not requested:
+            return fields
+        return {name: field for name, field in fields.items() if name in requested}
+
+
+def parse_fields(value, available):
+    """
+    Parse a ?fields= value.
+
+    Args:
+        value: Comma separated field names
+        available: Field names the serializer offers
+
+    Returns:
+        List of field names in request order, or None when value is empty
+
+    Raises:
+        ValidationError: for names the serializer doesn't have
+    """
+    names = list(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+    if not names:
+        return None
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(unknown)}"})
+    return names
+
+
+def queryset_paths(model, fields, annotations=()):
+    """
+    Work out what a queryset must load for the given serializer fields.
+
+    Args:
+        model: Model the serializer reads
+        fields: Bound serializer fields ({name: field})
+        annotations: Names provided by queryset annotations
+
+    Returns:
+        (only, related) lookup paths for .only() and .select_related(), or
+        None when a field reads something other than model fields (a
+        method, property or the whole object), which can't be pruned safely
+    """
+    only, related = set(), set()
+    for field in fields.values():
+        attrs = field.source_attrs
+        if not attrs:
+            return None
+        if attrs[0] in annotations:
+            continue
+
+        current = model
+        for depth, attr in enumerate(attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            if model_field.many_to_many or model_field.one_to_many:
+                return None
+
+            path = '__'.join(attrs[:depth + 1])
+            only.add(path)
+            if depth < len(attrs) - 1:
+                if not model_field.is_relation:
+                    return None
+                related.add(path)
+                current = model_field.related_model
+    return only, related
+
+
+def prune_queryset(queryset, fields, annotations=(), always=()):
+    """
+    Restrict queryset to the columns and joins the serializer fields need.
+
+    Args:
+        queryset: Queryset the serializer will read
+        fields: Bound serializer fields ({name: field})
+        annotations: Names provided by annotations added to the queryset
+        always: Extra fields to keep loaded (e.g. a paginator's keys)
+
+    Returns:
+        The pruned queryset, or queryset unchanged when it can't be pruned
+    """
+    annotations = set(annotations) | set(queryset.query.annotations)
+    paths = queryset_paths(queryset.model, fields, annotations)
+    if paths is None:
+        return queryset
+
+    only, related = paths
+    queryset = queryset.select_related(None)
+    if related:
+        # select_related() without arguments would follow every relation
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(only | set(always)))
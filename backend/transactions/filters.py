@@ -1,9 +1,49 @@
 import django_filters
 from django.db.models import Q
-from .models import Transaction, TransactionType, TransactionCategory
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from .models import Transaction, TransactionType, TransactionCategory, TransactionTag
+from .search import search_transactions
+from .tags import parse_tag_list
 
 
-class TransactionFilter(django_filters.FilterSet):
+class TransactionTagFilterSet(django_filters.FilterSet):
+    """
+    Tag filters over the indexed tag table (see transactions.tags):
+    - tags=a,b: transactions tagged a or b
+    - tags_all=a,b: transactions tagged both a and b
+    """
+    tags = django_filters.CharFilter(method='filter_tags')
+    tags_all = django_filters.CharFilter(method='filter_tags_all')
+
+    def filter_tags(self, queryset, name, value):
+        """Filter transactions carrying any of the comma-separated tags"""
+        names = parse_tag_list(value)
+        if not names:
+            return queryset
+        return queryset.filter(pk__in=_tagged(tag__name__in=names))
+
+    def filter_tags_all(self, queryset, name, value):
+        """Filter transactions carrying every one of the comma-separated tags"""
+        for tag_name in parse_tag_list(value):
+            queryset = queryset.filter(pk__in=_tagged(tag__name=tag_name))
+        return queryset
+
+
+def _tagged(**tag_filter):
+    """Subquery of the ids of transactions linked to the matching tags"""
+    return TransactionTag.objects.filter(**tag_filter).values('transaction_id')
+
+
+class TransactionListFilter(TransactionTagFilterSet):
+    """Filters of the transaction endpoints: exact field matches plus tags"""
+
+    class Meta:
+        model = Transaction
+        fields = ['cashbook', 'type', 'category', 'transaction_date', 'created_by', 'status']
+
+
+class TransactionFilter(TransactionTagFilterSet):
     """
     Advanced filter for transactions with multiple options
     """
@@ -70,14 +110,22 @@ class TransactionFilter(django_filters.FilterSet):
         return queryset.filter(category__isnull=True)
     
     def filter_search(self, queryset, name, value):
-        """Search across multiple fields"""
-        return queryset.filter(
-            Q(description__icontains=value) |
-            Q(reference_number__icontains=value) |
-            Q(cashbook__name__icontains=value) |
-            Q(type__name__icontains=value) |
-            Q(category__name__icontains=value)
-        )
+        """Search across multiple fields through the full-text index"""
+        return search_transactions(queryset, value)
+
+
+class TransactionSearchFilter(SearchFilter):
+    """
+    ?search= for transactions through the full-text index (see
+    transactions.search) instead of icontains over search_fields.
+    Results come best match first unless ?ordering= is given, so this
+    backend must run after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.search_param, '')
+        rank = not request.query_params.get(api_settings.ORDERING_PARAM)
+        return search_transactions(queryset, value, rank=rank)
 
 
 class TransactionTypeFilter(django_filters.FilterSet):
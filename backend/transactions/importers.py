@@ -0,0 +1,246 @@
+# backend/transactions/importers.py
+"""
+Streaming CSV/XLSX transaction import.
+
+Rows are read lazily from the upload (csv.reader over the file stream, or
+openpyxl in read_only mode) and handled in chunks of
+TRANSACTION_IMPORT_CHUNK_SIZE: each chunk is validated and bulk inserted
+before the next one is read, so memory stays flat however large the file is.
+
+Cashbook, type and category names are resolved from in-memory maps built
+once per import. Rows are validated with TransactionCreateUpdateSerializer,
+whose related-instance cache is pre-filled from those maps, so validation
+doesn't query the database per row.
+"""
+import csv
+import io
+from datetime import date, datetime
+from itertools import islice
+from django.conf import settings
+from django.db import transaction as db_transaction
+from openpyxl import load_workbook
+from rest_framework import serializers
+
+from store.access import get_store_ids
+from store.models import Cashbook
+from .models import Transaction, TransactionType, TransactionCategory
+from .serializers import TransactionCreateUpdateSerializer, insert_transactions
+
+
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+# Columns read from the file; anything else is ignored
+IMPORT_COLUMNS = (
+    'cashbook', 'amount', 'type', 'category', 'description', 'reference_number',
+    'transaction_date', 'value_date', 'status', 'tags',
+)
+
+# Cap on the number of row errors returned in the response
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFileError(ValueError):
+    """Raised when an uploaded file can't be read as a transaction import"""
+
+
+def detect_format(upload, requested_format=None):
+    """Work out the import format from the format param or the file extension"""
+    import_format = (requested_format or upload.name.rsplit('.', 1)[-1]).lower()
+    if import_format not in IMPORT_FORMATS:
+        raise ImportFileError("Unsupported file format. Upload a .csv or .xlsx file")
+    return import_format
+
+
+def _normalize_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def iter_csv_rows(upload):
+    """Yield (row_number, row dict) from a CSV upload without loading it all"""
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(stream)
+        header = [_normalize_header(value) for value in next(reader, [])]
+        for row_number, values in enumerate(reader, start=2):
+            if any(values):
+                yield row_number, dict(zip(header, values))
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV files must be UTF-8 encoded")
+    except csv.Error as e:
+        raise ImportFileError(f"Could not read the CSV file: {e}")
+    finally:
+        stream.detach()
+
+
+def iter_xlsx_rows(upload):
+    """Yield (row_number, row dict) from the first sheet of an XLSX upload"""
+    try:
+        workbook = load_workbook(upload.file, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("Could not read the XLSX file")
+
+    try:
+        # The sheet is parsed lazily, so a damaged archive or sheet
+        # (BadZipFile, KeyError, a truncated stream or XML) fails here
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize_header(value) for value in next(rows, ())]
+        for row_number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield row_number, dict(zip(header, values))
+    except Exception:
+        raise ImportFileError("Could not read the XLSX file")
+    finally:
+        workbook.close()
+
+
+def iter_rows(upload, import_format):
+    if import_format == 'xlsx':
+        return iter_xlsx_rows(upload)
+    return iter_csv_rows(upload)
+
+
+class TransactionImporter:
+    """
+    Validates and inserts imported rows for a user.
+
+    Args:
+        request: Request the import belongs to (used as serializer context)
+        default_cashbook: Cashbook id or name used for rows without one
+    """
+
+    def __init__(self, request, default_cashbook=None):
+        self.request = request
+        self.user = request.user
+        self.chunk_size = getattr(settings, 'TRANSACTION_IMPORT_CHUNK_SIZE', 1000)
+
+        store_ids = get_store_ids(self.user)
+        cashbooks = list(Cashbook.objects.filter(store_id__in=store_ids).select_related('store'))
+        types = list(TransactionType.objects.filter(is_active=True))
+        categories = list(TransactionCategory.objects.filter(is_active=True))
+
+        self.cashbooks_by_id = {str(cashbook.pk): cashbook for cashbook in cashbooks}
+        self.cashbooks_by_name = {}
+        for cashbook in cashbooks:
+            # Names are only unique within a store; None marks an ambiguous name
+            key = cashbook.name.strip().lower()
+            self.cashbooks_by_name[key] = None if key in self.cashbooks_by_name else cashbook
+        self.types_by_name = {item.name.strip().lower(): item for item in types}
+        self.categories_by_name = {item.name.strip().lower(): item for item in categories}
+
+        # Serializer caches, filled up front so validation runs no queries
+        related_instances = {}
+        for model, items in ((Cashbook, cashbooks), (TransactionType, types), (TransactionCategory, categories)):
+            for item in items:
+                related_instances[(model, str(item.pk))] = item
+        self.context = {
+            'request': request,
+            'related_instances': related_instances,
+        }
+        # One serializer validates every row, so its fields are built once
+        self.validator = TransactionCreateUpdateSerializer(context=self.context)
+
+        self.default_cashbook = None
+        if default_cashbook not in (None, ''):
+            self.default_cashbook = self._resolve_cashbook(default_cashbook)
+            if self.default_cashbook is None:
+                raise ImportFileError("Cashbook not found or access denied")
+
+    def run(self, rows):
+        """
+        Import every row, chunk by chunk, in one database transaction.
+
+        Returns:
+            dict with total_rows, created, failed and the per-row errors
+        """
+        summary = {
+            'total_rows': 0,
+            'created': 0,
+            'failed': 0,
+            'errors': [],
+            'errors_truncated': False,
+        }
+        rows = iter(rows)
+
+        with db_transaction.atomic():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+
+                transactions = []
+                for row_number, row in chunk:
+                    transaction, errors = self._build_transaction(row)
+                    if errors:
+                        self._add_error(summary, row_number, errors)
+                    else:
+                        transactions.append(transaction)
+
+                insert_transactions(transactions)
+                summary['total_rows'] += len(chunk)
+                summary['created'] += len(transactions)
+
+        summary['failed'] = summary['total_rows'] - summary['created']
+        return summary
+
+    def _add_error(self, summary, row_number, errors):
+        if len(summary['errors']) >= MAX_REPORTED_ERRORS:
+            summary['errors_truncated'] = True
+            return
+        summary['errors'].append({'row': row_number, 'errors': errors})
+
+    def _build_transaction(self, row):
+        """Return (unsaved Transaction, None) or (None, errors) for one row"""
+        data, errors = self._resolve_row(row)
+        if errors:
+            return None, errors
+
+        try:
+            validated_data = self.validator.run_validation(data)
+        except serializers.ValidationError as exc:
+            return None, serializers.as_serializer_error(exc)
+        return Transaction(created_by=self.user, **validated_data), None
+
+    def _resolve_row(self, row):
+        """Turn a raw file row into serializer input, resolving names to ids"""
+        data = {}
+        errors = {}
+        for column in IMPORT_COLUMNS:
+            value = row.get(column)
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ''):
+                continue
+            if isinstance(value, datetime):
+                value = value.date()
+            if isinstance(value, date):
+                value = value.isoformat()
+            data[column] = value
+
+        cashbook = self.default_cashbook
+        if 'cashbook' in data:
+            cashbook = self._resolve_cashbook(data['cashbook'])
+            if cashbook is None:
+                errors['cashbook'] = [f"Unknown or ambiguous cashbook '{data['cashbook']}'"]
+        if cashbook is None and 'cashbook' not in errors:
+            errors['cashbook'] = ["This field is required."]
+        elif cashbook is not None:
+            data['cashbook'] = cashbook.pk
+
+        for column, lookup in (('type', self.types_by_name), ('category', self.categories_by_name)):
+            if column in data:
+                item = lookup.get(str(data[column]).lower())
+                if item is None:
+                    errors[column] = [f"Unknown {column} '{data[column]}'"]
+                else:
+                    data[column] = item.pk
+
+        if 'tags' in data:
+            data['tags'] = [tag.strip() for tag in str(data['tags']).split(',') if tag.strip()]
+        if 'amount' in data:
+            data['amount'] = str(data['amount'])
+
+        return data, errors
+
+    def _resolve_cashbook(self, value):
+        value = str(value).strip()
+        return self.cashbooks_by_id.get(value) or self.cashbooks_by_name.get(value.lower())
@@ -0,0 +1,122 @@
+# backend/transactions/management/commands/benchmark_latest_balances.py
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, transaction as db_transaction
+from django.db.models import Max, Q
+from store.models import Store, Cashbook
+from transactions.models import CashbookBalance
+from transactions.snapshots import latest_snapshots
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the OR-per-cashbook "latest balance" query with the single '
+        'correlated-subquery one on generated snapshots (everything is rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cashbooks',
+            type=int,
+            nargs='+',
+            default=[10, 1000, 10000],
+            help='Cashbook counts to benchmark (default: 10 1000 10000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Daily snapshots per cashbook (default: 30)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement, the fastest is reported (default: 3)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with db_transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        store = Store.objects.create(name=f'Benchmark {uuid.uuid4().hex[:8]}')
+        snapshots = CashbookBalance.objects.select_related('cashbook', 'cashbook__store').filter(cashbook__store=store)
+        cashbooks = Cashbook.objects.filter(store=store)
+
+        self.stdout.write(f'{"cashbooks":>9} {"or-query":>12} {"sql size":>10} {"subquery":>12} {"sql size":>10}')
+        created = 0
+        for count in sorted(options['cashbooks']):
+            self.create_cashbooks(store, created, count - created, options['days'])
+            created = count
+
+            subquery = latest_snapshots(cashbooks).select_related('cashbook', 'cashbook__store')
+            subquery_time = self.measure(lambda: list(subquery.all()), options['repeat'])
+            subquery_size = len(str(subquery.query))
+
+            try:
+                with db_transaction.atomic():
+                    # Includes the max(date) query the OR'ed clauses are built from
+                    or_time = self.measure(lambda: list(self.or_query(snapshots)), options['repeat'])
+                or_result = f'{or_time:>11.3f}s {len(str(self.or_query(snapshots).query)):>10}'
+                error = ''
+            except DatabaseError as e:
+                # e.g. SQLite's expression tree depth limit
+                or_result = f'{"failed":>12} {"-":>10}'
+                error = f' ({e})'
+
+            self.stdout.write(f'{count:>9} {or_result} {subquery_time:>11.3f}s {subquery_size:>10}{error}')
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, generated data rolled back'))
+
+    def or_query(self, snapshots):
+        """The previous implementation: max(date) per cashbook, then one OR'ed clause each"""
+        latest_dates = snapshots.values('cashbook').annotate(latest_date=Max('date'))
+        condition = Q()
+        for item in latest_dates:
+            condition |= Q(cashbook=item['cashbook'], date=item['latest_date'])
+        return snapshots.filter(condition)
+
+    def measure(self, build, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            build()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def create_cashbooks(self, store, offset, count, days):
+        """
+        Insert count cashbooks with days snapshots each, with bulk_create.
+        The balances are made up, which is fine since the data is rolled back.
+        """
+        cashbooks = Cashbook.objects.bulk_create(
+            [Cashbook(store=store, name=f'Benchmark {index}') for index in range(offset, offset + count)],
+            batch_size=1000
+        )
+
+        start = date(2024, 1, 1)
+        CashbookBalance.objects.bulk_create(
+            (
+                CashbookBalance(
+                    cashbook=cashbook,
+                    date=start + timedelta(days=day),
+                    opening_balance=Decimal(day),
+                    closing_balance=Decimal(day + 1),
+                )
+                for cashbook in cashbooks
+                for day in range(days)
+            ),
+            batch_size=5000
+        )
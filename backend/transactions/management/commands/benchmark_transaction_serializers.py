@@ -0,0 +1,126 @@
+# backend/transactions/management/commands/benchmark_transaction_serializers.py
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from accounts.models import User
+from store.models import Store, Cashbook
+from transactions.fast_serializers import ValuesSerializer
+from transactions.models import Transaction, TransactionType, TransactionCategory
+from transactions.serializers import TransactionListSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare TransactionListSerializer with the .values() fast path on '
+        'generated transactions (everything is rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Row counts to benchmark (default: 1000 10000 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement, the fastest is reported (default: 3)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of generated rows per bulk insert (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with db_transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        cashbook, types, category, user = self.create_fixtures()
+        queryset = Transaction.objects.filter(cashbook=cashbook).select_related(
+            'cashbook', 'cashbook__store', 'type', 'category', 'created_by'
+        ).order_by('-transaction_date', '-created_at')
+        values = ValuesSerializer(TransactionListSerializer)
+
+        self.stdout.write(f'{"rows":>8} {"serializer":>12} {"values":>12} {"speedup":>8}')
+        created = 0
+        for rows in sorted(options['rows']):
+            created += self.create_transactions(
+                cashbook, types, category, user, rows - created, created, options['batch_size']
+            )
+            page = queryset[:rows]
+
+            serializer_time = self.measure(
+                lambda: TransactionListSerializer(page, many=True).data, options['repeat']
+            )
+            values_time = self.measure(
+                lambda: values.many(values.values(page)), options['repeat']
+            )
+            self.stdout.write(
+                f'{rows:>8} {serializer_time:>11.3f}s {values_time:>11.3f}s '
+                f'{serializer_time / values_time:>7.1f}x'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, generated data rolled back'))
+
+    def measure(self, build, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            build()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def create_fixtures(self):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'benchmark-{suffix}', email=f'benchmark-{suffix}@example.com', password=None
+        )
+        store = Store.objects.create(name=f'Benchmark {suffix}')
+        cashbook = Cashbook.objects.create(store=store, name='Benchmark')
+        types = [
+            TransactionType.objects.create(name=f'Benchmark income {suffix}', nature=TransactionType.INCOME),
+            TransactionType.objects.create(name=f'Benchmark expense {suffix}', nature=TransactionType.EXPENSE),
+        ]
+        category = TransactionCategory.objects.create(name=f'Benchmark {suffix}')
+        return cashbook, types, category, user
+
+    def create_transactions(self, cashbook, types, category, user, count, offset, batch_size):
+        """
+        Insert count rows with bulk_create. The balance signals don't run,
+        which is fine since the data is rolled back.
+        """
+        start = date(2020, 1, 1)
+        batch = []
+        for index in range(offset, offset + count):
+            batch.append(Transaction(
+                cashbook=cashbook,
+                amount=Decimal(index % 500 + 1),
+                type=types[index % 2],
+                category=category if index % 3 else None,
+                description=f'Benchmark transaction {index}',
+                transaction_date=start + timedelta(days=index % 1500),
+                created_by=user,
+            ))
+            if len(batch) >= batch_size:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Transaction.objects.bulk_create(batch)
+        return count
@@ -4,10 +4,12 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Sum
 from accounts.models import User
 from store.models import Store, Cashbook
 from transactions.models import TransactionType, TransactionCategory, Transaction, CashbookBalance
+from transactions.counters import rebuild_counters
+from transactions.rollups import rebuild_monthly_rollups
+from transactions.snapshots import rebuild_daily_balances
 
 User = get_user_model()
 
@@ -255,43 +257,27 @@ class Command(BaseCommand):
     def update_cashbook_data(self, cashbook):
         """Update cashbook balance and create balance records"""
         try:
-            transactions = Transaction.objects.filter(cashbook=cashbook)
-            
-            # Calculate totals
-            total_income = transactions.filter(
-                type__nature=TransactionType.INCOME,
-                status=Transaction.STATUS_COMPLETED
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            total_expense = transactions.filter(
-                type__nature=TransactionType.EXPENSE,
-                status=Transaction.STATUS_COMPLETED
-            ).aggregate(total=Sum('amount'))['total'] or 0
+            # bulk_create skips the signals, so recalculate the balance
+            # (transfers count as outflows, like everywhere else)
+            cashbook.recalculate_and_save_balance()
 
-            # Update cashbook current balance
-            new_balance = cashbook.initial_balance + total_income - total_expense
-            cashbook.current_balance = new_balance
-            cashbook.save()
+            # Build the daily balance records from the transactions just created
+            balance_count = rebuild_daily_balances(Cashbook.objects.filter(pk=cashbook.pk))
 
-            # Create sample balance records for the last 30 days
-            for i in range(30):
-                date = timezone.now().date() - timedelta(days=i)
-                CashbookBalance.objects.get_or_create(
-                    cashbook=cashbook,
-                    date=date,
-                    defaults={
-                        'opening_balance': new_balance - i * 100,
-                        'closing_balance': new_balance - (i * 100) + random.uniform(-500, 500),
-                        'total_income': total_income / 30,
-                        'total_expense': total_expense / 30,
-                    }
-                )
+            # The summary reports read whole months from the rollup
+            rollup_count = rebuild_monthly_rollups(Cashbook.objects.filter(pk=cashbook.pk))
+
+            # Transaction counters on the cashbook, types and categories
+            rebuild_counters(Cashbook.objects.filter(pk=cashbook.pk))
 
             self.stdout.write(
                 self.style.SUCCESS(f'Updated cashbook balance: ${cashbook.current_balance:,.2f}')
             )
             self.stdout.write(
-                self.style.SUCCESS('Created 30 days of balance records')
+                self.style.SUCCESS(f'Created {balance_count} daily balance records')
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Created {rollup_count} monthly rollup records')
             )
         except Exception as e:
             self.stdout.write(
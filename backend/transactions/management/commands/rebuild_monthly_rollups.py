@@ -0,0 +1,54 @@
+# backend/transactions/management/commands/rebuild_monthly_rollups.py
+import time
+from django.core.management.base import BaseCommand
+from store.models import Cashbook
+from transactions.rollups import rebuild_monthly_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly transaction rollups used by the report endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cashbook-id',
+            type=int,
+            help='Rebuild rollups for a specific cashbook ID',
+        )
+        parser.add_argument(
+            '--store-id',
+            type=int,
+            help='Rebuild rollups for all cashbooks in a specific store',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows per bulk insert (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        cashbook_id = options.get('cashbook_id')
+        store_id = options.get('store_id')
+
+        cashbooks = Cashbook.objects.all()
+        if cashbook_id:
+            cashbooks = cashbooks.filter(id=cashbook_id)
+        elif store_id:
+            cashbooks = cashbooks.filter(store_id=store_id)
+
+        total_count = cashbooks.count()
+        if not total_count:
+            self.stdout.write(self.style.ERROR('No cashbooks found'))
+            return
+
+        self.stdout.write(f'Rebuilding monthly rollups for {total_count} cashbook(s)...')
+
+        started = time.perf_counter()
+        created_count = rebuild_monthly_rollups(cashbooks, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {created_count} monthly rollup record(s) in {elapsed:.2f}s'
+            )
+        )
@@ -0,0 +1,23 @@
+# backend/transactions/management/commands/rebuild_search_index.py
+import time
+from django.core.management.base import BaseCommand
+from transactions.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Refill the transaction full-text search index from the transactions table'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding transaction search index...')
+
+        started = time.perf_counter()
+        indexed = rebuild_search_index()
+        elapsed = time.perf_counter() - started
+
+        if indexed is None:
+            self.stdout.write(self.style.WARNING('This database engine has no search index, nothing to do'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed} transaction(s) in {elapsed:.2f}s')
+        )
@@ -0,0 +1,44 @@
+# backend/transactions/management/commands/rebuild_transaction_counters.py
+import time
+from django.core.management.base import BaseCommand
+from store.models import Cashbook
+from transactions.counters import CASHBOOK, CATEGORY, TYPE, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized transaction counters on cashbooks, types and categories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cashbook-id',
+            type=int,
+            help='Rebuild cashbook counters for a specific cashbook ID',
+        )
+        parser.add_argument(
+            '--store-id',
+            type=int,
+            help='Rebuild cashbook counters for all cashbooks in a specific store',
+        )
+
+    def handle(self, *args, **options):
+        cashbook_id = options.get('cashbook_id')
+        store_id = options.get('store_id')
+
+        cashbooks = Cashbook.objects.all()
+        if cashbook_id:
+            cashbooks = cashbooks.filter(id=cashbook_id)
+        elif store_id:
+            cashbooks = cashbooks.filter(store_id=store_id)
+
+        self.stdout.write('Rebuilding transaction counters...')
+
+        started = time.perf_counter()
+        updated = rebuild_counters(cashbooks)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Updated {updated[CASHBOOK]} cashbook(s), {updated[TYPE]} type(s) '
+                f'and {updated[CATEGORY]} categor(ies) in {elapsed:.2f}s'
+            )
+        )
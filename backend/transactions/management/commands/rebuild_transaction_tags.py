@@ -0,0 +1,27 @@
+# backend/transactions/management/commands/rebuild_transaction_tags.py
+import time
+from django.core.management.base import BaseCommand
+from transactions.tags import rebuild_transaction_tags
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the indexed transaction tag links from the transactions\' tags lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of transactions read per batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding transaction tags...')
+
+        started = time.perf_counter()
+        tagged, links = rebuild_transaction_tags(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Linked {tagged} transaction(s) to their tags ({links} link(s)) in {elapsed:.2f}s')
+        )
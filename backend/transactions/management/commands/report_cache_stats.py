@@ -0,0 +1,35 @@
+# backend/transactions/management/commands/report_cache_stats.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from transactions.report_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the transaction report cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after showing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        alias = getattr(settings, 'TRANSACTION_REPORT_CACHE', 'default')
+        hit_rate = 'n/a' if stats['hit_rate'] is None else f"{stats['hit_rate']:.1%}"
+
+        self.stdout.write(f'Report cache ({alias}: {settings.CACHES[alias]["BACKEND"]})')
+        self.stdout.write(f'  Hits: {stats["hits"]}')
+        self.stdout.write(f'  Misses: {stats["misses"]}')
+        self.stdout.write(f'  Hit Rate: {hit_rate}')
+        if not stats['shared']:
+            # A command runs in its own process and never sees the workers' counters
+            self.stdout.write(self.style.WARNING(
+                'The cache is local to each process: these counters only cover this command. '
+                'Read GET /api/transactions/report_cache_stats/ from the server instead.'
+            ))
+
+        if options.get('reset'):
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
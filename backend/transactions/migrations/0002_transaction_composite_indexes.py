@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_store_email'),
+        ('transactions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['cashbook', '-transaction_date', '-created_at', 'id'], name='txn_cashbook_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['cashbook', 'status', 'transaction_date', 'created_at'], name='txn_cashbook_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-transaction_date', '-created_at', 'id'], name='txn_date_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'transaction_date'], name='txn_type_date_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:39
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Cashbook = apps.get_model('store', 'Cashbook')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    TransactionType = apps.get_model('transactions', 'TransactionType')
+    TransactionCategory = apps.get_model('transactions', 'TransactionCategory')
+
+    def count(related, **conditions):
+        rows = (
+            Transaction.objects.filter(**{related: OuterRef('pk')}, **conditions)
+            .order_by().values(related).annotate(total=Count('pk')).values('total')
+        )
+        return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+    Cashbook.objects.update(
+        completed_transaction_count=count('cashbook', status='completed'),
+        pending_transaction_count=count('cashbook', status='pending'),
+    )
+    TransactionType.objects.update(transaction_count=count('type'))
+    TransactionCategory.objects.update(transaction_count=count('category'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cashbook_transaction_counters'),
+        ('transactions', '0002_transaction_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactioncategory',
+            name='transaction_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='transactiontype',
+            name='transaction_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    Transaction = apps.get_model('transactions', 'Transaction')
+    TransactionMonthlyRollup = apps.get_model('transactions', 'TransactionMonthlyRollup')
+
+    totals = Transaction.objects.annotate(
+        month=TruncMonth('transaction_date')
+    ).values('cashbook_id', 'month', 'type_id', 'category_id', 'status').annotate(
+        amount_sum=Sum('amount'),
+        row_count=Count('id')
+    ).order_by()
+    TransactionMonthlyRollup.objects.bulk_create(
+        (
+            TransactionMonthlyRollup(
+                cashbook_id=row['cashbook_id'],
+                month=row['month'],
+                type_id=row['type_id'],
+                category_id=row['category_id'],
+                status=row['status'],
+                total_amount=row['amount_sum'],
+                transaction_count=row['row_count'],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cashbook_transaction_counters'),
+        ('transactions', '0003_transaction_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('cashbook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='store.cashbook')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='monthly_rollups', to='transactions.transactioncategory')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='transactions.transactiontype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cashbook', 'month'], name='rollup_cashbook_month_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
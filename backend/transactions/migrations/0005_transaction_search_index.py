@@ -0,0 +1,167 @@
+from django.db import migrations
+
+
+# Document columns, read from a transaction row aliased t
+DOCUMENT_SOURCES = (
+    't.description',
+    't.reference_number',
+    '(SELECT name FROM store_cashbook WHERE id = t.cashbook_id)',
+    '(SELECT name FROM transactions_transactiontype WHERE id = t.type_id)',
+    '(SELECT name FROM transactions_transactioncategory WHERE id = t.category_id)',
+)
+
+SQLITE_COLUMNS = 'rowid, description, reference_number, cashbook_name, type_name, category_name'
+
+SQLITE_INSERT = (
+    'INSERT INTO transactions_transaction_fts ({columns}) SELECT {{row}}.id, {sources} FROM transactions_transaction t '
+    'WHERE t.id = {{row}}.id;'
+).format(columns=SQLITE_COLUMNS, sources=', '.join(DOCUMENT_SOURCES))
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE transactions_transaction_fts USING fts5(
+        description, reference_number, cashbook_name, type_name, category_name,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER transactions_transaction_fts_insert AFTER INSERT ON transactions_transaction BEGIN
+        {SQLITE_INSERT.format(row='NEW')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER transactions_transaction_fts_update
+    AFTER UPDATE OF description, reference_number, cashbook_id, type_id, category_id ON transactions_transaction BEGIN
+        DELETE FROM transactions_transaction_fts WHERE rowid = OLD.id;
+        {SQLITE_INSERT.format(row='NEW')}
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_transaction_fts_delete AFTER DELETE ON transactions_transaction BEGIN
+        DELETE FROM transactions_transaction_fts WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER store_cashbook_fts_rename AFTER UPDATE OF name ON store_cashbook BEGIN
+        UPDATE transactions_transaction_fts SET cashbook_name = NEW.name
+        WHERE rowid IN (SELECT id FROM transactions_transaction WHERE cashbook_id = NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_transactiontype_fts_rename AFTER UPDATE OF name ON transactions_transactiontype BEGIN
+        UPDATE transactions_transaction_fts SET type_name = NEW.name
+        WHERE rowid IN (SELECT id FROM transactions_transaction WHERE type_id = NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_transactioncategory_fts_rename AFTER UPDATE OF name ON transactions_transactioncategory BEGIN
+        UPDATE transactions_transaction_fts SET category_name = NEW.name
+        WHERE rowid IN (SELECT id FROM transactions_transaction WHERE category_id = NEW.id);
+    END
+    """,
+    'INSERT INTO transactions_transaction_fts ({columns}) SELECT t.id, {sources} FROM transactions_transaction t'.format(
+        columns=SQLITE_COLUMNS, sources=', '.join(DOCUMENT_SOURCES)
+    ),
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS transactions_transactioncategory_fts_rename',
+    'DROP TRIGGER IF EXISTS transactions_transactiontype_fts_rename',
+    'DROP TRIGGER IF EXISTS store_cashbook_fts_rename',
+    'DROP TRIGGER IF EXISTS transactions_transaction_fts_delete',
+    'DROP TRIGGER IF EXISTS transactions_transaction_fts_update',
+    'DROP TRIGGER IF EXISTS transactions_transaction_fts_insert',
+    'DROP TABLE IF EXISTS transactions_transaction_fts',
+]
+
+POSTGRES_DOCUMENT = "to_tsvector('simple', concat_ws(' ', {}))".format(', '.join(DOCUMENT_SOURCES))
+
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE transactions_transaction_search (
+        transaction_id bigint PRIMARY KEY
+            REFERENCES transactions_transaction (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    'CREATE INDEX transactions_transaction_search_idx ON transactions_transaction_search USING GIN (document)',
+    f"""
+    CREATE FUNCTION transactions_transaction_search_refresh() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO transactions_transaction_search (transaction_id, document)
+        SELECT t.id, {POSTGRES_DOCUMENT} FROM transactions_transaction t WHERE t.id = NEW.id
+        ON CONFLICT (transaction_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER transactions_transaction_search_insert AFTER INSERT ON transactions_transaction
+    FOR EACH ROW EXECUTE FUNCTION transactions_transaction_search_refresh()
+    """,
+    """
+    CREATE TRIGGER transactions_transaction_search_update
+    AFTER UPDATE OF description, reference_number, cashbook_id, type_id, category_id ON transactions_transaction
+    FOR EACH ROW EXECUTE FUNCTION transactions_transaction_search_refresh()
+    """,
+    f"""
+    CREATE FUNCTION transactions_transaction_search_rename() RETURNS trigger AS $$
+    BEGIN
+        UPDATE transactions_transaction_search s SET document = {POSTGRES_DOCUMENT}
+        FROM transactions_transaction t
+        WHERE s.transaction_id = t.id AND (
+            (TG_TABLE_NAME = 'store_cashbook' AND t.cashbook_id = NEW.id)
+            OR (TG_TABLE_NAME = 'transactions_transactiontype' AND t.type_id = NEW.id)
+            OR (TG_TABLE_NAME = 'transactions_transactioncategory' AND t.category_id = NEW.id)
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    *[
+        f"""
+        CREATE TRIGGER {table}_search_rename AFTER UPDATE OF name ON {table}
+        FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+        EXECUTE FUNCTION transactions_transaction_search_rename()
+        """
+        for table in ('store_cashbook', 'transactions_transactiontype', 'transactions_transactioncategory')
+    ],
+    f"""
+    INSERT INTO transactions_transaction_search (transaction_id, document)
+    SELECT t.id, {POSTGRES_DOCUMENT} FROM transactions_transaction t
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    *[
+        f'DROP TRIGGER IF EXISTS {table}_search_rename ON {table}'
+        for table in ('store_cashbook', 'transactions_transactiontype', 'transactions_transactioncategory')
+    ],
+    'DROP TRIGGER IF EXISTS transactions_transaction_search_update ON transactions_transaction',
+    'DROP TRIGGER IF EXISTS transactions_transaction_search_insert ON transactions_transaction',
+    'DROP FUNCTION IF EXISTS transactions_transaction_search_rename()',
+    'DROP FUNCTION IF EXISTS transactions_transaction_search_refresh()',
+    'DROP TABLE IF EXISTS transactions_transaction_search',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cashbook_transaction_counters'),
+        ('transactions', '0004_transaction_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_tags(apps, schema_editor):
+    Transaction = apps.get_model('transactions', 'Transaction')
+    Tag = apps.get_model('transactions', 'Tag')
+    TransactionTag = apps.get_model('transactions', 'TransactionTag')
+
+    # Same normalization as transactions.tags.tag_names
+    links = []
+    for transaction_id, tags in Transaction.objects.values_list('id', 'tags').iterator():
+        if isinstance(tags, str):
+            tags = [tags]
+        elif not isinstance(tags, list):
+            continue
+        names = {
+            str(value).strip()[:100] for value in tags
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool)
+        }
+        links.extend((transaction_id, name) for name in names if name)
+
+    Tag.objects.bulk_create(
+        [Tag(name=name) for name in sorted({name for _, name in links})], batch_size=1000
+    )
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+    TransactionTag.objects.bulk_create(
+        (TransactionTag(transaction_id=transaction_id, tag_id=tag_ids[name]) for transaction_id, name in links),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_transaction_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_links', to='transactions.tag')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='transactions.transaction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transactiontag',
+            index=models.Index(fields=['tag', 'transaction'], name='txn_tag_tag_txn_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transactiontag',
+            unique_together={('transaction', 'tag')},
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-17 09:12
+
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+def backfill_daily_balances(apps, schema_editor):
+    Cashbook = apps.get_model('store', 'Cashbook')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    CashbookBalance = apps.get_model('transactions', 'CashbookBalance')
+
+    # Same rows as transactions.snapshots.rebuild_daily_balances: a day
+    # created by the write path before any earlier snapshot existed opened
+    # from the initial balance, ignoring the transactions before it
+    initial_balances = dict(Cashbook.objects.values_list('id', 'initial_balance'))
+    daily_totals = Transaction.objects.filter(status='completed').values(
+        'cashbook_id', 'transaction_date'
+    ).annotate(
+        income=Sum('amount', filter=Q(type__nature='income')),
+        expense=Sum('amount', filter=~Q(type__nature='income'))
+    ).order_by('cashbook_id', 'transaction_date')
+
+    CashbookBalance.objects.all().delete()
+
+    batch = []
+    current_cashbook = None
+    balance = Decimal('0.00')
+    for row in daily_totals.iterator():
+        if row['cashbook_id'] != current_cashbook:
+            current_cashbook = row['cashbook_id']
+            balance = Decimal(str(initial_balances[current_cashbook]))
+
+        income = row['income'] or Decimal('0.00')
+        expense = row['expense'] or Decimal('0.00')
+        opening = balance
+        balance = opening + income - expense
+        batch.append(CashbookBalance(
+            cashbook_id=current_cashbook,
+            date=row['transaction_date'],
+            opening_balance=opening,
+            closing_balance=balance,
+            total_income=income,
+            total_expense=expense
+        ))
+
+        if len(batch) >= 1000:
+            CashbookBalance.objects.bulk_create(batch)
+            batch = []
+
+    if batch:
+        CashbookBalance.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cashbook_transaction_counters'),
+        ('transactions', '0007_cashbookbalance_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_balances, migrations.RunPython.noop),
+    ]
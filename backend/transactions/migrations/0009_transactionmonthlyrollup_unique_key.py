@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:00
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    TransactionMonthlyRollup = apps.get_model('transactions', 'TransactionMonthlyRollup')
+
+    # Concurrent first writes could insert the same key twice: keep the
+    # oldest row with the summed totals
+    key = ('cashbook_id', 'month', 'type_id', 'category_id', 'status')
+    duplicates = TransactionMonthlyRollup.objects.values(*key).annotate(
+        first_id=Min('id'),
+        amount_sum=Sum('total_amount'),
+        count_sum=Sum('transaction_count'),
+        row_count=Count('id')
+    ).filter(row_count__gt=1).order_by()
+    for row in list(duplicates):
+        rows = TransactionMonthlyRollup.objects.filter(**{field: row[field] for field in key})
+        rows.exclude(pk=row['first_id']).delete()
+        rows.update(total_amount=row['amount_sum'], transaction_count=row['count_sum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cashbook_transaction_counters'),
+        ('transactions', '0008_backfill_daily_balances'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transactionmonthlyrollup',
+            constraint=models.UniqueConstraint(models.F('cashbook'), models.F('month'), models.F('type'), django.db.models.functions.comparison.Coalesce('category', 0), models.F('status'), name='rollup_unique_key'),
+        ),
+    ]
@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
 from accounts.models import User
+from accounts.utils.field_tracking import FieldTrackerMixin
 from store.models import Cashbook
+from .accumulator import atomic_with_balances
+from .balance import TransactionState
 import uuid
 
 class TransactionType(models.Model):
@@ -18,6 +22,8 @@ class TransactionType(models.Model):
     name = models.CharField(max_length=100, unique=True)
     nature = models.CharField(max_length=10, choices=TYPE_CHOICES, default=EXPENSE)
     is_active = models.BooleanField(default=True)
+    # Maintained by the transaction signals (see transactions.counters)
+    transaction_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -28,13 +34,15 @@ class TransactionCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Maintained by the transaction signals (see transactions.counters)
+    transaction_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
-class Transaction(models.Model):
+class Transaction(FieldTrackerMixin, models.Model):
     STATUS_PENDING = 'pending'
     STATUS_COMPLETED = 'completed'
     STATUS_CANCELLED = 'cancelled'
@@ -45,6 +53,11 @@ class Transaction(models.Model):
         (STATUS_CANCELLED, 'Cancelled'),
     ]
     
+    # Fields whose loaded values are remembered so the tag links are only
+    # rewritten when tags change and rows deleted through a queryset carry
+    # the state they were collected with (see FieldTrackerMixin)
+    tracked_fields = ('cashbook', 'status', 'amount', 'type', 'category', 'transaction_date', 'tags')
+    
     transaction_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     cashbook = models.ForeignKey(Cashbook, on_delete=models.CASCADE, related_name="transactions")
     amount = models.DecimalField(max_digits=15, decimal_places=2, validators=[MinValueValidator(0.01)])
@@ -65,10 +78,81 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-transaction_date', '-created_at']
+        indexes = [
+            # Cashbook ledgers and by_cashbook lists, in list/keyset order
+            models.Index(fields=['cashbook', '-transaction_date', '-created_at', 'id'], name='txn_cashbook_date_idx'),
+            # Balance aggregates and status filters (pending) per cashbook
+            models.Index(fields=['cashbook', 'status', 'transaction_date', 'created_at'], name='txn_cashbook_status_idx'),
+            # Store-wide lists and date ranges across many cashbooks
+            models.Index(fields=['-transaction_date', '-created_at', 'id'], name='txn_date_created_idx'),
+            # Type filters and by_type reports over a date range
+            models.Index(fields=['type', 'transaction_date'], name='txn_type_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_id} - {self.type.name} - {self.amount}"
 
+    def save(self, *args, **kwargs):
+        # The balance signals read the stored row under a lock (see
+        # transactions.signals), so the read and the write share a transaction
+        with _write_block():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the row, undoing the state stored in the database rather
+        than the one this (possibly stale) instance was loaded with
+        """
+        with _write_block():
+            self._old_state = TransactionState.from_database(self.pk)
+            if self._old_state is None:
+                # Already deleted by another writer
+                return 0, {}
+            return super().delete(*args, **kwargs)
+
+
+def _write_block():
+    """
+    Block for a single save or delete. On its own it applies its balance
+    change before committing; inside a caller's atomic block the change is
+    left to that block, so a loop of saves is applied in one go.
+    """
+    if db_transaction.get_connection().in_atomic_block:
+        return db_transaction.atomic(savepoint=False)
+    return atomic_with_balances()
+
+
+class Tag(models.Model):
+    """A distinct transaction tag name (see transactions.tags)"""
+    name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class TransactionTag(models.Model):
+    """
+    Link between a transaction and one of the tags in its tags list: the
+    indexed copy of Transaction.tags, kept in sync by the transaction
+    signals (see transactions.tags)
+    """
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name="tag_links")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="transaction_links")
+
+    class Meta:
+        unique_together = ['transaction', 'tag']
+        indexes = [
+            # Tag filters and by_tag reports start from the tag
+            models.Index(fields=['tag', 'transaction'], name='txn_tag_tag_txn_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} - {self.tag_id}"
+
 # Add the missing CashbookBalance model
 class CashbookBalance(models.Model):
     cashbook = models.ForeignKey(Cashbook, on_delete=models.CASCADE, related_name="balances")
@@ -77,10 +161,47 @@ class CashbookBalance(models.Model):
     closing_balance = models.DecimalField(max_digits=15, decimal_places=2)
     total_income = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     total_expense = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    # Also set by the F() updates in transactions.snapshots, so the list
+    # ETag moves with every balance change (see transactions.conditional)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['cashbook', 'date']
         ordering = ['-date']
 
     def __str__(self):
-        return f"{self.cashbook.name} - {self.date} - {self.closing_balance}"
\ No newline at end of file
+        return f"{self.cashbook.name} - {self.date} - {self.closing_balance}"
+
+
+class TransactionMonthlyRollup(models.Model):
+    """
+    Transaction totals per cashbook, month, type, category and status.
+    Maintained by the transaction signals and rebuilt by the
+    rebuild_monthly_rollups command (see transactions.rollups).
+    """
+    cashbook = models.ForeignKey(Cashbook, on_delete=models.CASCADE, related_name="monthly_rollups")
+    # First day of the month
+    month = models.DateField()
+    type = models.ForeignKey(TransactionType, on_delete=models.CASCADE, related_name="monthly_rollups")
+    category = models.ForeignKey(
+        TransactionCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name="monthly_rollups"
+    )
+    status = models.CharField(max_length=10, choices=Transaction.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        # One row per key. Category is nullable and NULLs never clash in a
+        # unique index, so the key uses the category coalesced to 0.
+        constraints = [
+            models.UniqueConstraint(
+                'cashbook', 'month', 'type', Coalesce('category', 0), 'status',
+                name='rollup_unique_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['cashbook', 'month'], name='rollup_cashbook_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cashbook_id} - {self.month:%Y-%m} - {self.type_id}/{self.category_id} - {self.status}"
@@ -0,0 +1,169 @@
+# backend/transactions/pagination.py
+"""
+Keyset (cursor) pagination for transaction lists.
+
+Pages are addressed by the position of the last row seen instead of an
+OFFSET, and no COUNT(*) is run, so fetching page 1,000 costs the same as
+fetching page 1. The position is the composite key (transaction_date,
+created_at, id), which is unique, so rows sharing a date are never skipped
+or repeated between pages.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Cursor pagination ordered by (-transaction_date, -created_at, id).
+
+    Responses look like DRF's CursorPagination: {"next", "previous",
+    "results"}. Follow the next/previous links to move between pages.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-transaction_date', '-created_at', 'id')
+    # Fields the cursor position is read from
+    position_fields = ('transaction_date', 'created_at')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def page_window(self, queryset, request):
+        """
+        The rows a page is read from: ordered, after the cursor position and
+        limited to page_size + 1 (the extra row tells whether there is more).
+        Its cost doesn't depend on how many rows the queryset has.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self._ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, ordering))
+        return queryset[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        rows = list(self.page_window(queryset, request))
+        position, reverse = self.decode_cursor(request)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Moving forward there's a previous page whenever we started from a
+        # cursor; moving backward there's always a next page
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 20
+        value = request.query_params.get(self.page_size_query_param)
+        if value:
+            try:
+                page_size = int(value)
+            except ValueError:
+                pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = 1
+        token = urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        """Return (position, reverse) from the cursor param, or (None, False) for the first page"""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode()).decode())
+            transaction_date, created_at, pk = payload['p']
+            position = (
+                date.fromisoformat(transaction_date),
+                datetime.fromisoformat(created_at),
+                int(pk),
+            )
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
+
+    def _position(self, transaction):
+        if isinstance(transaction, dict):
+            # .values() row (see transactions.fast_serializers)
+            return [
+                transaction['transaction_date'].isoformat(),
+                transaction['created_at'].isoformat(),
+                transaction['id'],
+            ]
+        return [
+            transaction.transaction_date.isoformat(),
+            transaction.created_at.isoformat(),
+            transaction.pk,
+        ]
+
+    def _ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering)
+
+    def _after(self, position, ordering):
+        """
+        Build the keyset condition for rows that come after position in the
+        given ordering: (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        with the comparison flipped for descending fields.
+        """
+        fields = [field.lstrip('-') for field in ordering]
+        condition = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {fields[i]: position[i] for i in range(index)}
+            condition |= Q(**equal, **{f'{fields[index]}__{lookup}': position[index]})
+
+        # Bound the leading column too, so an index on it can be range-scanned
+        leading = 'lte' if ordering[0].startswith('-') else 'gte'
+        return condition & Q(**{f'{fields[0]}__{leading}': position[0]})
@@ -0,0 +1,178 @@
+# backend/transactions/report_cache.py
+"""
+Versioned response cache for the transaction report endpoints (summary,
+by_category, by_type, by_tag, timeseries).
+
+Entries are keyed by the endpoint, the stores the report covers together
+with each store's generation, and the normalized query params. Every
+committed transaction write bumps the generation of the stores it touched
+(see transactions.accumulator), and type/category changes bump a shared
+catalog generation, so a request made after a write computes a new key:
+stale entries are never served and simply expire, no purge is needed.
+The same generations feed the list ETags (see transactions.conditional).
+
+Entries, generations and the hit/miss counters all live in the cache alias
+named by TRANSACTION_REPORT_CACHE, which must be shared by the workers
+(file based or database cache, see CACHES in settings). With a
+local-memory cache each worker keeps its own entries and counters, and
+the counters are only visible from the serving process (GET
+/api/transactions/report_cache_stats/).
+"""
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+
+KEY_PREFIX = 'report_cache'
+HITS_KEY = f'{KEY_PREFIX}:hits'
+MISSES_KEY = f'{KEY_PREFIX}:misses'
+
+# Generation bumped when transaction types or categories change, since
+# by_type and by_category responses include their names
+CATALOG = 'catalog'
+
+# Query params that don't change a report
+IGNORED_PARAMS = {'page', 'page_size', 'pagination', 'cursor', 'ordering', 'format'}
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'TRANSACTION_REPORT_CACHE', 'default')]
+
+
+def is_shared():
+    """Whether every worker reads the same entries and counters"""
+    from store.access import is_shared_cache
+    return is_shared_cache(get_cache())
+
+
+def _generation_key(name):
+    return f'{KEY_PREFIX}:generation:{name}'
+
+
+def get_generations(names):
+    """
+    Return {name: generation} with one cache round trip.
+
+    A missing generation (never bumped, or evicted) starts from the current
+    time in nanoseconds rather than 0, so it can't line up with entries
+    keyed on an earlier counter.
+    """
+    cache = get_cache()
+    keys = {name: _generation_key(name) for name in names}
+    found = cache.get_many(keys.values())
+
+    generations = {}
+    for name, key in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        generations[name] = found[key]
+    return generations
+
+
+def store_generation_names(store_ids):
+    """Generation names covering the given stores and the type/category catalog"""
+    return [f'store:{store_id}' for store_id in sorted(set(store_ids))] + [CATALOG]
+
+
+def bump_generations(names):
+    """Move the given generations on, so entries built on them are no longer read"""
+    cache = get_cache()
+    for name in names:
+        try:
+            cache.incr(_generation_key(name))
+        except ValueError:
+            # Not set yet: the next read starts a fresh generation anyway
+            pass
+
+
+def invalidate_stores(store_ids):
+    """Bump the generations of the given stores"""
+    bump_generations(f'store:{store_id}' for store_id in set(store_ids))
+
+
+def invalidate_cashbooks(cashbook_ids):
+    """Bump the generations of the stores owning the given cashbooks"""
+    from store.models import Cashbook
+
+    if not cashbook_ids:
+        return
+    invalidate_stores(Cashbook.objects.filter(pk__in=cashbook_ids).values_list('store_id', flat=True))
+
+
+def normalize_params(query_params):
+    """Sorted (name, values) pairs of the params that affect a report"""
+    return sorted(
+        (name, sorted(value for value in values if value != ''))
+        for name, values in query_params.lists()
+        if name not in IGNORED_PARAMS and any(value != '' for value in values)
+    )
+
+
+def build_key(report, store_ids, query_params):
+    """
+    Build the cache key for a report.
+
+    Args:
+        report: Report name, e.g. the viewset action
+        store_ids: Stores whose transactions the report covers
+        query_params: Request query params
+    """
+    names = store_generation_names(store_ids)
+    generations = get_generations(names)
+    payload = json.dumps(
+        [report, [[name, generations[name]] for name in names], normalize_params(query_params)],
+        default=str
+    )
+    return f'{KEY_PREFIX}:entry:{hashlib.sha256(payload.encode()).hexdigest()}'
+
+
+def get_or_compute(key, compute):
+    """
+    Return (data, hit): the cached data for key, or compute() stored under key.
+    """
+    cache = get_cache()
+    data = cache.get(key, _MISSING)
+    if data is not _MISSING:
+        _increment(HITS_KEY)
+        return data, True
+
+    data = compute()
+    cache.set(key, data, getattr(settings, 'TRANSACTION_REPORT_CACHE_TIMEOUT', 300))
+    _increment(MISSES_KEY)
+    return data, False
+
+
+def _increment(key):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(key, 1, timeout=None)
+
+
+def get_stats():
+    """
+    Return the hit/miss counters, the hit rate and whether the counters
+    are shared by every worker (otherwise they only cover this process).
+    """
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'shared': is_shared(),
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,332 @@
+# backend/transactions/rollups.py
+"""
+Monthly transaction rollups.
+
+Each TransactionMonthlyRollup row holds the amount sum and row count of one
+cashbook's transactions for a (month, type, category, status). Rows are
+maintained incrementally by the transaction signals through the balance
+accumulator; rebuild_monthly_rollups() recreates them from transactions.
+
+The summary, by_category and by_type reports read whole months from the
+rollup and only the partial months at the edges of a date range from the
+transactions table, so a yearly report costs O(months) instead of
+O(transactions).
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .balance import ZERO
+from .report_cache import invalidate_cashbooks
+
+
+# Report params the rollup has no column for; they force a raw query
+RAW_ONLY_PARAMS = ('transaction_date', 'created_by', 'search', 'tags', 'tags_all')
+
+# Report params answered from the rollup, with their rollup lookups
+ROLLUP_FILTERS = (
+    ('store', 'cashbook__store_id'),
+    ('cashbook', 'cashbook_id'),
+    ('type', 'type_id'),
+    ('category', 'category_id'),
+)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def monthly_deltas(old_state=None, new_state=None):
+    """
+    Work out the rollup changes caused by a write.
+
+    Args:
+        old_state: TransactionState before the write (None on create)
+        new_state: TransactionState after the write (None on delete)
+
+    Returns:
+        dict mapping (cashbook_id, month, type_id, category_id, status) to
+        (amount, count) deltas, leaving out rows that don't change
+    """
+    deltas = defaultdict(lambda: [ZERO, 0])
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None or state.type_id is None:
+            continue
+        key = (
+            state.cashbook_id, month_start(state.transaction_date),
+            state.type_id, state.category_id, state.status,
+        )
+        deltas[key][0] += sign * Decimal(str(state.amount))
+        deltas[key][1] += sign
+    return {key: tuple(value) for key, value in deltas.items() if any(value)}
+
+
+def rollup_sort_key(key):
+    """Sort key for monthly_deltas() keys (category may be None)"""
+    cashbook_id, month, type_id, category_id, status = key
+    return (cashbook_id, month, type_id, category_id or 0, status)
+
+
+def apply_monthly_delta(cashbook_id, month, type_id, category_id, status, amount, count):
+    """
+    Shift one rollup row by (amount, count), creating it when missing.
+    The row is unique (see TransactionMonthlyRollup.Meta), so a writer that
+    loses the race to create it updates the other writer's row instead.
+    """
+    from store.models import Cashbook
+    from .models import TransactionMonthlyRollup
+
+    rows = TransactionMonthlyRollup.objects.filter(
+        cashbook_id=cashbook_id, month=month, type_id=type_id,
+        category_id=category_id, status=status
+    )
+    changes = {
+        'total_amount': F('total_amount') + amount,
+        'transaction_count': F('transaction_count') + count,
+    }
+    if rows.update(**changes):
+        return
+
+    if not Cashbook.objects.filter(pk=cashbook_id).exists():
+        # Cashbook is being deleted
+        return
+    try:
+        with db_transaction.atomic():
+            TransactionMonthlyRollup.objects.create(
+                cashbook_id=cashbook_id, month=month, type_id=type_id,
+                category_id=category_id, status=status,
+                total_amount=amount, transaction_count=count
+            )
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(**changes)
+
+
+def merge_category_rollups(category_id):
+    """
+    Fold a category's rows into the uncategorized rows of the same key.
+    Runs before the category is deleted: setting its rows' category to
+    NULL would otherwise clash with existing uncategorized rows.
+    """
+    from .models import TransactionMonthlyRollup
+
+    merged_ids = []
+    for row in TransactionMonthlyRollup.objects.filter(category_id=category_id):
+        merged = TransactionMonthlyRollup.objects.filter(
+            cashbook_id=row.cashbook_id, month=row.month, type_id=row.type_id,
+            category__isnull=True, status=row.status
+        ).update(
+            total_amount=F('total_amount') + row.total_amount,
+            transaction_count=F('transaction_count') + row.transaction_count
+        )
+        if merged:
+            merged_ids.append(row.pk)
+        else:
+            row.category_id = None
+            row.save(update_fields=['category'])
+    TransactionMonthlyRollup.objects.filter(pk__in=merged_ids).delete()
+
+
+def rebuild_monthly_rollups(cashbooks, batch_size=1000):
+    """
+    Recreate the rollups for the given cashbooks with one GROUP BY query
+    over (cashbook, month, type, category, status).
+
+    Args:
+        cashbooks: Cashbook queryset
+        batch_size: Rows per bulk insert
+
+    Returns:
+        Number of rollup rows created
+    """
+    from .models import Transaction, TransactionMonthlyRollup
+
+    cashbook_ids = list(cashbooks.values_list('id', flat=True))
+    totals = Transaction.objects.filter(cashbook_id__in=cashbook_ids).annotate(
+        month=TruncMonth('transaction_date')
+    ).values('cashbook_id', 'month', 'type_id', 'category_id', 'status').annotate(
+        amount_sum=Sum('amount'),
+        row_count=Count('id')
+    ).order_by()
+
+    created_count = 0
+    with db_transaction.atomic():
+        TransactionMonthlyRollup.objects.filter(cashbook_id__in=cashbook_ids).delete()
+
+        batch = []
+        for row in totals.iterator():
+            batch.append(TransactionMonthlyRollup(
+                cashbook_id=row['cashbook_id'],
+                month=row['month'],
+                type_id=row['type_id'],
+                category_id=row['category_id'],
+                status=row['status'],
+                total_amount=row['amount_sum'],
+                transaction_count=row['row_count']
+            ))
+
+            if len(batch) >= batch_size:
+                TransactionMonthlyRollup.objects.bulk_create(batch)
+                created_count += len(batch)
+                batch = []
+
+        if batch:
+            TransactionMonthlyRollup.objects.bulk_create(batch)
+            created_count += len(batch)
+
+        db_transaction.on_commit(lambda: invalidate_cashbooks(cashbook_ids))
+
+    return created_count
+
+
+def split_period(start_date=None, end_date=None):
+    """
+    Split an inclusive date range into whole months and partial edges.
+
+    Returns:
+        (month_from, month_to, edges): whole months satisfy
+        month_from <= month < month_to (None is unbounded) and edges is a
+        list of (first_day, last_day) ranges to read from transactions
+    """
+    month_from = month_to = None
+    edges = []
+
+    if start_date is not None:
+        month_from = month_start(start_date)
+        if start_date != month_from:
+            month_from = next_month(month_from)
+            last_day = month_from - timedelta(days=1)
+            edges.append((start_date, min(last_day, end_date) if end_date else last_day))
+
+    if end_date is not None:
+        month_to = next_month(month_start(end_date))
+        if end_date != month_to - timedelta(days=1):
+            month_to = month_start(end_date)
+            # Already covered when the range starts mid-month in the same month
+            if not (edges and month_start(start_date) == month_to):
+                edges.append((max(month_to, start_date) if start_date else month_to, end_date))
+
+    return month_from, month_to, edges
+
+
+def rollup_sources(transactions, params, store_ids):
+    """
+    Split a report into rollup rows for whole months and raw transactions
+    for partial edge months.
+
+    Args:
+        transactions: Transaction queryset with every report filter applied
+        params: Request query params
+        store_ids: Stores the requesting user can see
+
+    Returns:
+        (rollups, transactions) where transactions is None when there are
+        no partial months, or (None, transactions) when the filters can't
+        be answered from the rollup
+    """
+    from .models import TransactionMonthlyRollup
+
+    if any(params.get(name) for name in RAW_ONLY_PARAMS):
+        return None, transactions
+
+    filters = {}
+    try:
+        start_date = params.get('start_date')
+        start_date = date.fromisoformat(start_date) if start_date else None
+        end_date = params.get('end_date')
+        end_date = date.fromisoformat(end_date) if end_date else None
+        for name, lookup in ROLLUP_FILTERS:
+            if params.get(name):
+                filters[lookup] = int(params.get(name))
+    except ValueError:
+        return None, transactions
+    if params.get('status'):
+        filters['status'] = params.get('status')
+
+    month_from, month_to, edges = split_period(start_date, end_date)
+    if month_from is not None:
+        filters['month__gte'] = month_from
+    if month_to is not None:
+        filters['month__lt'] = month_to
+
+    rollups = TransactionMonthlyRollup.objects.filter(
+        cashbook__store_id__in=store_ids, transaction_count__gt=0, **filters
+    )
+
+    if not edges:
+        return rollups, None
+    in_edges = Q()
+    for first_day, last_day in edges:
+        in_edges |= Q(transaction_date__gte=first_day, transaction_date__lte=last_day)
+    return rollups, transactions.filter(in_edges)
+
+
+def _sources(rollups, transactions):
+    """(queryset, amount field, row count expression) for the sources in use"""
+    sources = []
+    if rollups is not None:
+        sources.append((rollups, 'total_amount', Sum('transaction_count')))
+    if transactions is not None:
+        sources.append((transactions, 'amount', Count('id')))
+    return sources
+
+
+def summary_totals(rollups, transactions):
+    """
+    Totals for the summary report over rollup rows plus raw transactions
+    (either may be None).
+
+    Returns:
+        dict with total_transactions, total_amount, total_income,
+        total_expense and average_transaction
+    """
+    from .models import TransactionType
+
+    totals = defaultdict(int)
+    for queryset, amount, count in _sources(rollups, transactions):
+        # Aliases differ from the rollup's column names, which they would shadow
+        values = queryset.aggregate(
+            row_count=count,
+            amount_sum=Sum(amount),
+            income_sum=Sum(amount, filter=Q(type__nature=TransactionType.INCOME)),
+            expense_sum=Sum(amount, filter=Q(type__nature=TransactionType.EXPENSE)),
+        )
+        totals['total_transactions'] += values['row_count'] or 0
+        totals['total_amount'] += values['amount_sum'] or 0
+        totals['total_income'] += values['income_sum'] or 0
+        totals['total_expense'] += values['expense_sum'] or 0
+
+    count = totals['total_transactions']
+    totals['average_transaction'] = (Decimal(totals['total_amount']) / count).quantize(ZERO) if count else 0
+    return dict(totals)
+
+
+def group_totals(rollups, transactions, fields):
+    """
+    total_amount and transaction_count per group of fields over rollup rows
+    plus raw transactions, largest total first.
+
+    Args:
+        fields: Lookups to group by, valid on both models (e.g. 'type__name')
+    """
+    groups = {}
+    for queryset, amount, count in _sources(rollups, transactions):
+        rows = queryset.values(*fields).annotate(amount_sum=Sum(amount), row_count=count).order_by()
+        for row in rows:
+            key = tuple(row[field] for field in fields)
+            group = groups.setdefault(key, {
+                **{field: row[field] for field in fields},
+                'total_amount': 0,
+                'transaction_count': 0,
+            })
+            group['total_amount'] += row['amount_sum'] or 0
+            group['transaction_count'] += row['row_count']
+
+    return sorted(groups.values(), key=lambda group: group['total_amount'], reverse=True)
@@ -0,0 +1,291 @@
+# backend/transactions/search.py
+"""
+Indexed, ranked full-text search over transactions.
+
+The index covers the description, reference number, cashbook name, type
+name and category name of every transaction. It is chosen by database
+engine and kept current by database triggers (installed by migration
+0005_transaction_search_index), so saves, bulk inserts, queryset updates
+and renames of cashbooks, types or categories are all reflected. SQLite
+alters a table by rebuilding it, which drops the table's triggers and fails
+on triggers of other tables that read it, so on SQLite the triggers are
+dropped before migrations run and re-created afterwards (see
+drop_search_triggers and install_search_triggers):
+
+- SQLite: an FTS5 table, transactions_transaction_fts, keyed by the
+  transaction id (rowid) and ranked with bm25
+- PostgreSQL: transactions_transaction_search, a tsvector per transaction
+  with a GIN index, ranked with ts_rank
+
+Every word of the search text must match the start of a word in one of
+the fields (prefix search). Other engines fall back to unindexed
+icontains matching.
+"""
+import re
+import uuid
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+
+SQLITE_TABLE = 'transactions_transaction_fts'
+POSTGRES_TABLE = 'transactions_transaction_search'
+
+# Annotation holding the relevance of each match (higher is better)
+RANK = 'search_rank'
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def search_words(value):
+    return WORD_PATTERN.findall(value or '')
+
+
+def is_indexed():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _sqlite_query(words):
+    # Quoted, so words like AND/OR/NEAR are matched as text
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _postgres_query(words):
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def _index_filter(table, query):
+    """
+    Filter and rank expressions reading the index for the current engine.
+
+    The filter is an id IN (matching index rows) lookup, which the planner
+    drives from the few matching index rows instead of walking every
+    transaction the other filters allow. The rank is looked up per result
+    row by transaction id.
+    """
+    if connection.vendor == 'sqlite':
+        matches = RawSQL(f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s', [query])
+        # bm25() is lower for better matches
+        rank = RawSQL(
+            f'SELECT -bm25({SQLITE_TABLE}) FROM {SQLITE_TABLE} '
+            f'WHERE {SQLITE_TABLE} MATCH %s AND {SQLITE_TABLE}.rowid = "{table}"."id"',
+            [query], output_field=FloatField()
+        )
+        return matches, rank
+
+    matches = RawSQL(
+        f"SELECT transaction_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('simple', %s)", [query]
+    )
+    rank = RawSQL(
+        f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {POSTGRES_TABLE} "
+        f'WHERE {POSTGRES_TABLE}.transaction_id = "{table}"."id"',
+        [query], output_field=FloatField()
+    )
+    return matches, rank
+
+
+def search_transactions(queryset, value, rank=False):
+    """
+    Filter a Transaction queryset to the rows matching value.
+
+    Args:
+        queryset: Transaction queryset
+        value: Search text
+        rank: Select RANK and order by it, best match first
+
+    Returns:
+        Filtered queryset (unchanged when value has no words)
+    """
+    words = search_words(value)
+    if not words:
+        return queryset
+
+    # A pasted transaction_id finds that transaction
+    try:
+        return queryset.filter(transaction_id=uuid.UUID(value.strip()))
+    except ValueError:
+        pass
+
+    if not is_indexed():
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(description__icontains=word) |
+                Q(reference_number__icontains=word) |
+                Q(cashbook__name__icontains=word) |
+                Q(type__name__icontains=word) |
+                Q(category__name__icontains=word)
+            )
+        return queryset.filter(condition)
+
+    query = _sqlite_query(words) if connection.vendor == 'sqlite' else _postgres_query(words)
+    matches, rank_expression = _index_filter(queryset.model._meta.db_table, query)
+    queryset = queryset.filter(pk__in=matches)
+    if not rank:
+        return queryset
+    return queryset.annotate(**{RANK: rank_expression}).order_by(
+        f'-{RANK}', *queryset.model._meta.ordering
+    )
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Refill the search index from the transactions table.
+
+    Args:
+        using: Database alias
+
+    Returns:
+        Number of indexed transactions (None on engines without an index)
+    """
+    db = connections[using]
+    if db.vendor not in REBUILD_SQL:
+        return None
+
+    with db.cursor() as cursor:
+        for statement in REBUILD_SQL[db.vendor]:
+            cursor.execute(statement)
+        cursor.execute(f'SELECT COUNT(*) FROM {SQLITE_TABLE if db.vendor == "sqlite" else POSTGRES_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def drop_search_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Drop the SQLite index triggers so migrations can rebuild the tables
+    they read. install_search_triggers() puts them back.
+
+    Args:
+        using: Database alias
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+
+    with db.cursor() as cursor:
+        for name in TRIGGER_SQL['sqlite']:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def install_search_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Re-create the index triggers a schema change dropped, and refill the
+    index when any were missing, since writes made without them were not
+    indexed. Does nothing before migration 0005 created the index.
+
+    Args:
+        using: Database alias
+
+    Returns:
+        Names of the re-created triggers
+    """
+    db = connections[using]
+    if db.vendor not in TRIGGER_SQL:
+        return []
+
+    with db.cursor() as cursor:
+        if db.vendor == 'sqlite':
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            existing = {name for _, name in cursor.fetchall()}
+            has_index = SQLITE_TABLE in existing
+        else:
+            cursor.execute('SELECT tgname FROM pg_trigger WHERE NOT tgisinternal')
+            existing = {name for (name,) in cursor.fetchall()}
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [POSTGRES_TABLE])
+            has_index = cursor.fetchone()[0]
+        if not has_index:
+            return []
+
+        missing = [name for name in TRIGGER_SQL[db.vendor] if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGER_SQL[db.vendor][name])
+
+    if missing:
+        rebuild_search_index(using)
+    return missing
+
+
+# Document columns, read from a transaction row aliased t
+_DOCUMENT_SOURCES = (
+    't.description',
+    't.reference_number',
+    '(SELECT name FROM store_cashbook WHERE id = t.cashbook_id)',
+    '(SELECT name FROM transactions_transactiontype WHERE id = t.type_id)',
+    '(SELECT name FROM transactions_transactioncategory WHERE id = t.category_id)',
+)
+
+POSTGRES_DOCUMENT = "to_tsvector('simple', concat_ws(' ', {}))".format(', '.join(_DOCUMENT_SOURCES))
+
+REBUILD_SQL = {
+    'sqlite': [
+        f'DELETE FROM {SQLITE_TABLE}',
+        f'INSERT INTO {SQLITE_TABLE} (rowid, description, reference_number, cashbook_name, type_name, category_name) '
+        f'SELECT t.id, {", ".join(_DOCUMENT_SOURCES)} FROM transactions_transaction t',
+    ],
+    'postgresql': [
+        f'DELETE FROM {POSTGRES_TABLE}',
+        f'INSERT INTO {POSTGRES_TABLE} (transaction_id, document) '
+        f'SELECT t.id, {POSTGRES_DOCUMENT} FROM transactions_transaction t',
+    ],
+}
+
+_SQLITE_INSERT = (
+    'INSERT INTO {table} (rowid, description, reference_number, cashbook_name, type_name, category_name) '
+    'SELECT NEW.id, {sources} FROM transactions_transaction t WHERE t.id = NEW.id;'
+).format(table=SQLITE_TABLE, sources=', '.join(_DOCUMENT_SOURCES))
+
+# Same triggers as migration 0005_transaction_search_index, by name
+TRIGGER_SQL = {
+    'sqlite': {
+        'transactions_transaction_fts_insert': f"""
+            CREATE TRIGGER transactions_transaction_fts_insert AFTER INSERT ON transactions_transaction BEGIN
+                {_SQLITE_INSERT}
+            END
+        """,
+        'transactions_transaction_fts_update': f"""
+            CREATE TRIGGER transactions_transaction_fts_update
+            AFTER UPDATE OF description, reference_number, cashbook_id, type_id, category_id
+            ON transactions_transaction BEGIN
+                DELETE FROM {SQLITE_TABLE} WHERE rowid = OLD.id;
+                {_SQLITE_INSERT}
+            END
+        """,
+        'transactions_transaction_fts_delete': f"""
+            CREATE TRIGGER transactions_transaction_fts_delete AFTER DELETE ON transactions_transaction BEGIN
+                DELETE FROM {SQLITE_TABLE} WHERE rowid = OLD.id;
+            END
+        """,
+        **{
+            f'{table}_fts_rename': f"""
+                CREATE TRIGGER {table}_fts_rename AFTER UPDATE OF name ON {table} BEGIN
+                    UPDATE {SQLITE_TABLE} SET {column}_name = NEW.name
+                    WHERE rowid IN (SELECT id FROM transactions_transaction WHERE {column}_id = NEW.id);
+                END
+            """
+            for table, column in (
+                ('store_cashbook', 'cashbook'),
+                ('transactions_transactiontype', 'type'),
+                ('transactions_transactioncategory', 'category'),
+            )
+        },
+    },
+    'postgresql': {
+        'transactions_transaction_search_insert': """
+            CREATE TRIGGER transactions_transaction_search_insert AFTER INSERT ON transactions_transaction
+            FOR EACH ROW EXECUTE FUNCTION transactions_transaction_search_refresh()
+        """,
+        'transactions_transaction_search_update': """
+            CREATE TRIGGER transactions_transaction_search_update
+            AFTER UPDATE OF description, reference_number, cashbook_id, type_id, category_id
+            ON transactions_transaction
+            FOR EACH ROW EXECUTE FUNCTION transactions_transaction_search_refresh()
+        """,
+        **{
+            f'{table}_search_rename': f"""
+                CREATE TRIGGER {table}_search_rename AFTER UPDATE OF name ON {table}
+                FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+                EXECUTE FUNCTION transactions_transaction_search_rename()
+            """
+            for table in ('store_cashbook', 'transactions_transactiontype', 'transactions_transactioncategory')
+        },
+    },
+}
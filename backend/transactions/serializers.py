@@ -1,34 +1,46 @@
 from rest_framework import serializers
-from django.db import transaction as db_transaction
+from django.conf import settings
 from .models import TransactionType, TransactionCategory, Transaction, CashbookBalance
+from .balance import TransactionState
+from .accumulator import atomic_with_balances, record_balance_changes
+from .tags import sync_transaction_tags
+from .fieldsets import SparseFieldsetMixin
 from store.models import Cashbook
+from store.access import has_store_access
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that keeps the instances it looks up in the
+    serializer context, so a bulk payload referencing the same cashbook,
+    type or category on every row fetches each of them once.
+    """
+
+    def to_internal_value(self, data):
+        cache = self.context.setdefault('related_instances', {})
+        key = (self.get_queryset().model, str(data))
+        if key not in cache:
+            cache[key] = super().to_internal_value(data)
+        return cache[key]
 
 
 class TransactionTypeSerializer(serializers.ModelSerializer):
     """Serializer for transaction types"""
-    transaction_count = serializers.SerializerMethodField()
 
     class Meta:
         model = TransactionType
         fields = ['id', 'name', 'nature', 'is_active', 'transaction_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-    def get_transaction_count(self, obj):
-        return obj.transactions.count()
-
 
 class TransactionCategorySerializer(serializers.ModelSerializer):
     """Serializer for transaction categories"""
-    transaction_count = serializers.SerializerMethodField()
 
     class Meta:
         model = TransactionCategory
         fields = ['id', 'name', 'description', 'is_active', 'transaction_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-    def get_transaction_count(self, obj):
-        return obj.transaction_set.count()
-
 
 class CashbookBalanceSerializer(serializers.ModelSerializer):
     """Serializer for cashbook balances"""
@@ -44,7 +56,7 @@ class CashbookBalanceSerializer(serializers.ModelSerializer):
         read_only_fields = ['opening_balance', 'closing_balance', 'total_income', 'total_expense']
 
 
-class TransactionListSerializer(serializers.ModelSerializer):
+class TransactionListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing transactions"""
     cashbook_name = serializers.CharField(source='cashbook.name', read_only=True)
     store_name = serializers.CharField(source='cashbook.store.name', read_only=True)
@@ -65,7 +77,7 @@ class TransactionListSerializer(serializers.ModelSerializer):
         ]
 
 
-class TransactionDetailSerializer(serializers.ModelSerializer):
+class TransactionDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Detailed serializer for transaction retrieval"""
     cashbook_name = serializers.CharField(source='cashbook.name', read_only=True)
     store_name = serializers.CharField(source='cashbook.store.name', read_only=True)
@@ -93,8 +105,18 @@ class TransactionDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['transaction_id', 'created_by', 'updated_by', 'created_at', 'updated_at']
 
 
+class TransactionLedgerSerializer(TransactionDetailSerializer):
+    """Detail serializer with the running cashbook balance after each transaction"""
+    running_balance = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+
+    class Meta(TransactionDetailSerializer.Meta):
+        fields = TransactionDetailSerializer.Meta.fields + ['running_balance']
+
+
 class TransactionCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating and updating transactions"""
+    serializer_related_field = CachedPrimaryKeyRelatedField
+    cashbook = CachedPrimaryKeyRelatedField(queryset=Cashbook.objects.select_related('store'))
 
     class Meta:
         model = Transaction
@@ -130,12 +152,7 @@ class TransactionCreateUpdateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         cashbook = data.get('cashbook')
         if cashbook:
-            from store.models import StoreUser
-            has_access = StoreUser.objects.filter(
-                user=user,
-                store=cashbook.store
-            ).exists()
-            if not has_access:
+            if not has_store_access(user, cashbook.store_id):
                 raise serializers.ValidationError({
                     "cashbook": "You don't have access to this cashbook's store"
                 })
@@ -143,66 +160,58 @@ class TransactionCreateUpdateSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        """Create transaction and update cashbook balance"""
+        """
+        Create transaction.
+        The cashbook balance is updated by the transaction signals.
+        """
         user = self.context['request'].user
         
-        with db_transaction.atomic():
-            # Create the transaction
+        with atomic_with_balances():
             transaction = Transaction.objects.create(
                 created_by=user,
                 **validated_data
             )
             
-            # Update cashbook balance
-            self._update_cashbook_balance(transaction)
-            
         return transaction
 
     def update(self, instance, validated_data):
-        """Update transaction and recalculate cashbook balance"""
+        """
+        Update transaction.
+        The transaction signals apply the balance difference between the
+        old and new values (amount, type, status and cashbook).
+        """
         user = self.context['request'].user
         
-        with db_transaction.atomic():
-            # Store old values for balance adjustment
-            old_amount = instance.amount
-            old_type_nature = instance.type.nature
-            old_cashbook = instance.cashbook
-            
-            # Update the transaction
+        with atomic_with_balances():
             for attr, value in validated_data.items():
                 setattr(instance, attr, value)
             instance.updated_by = user
             instance.save()
             
-            # Reverse old balance effect
-            self._reverse_cashbook_balance(old_cashbook, old_amount, old_type_nature)
-            
-            # Apply new balance effect
-            self._update_cashbook_balance(instance)
-            
         return instance
 
-    def _update_cashbook_balance(self, transaction):
-        """Update cashbook balance based on transaction"""
-        cashbook = transaction.cashbook
-        amount = transaction.amount
-        nature = transaction.type.nature
-        
-        if nature == 'income':
-            cashbook.current_balance += amount
-        elif nature == 'expense':
-            cashbook.current_balance -= amount
-        
-        cashbook.save(update_fields=['current_balance', 'updated_at'])
-
-    def _reverse_cashbook_balance(self, cashbook, amount, nature):
-        """Reverse the effect of a transaction on cashbook balance"""
-        if nature == 'income':
-            cashbook.current_balance -= amount
-        elif nature == 'expense':
-            cashbook.current_balance += amount
-        
-        cashbook.save(update_fields=['current_balance', 'updated_at'])
+
+def insert_transactions(transactions):
+    """
+    Insert unsaved Transaction instances with bulk_create, in batches of
+    TRANSACTION_BULK_CREATE_BATCH_SIZE. bulk_create doesn't send the
+    balance signals, so the balance changes are recorded here and applied
+    once per cashbook before the insert commits, and the tag links are
+    written in bulk.
+    """
+    batch_size = getattr(settings, 'TRANSACTION_BULK_CREATE_BATCH_SIZE', 1000)
+
+    with atomic_with_balances():
+        Transaction.objects.bulk_create(transactions, batch_size=batch_size)
+        record_balance_changes(
+            (None, TransactionState.from_instance(transaction))
+            for transaction in transactions
+        )
+        sync_transaction_tags(transactions, created=True)
+
+    for transaction in transactions:
+        transaction._store_original_values()
+    return transactions
 
 
 class TransactionBulkCreateSerializer(serializers.Serializer):
@@ -210,32 +219,12 @@ class TransactionBulkCreateSerializer(serializers.Serializer):
     transactions = TransactionCreateUpdateSerializer(many=True)
 
     def create(self, validated_data):
-        """Create multiple transactions at once"""
+        """Create multiple transactions at once with a batched insert"""
         user = self.context['request'].user
-        transactions_data = validated_data['transactions']
-        
-        with db_transaction.atomic():
-            created_transactions = []
-            for transaction_data in transactions_data:
-                transaction = Transaction.objects.create(
-                    created_by=user,
-                    **transaction_data
-                )
-                created_transactions.append(transaction)
-                
-                # Update cashbook balance
-                cashbook = transaction.cashbook
-                amount = transaction.amount
-                nature = transaction.type.nature
-                
-                if nature == 'income':
-                    cashbook.current_balance += amount
-                elif nature == 'expense':
-                    cashbook.current_balance -= amount
-                
-                cashbook.save(update_fields=['current_balance', 'updated_at'])
-        
-        return created_transactions
+        return insert_transactions([
+            Transaction(created_by=user, **transaction_data)
+            for transaction_data in validated_data['transactions']
+        ])
 
 
 class TransactionSummarySerializer(serializers.Serializer):
@@ -1,113 +1,175 @@
 # backend/transactions/signals.py
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_migrate, pre_migrate, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction as db_transaction
-from decimal import Decimal
-from .models import Transaction, TransactionType
-from store.models import Cashbook
+from store.models import Store, Cashbook
+from .models import Transaction, TransactionType, TransactionCategory
+from .balance import TransactionState, calculate_balance
+from .accumulator import record_balance_change
+from .report_cache import CATALOG, bump_generations, invalidate_stores
+from .rollups import merge_category_rollups
+from .search import drop_search_triggers, install_search_triggers
+from .tags import sync_transaction_tags
+
+
+# Tracked fields a TransactionState is built from
+STATE_FIELDS = ('cashbook', 'status', 'amount', 'type', 'category', 'transaction_date')
+
+# Old state of saves whose update_fields leave the balance alone
+_UNCHANGED = object()
 
 
 @receiver(post_save, sender=Transaction)
 def update_cashbook_balance_on_create_or_update(sender, instance, created, **kwargs):
     """
     Update cashbook balance when a transaction is created or updated.
-    Only process completed transactions.
+    Only the signed difference between the old and new state is applied,
+    so editing a transaction costs the same however long the history is.
     """
-    if instance.status == Transaction.STATUS_COMPLETED:
-        # Use atomic transaction to prevent race conditions
-        with db_transaction.atomic():
-            cashbook = Cashbook.objects.select_for_update().get(id=instance.cashbook.id)
-            
-            if created:
-                # New transaction - simply add/subtract from balance
-                _apply_transaction_to_balance(cashbook, instance, is_new=True)
-            else:
-                # Transaction updated - need to recalculate entire balance
-                _recalculate_cashbook_balance(cashbook)
-            
-            cashbook.save()
+    old_state = None if created else _get_old_state(instance)
+    instance._old_state = None
+    if old_state is _UNCHANGED:
+        return
+    new_state = TransactionState.from_instance(instance)
+    _apply_balance_deltas(old_state, new_state)
+
+
+@receiver(post_save, sender=Transaction)
+def sync_tags_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Mirror the tags list into the indexed tag table. Runs before
+    FieldTrackerMixin refreshes the loaded values, so has_changed() still
+    compares against the stored tags and saves that leave them alone cost
+    no queries.
+    """
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    if created:
+        if instance.tags:
+            sync_transaction_tags([instance], created=True)
+    elif instance.has_changed('tags'):
+        sync_transaction_tags([instance])
 
 
 @receiver(post_delete, sender=Transaction)
 def update_cashbook_balance_on_delete(sender, instance, **kwargs):
     """
     Update cashbook balance when a transaction is deleted.
-    Only process if the deleted transaction was completed.
+    Only completed transactions change the balance.
     """
-    if instance.status == Transaction.STATUS_COMPLETED:
-        with db_transaction.atomic():
-            cashbook = Cashbook.objects.select_for_update().get(id=instance.cashbook.id)
-            _recalculate_cashbook_balance(cashbook)
-            cashbook.save()
+    old_state = (
+        _get_old_state(instance) or _get_tracked_state(instance) or TransactionState.from_instance(instance)
+    )
+    _apply_balance_deltas(old_state, None)
 
 
 @receiver(pre_save, sender=Transaction)
-def handle_transaction_status_change(sender, instance, **kwargs):
+def handle_transaction_status_change(sender, instance, update_fields=None, **kwargs):
     """
     Handle status changes (e.g., pending -> completed, completed -> cancelled).
-    Store the old status to compare in post_save.
+    Store the old state to compare in post_save. It is read from the
+    database under a row lock (Transaction.save runs in a transaction)
+    rather than taken from the loaded values: two stale copies of a row
+    saved one after the other would otherwise both apply their change
+    against the same old amount, status or cashbook.
     """
-    if instance.pk:
-        try:
-            old_instance = Transaction.objects.get(pk=instance.pk)
-            instance._old_status = old_instance.status
-            instance._old_amount = old_instance.amount
-            instance._old_type = old_instance.type
-        except Transaction.DoesNotExist:
-            instance._old_status = None
+    instance._old_state = None
+    if not instance.pk:
+        return
+    
+    if update_fields is not None and not _saves_state(update_fields):
+        # The stored state can't change
+        instance._old_state = _UNCHANGED
+        return
+    
+    instance._old_state = TransactionState.from_database(instance.pk)
+
+
+@receiver(pre_delete, sender=TransactionCategory)
+def merge_rollups_on_category_delete(sender, instance, **kwargs):
+    """The category's rollup rows become uncategorized; merge them before SET_NULL runs"""
+    merge_category_rollups(instance.pk)
+
+
+@receiver(post_save, sender=TransactionType)
+@receiver(post_delete, sender=TransactionType)
+@receiver(post_save, sender=TransactionCategory)
+@receiver(post_delete, sender=TransactionCategory)
+def invalidate_cached_reports(sender, instance, **kwargs):
+    """Cached by_type/by_category reports include names, so drop them on change"""
+    db_transaction.on_commit(lambda: bump_generations([CATALOG]))
+
+
+@receiver(post_save, sender=Cashbook)
+@receiver(post_delete, sender=Cashbook)
+@receiver(post_save, sender=Store)
+def invalidate_store_generation(sender, instance, **kwargs):
+    """Transaction and cashbook lists include cashbook and store names, so their ETags must change"""
+    store_id = instance.pk if sender is Store else instance.store_id
+    db_transaction.on_commit(lambda: invalidate_stores([store_id]))
 
 
-def _apply_transaction_to_balance(cashbook, transaction, is_new=True):
+def _saves_state(update_fields):
+    """Whether a save limited to update_fields writes any balance-relevant field"""
+    names = set(STATE_FIELDS)
+    names.update(Transaction._meta.get_field(name).attname for name in STATE_FIELDS)
+    return not names.isdisjoint(update_fields)
+
+
+def _get_old_state(instance):
+    """Return the TransactionState captured in pre_save, or None if there was none."""
+    return getattr(instance, '_old_state', None)
+
+
+def _get_tracked_state(instance):
     """
-    Apply a single transaction to the cashbook balance.
-    
-    Args:
-        cashbook: Cashbook instance
-        transaction: Transaction instance
-        is_new: Whether this is a new transaction or reverting an old one
+    Build the stored TransactionState from the instance's original values.
+    Returns None if the instance wasn't loaded with all tracked fields.
     """
-    amount = Decimal(str(transaction.amount))
+    if not all(instance.has_original(name) for name in STATE_FIELDS):
+        return None
+    
+    old_type_id = instance.get_original('type')
+    if old_type_id == instance.type_id:
+        nature = instance.type.nature
+    else:
+        # The type changed: one lookup for the old type's nature
+        nature = TransactionType.objects.filter(pk=old_type_id).values_list(
+            'nature', flat=True
+        ).first()
     
-    # Determine if this adds or subtracts from balance
-    if transaction.type.nature == TransactionType.INCOME:
-        cashbook.current_balance += amount
-    elif transaction.type.nature == TransactionType.EXPENSE:
-        cashbook.current_balance -= amount
-    elif transaction.type.nature == TransactionType.TRANSFER:
-        # Handle transfer logic if needed
-        # For now, treat as expense (money leaving this cashbook)
-        cashbook.current_balance -= amount
+    return TransactionState(
+        cashbook_id=instance.get_original('cashbook'),
+        status=instance.get_original('status'),
+        amount=instance.get_original('amount'),
+        nature=nature,
+        transaction_date=instance.get_original('transaction_date'),
+        type_id=old_type_id,
+        category_id=instance.get_original('category'),
+    )
+
+
+def _apply_balance_deltas(old_state, new_state):
+    """
+    Record the balance change between two transaction states for every
+    cashbook involved (two when a transaction moves between cashbooks),
+    for the daily CashbookBalance snapshots of the affected days and for
+    the transaction counters of the cashbooks, types and categories.
+    Inside a database transaction the changes are coalesced and applied
+    once on commit; see transactions.accumulator.
+    """
+    record_balance_change(old_state, new_state)
 
 
 def _recalculate_cashbook_balance(cashbook):
     """
     Recalculate the entire cashbook balance from scratch.
-    This is more accurate but slower - use when transactions are updated or deleted.
+    Runs a single aggregate query through the balance engine.
     
     Args:
         cashbook: Cashbook instance
     """
-    # Start with initial balance
-    balance = cashbook.initial_balance
-    
-    # Get all completed transactions for this cashbook
-    transactions = Transaction.objects.filter(
-        cashbook=cashbook,
-        status=Transaction.STATUS_COMPLETED
-    ).order_by('transaction_date', 'created_at')
-    
-    # Apply each transaction
-    for trans in transactions:
-        amount = Decimal(str(trans.amount))
-        
-        if trans.type.nature == TransactionType.INCOME:
-            balance += amount
-        elif trans.type.nature == TransactionType.EXPENSE:
-            balance -= amount
-        elif trans.type.nature == TransactionType.TRANSFER:
-            balance -= amount
-    
-    cashbook.current_balance = balance
+    cashbook.current_balance = calculate_balance(cashbook)
 
 
 # Helper function to manually recalculate all cashbooks (useful for data fixes)
@@ -133,4 +195,23 @@ def recalculate_all_cashbook_balances():
                 print(f"Updated {cashbook.name}: {old_balance} -> {cashbook.current_balance}")
     
     print(f"Recalculated {updated_count} cashbook balances")
-    return updated_count
\ No newline at end of file
+    return updated_count
+
+
+@receiver(pre_migrate)
+def drop_search_triggers_before_migrate(sender, using, plan=None, **kwargs):
+    """
+    SQLite alters a table by copying it into a new one and renaming that,
+    which drops the table's own triggers and fails on the triggers of other
+    tables that read it. The search index triggers are taken out while
+    migrations run and put back by reinstall_search_triggers.
+    """
+    if sender.name == 'transactions' and plan:
+        drop_search_triggers(using)
+
+
+@receiver(post_migrate)
+def reinstall_search_triggers(sender, using, **kwargs):
+    """Re-create the search index triggers and refill the index if any were missing"""
+    if sender.name == 'transactions':
+        install_search_triggers(using)
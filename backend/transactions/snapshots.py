@@ -0,0 +1,377 @@
+# backend/transactions/snapshots.py
+"""
+Daily CashbookBalance snapshots.
+
+Each row holds a cashbook's opening/closing balance and completed
+income/expense totals for one day. Rows are maintained incrementally by the
+transaction signals: a flush upserts the touched days of a cashbook and
+rolls their closing-balance changes forward to every later day in one
+UPDATE per cashbook.
+rebuild_daily_balances() recreates the table in bulk from transactions.
+
+As with the balance engine, transfers count as outflows and are included
+in total_expense.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from .balance import ZERO, balance_aggregates, build_balance_report, to_money
+from .report_cache import invalidate_cashbooks
+
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+def daily_deltas(old_state=None, new_state=None):
+    """
+    Work out the per-day snapshot changes caused by a write.
+
+    Args:
+        old_state: TransactionState before the write (None on create)
+        new_state: TransactionState after the write (None on delete)
+
+    Returns:
+        dict mapping (cashbook_id, date) to (net, income, expense) deltas,
+        leaving out days that don't change
+    """
+    deltas = defaultdict(lambda: [ZERO, ZERO, ZERO])
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None or not state.effect:
+            continue
+        entry = deltas[(state.cashbook_id, state.transaction_date)]
+        amount = Decimal(str(state.amount))
+        entry[0] += sign * state.effect
+        if state.effect > 0:
+            entry[1] += sign * amount
+        else:
+            entry[2] += sign * amount
+    return {key: tuple(value) for key, value in deltas.items() if any(value)}
+
+
+def apply_daily_deltas(cashbook_id, days):
+    """
+    Upsert the snapshots of the touched days of one cashbook and shift every
+    later day, in a fixed number of queries however many days are touched.
+
+    Every existing day after the first touched one is shifted by the sum of
+    the nets of the touched days before it, in one UPDATE with a CASE over
+    those prefix sums. The touched days that exist then get their own
+    changes in a second UPDATE, and missing days are created opening from
+    the (already shifted) closing balance of the day before them.
+
+    Args:
+        cashbook_id: Cashbook primary key
+        days: dict mapping date to (net, income, expense) deltas
+    """
+    from .models import CashbookBalance
+
+    dates = sorted(days)
+    if not dates:
+        return
+
+    snapshots = CashbookBalance.objects.filter(cashbook_id=cashbook_id)
+    now = timezone.now()
+
+    with db_transaction.atomic():
+        shifts = []
+        prefix = ZERO
+        for date in dates:
+            prefix += days[date][0]
+            shifts.append(When(date__gt=date, then=Value(prefix)))
+        if any(days[date][0] for date in dates):
+            # Latest day first, so each row takes the prefix sum of the
+            # touched days before it
+            shift = Case(*reversed(shifts), default=Value(ZERO), output_field=MONEY)
+            snapshots.filter(date__gt=dates[0]).update(
+                opening_balance=F('opening_balance') + shift,
+                closing_balance=F('closing_balance') + shift,
+                updated_at=now
+            )
+
+        existing = set(snapshots.filter(date__in=dates).values_list('date', flat=True))
+        if existing:
+            def per_day(index):
+                return Case(
+                    *(When(date=date, then=Value(days[date][index])) for date in sorted(existing)),
+                    default=Value(ZERO),
+                    output_field=MONEY
+                )
+
+            # update() skips auto_now, so updated_at is set by hand
+            snapshots.filter(date__in=existing).update(
+                closing_balance=F('closing_balance') + per_day(0),
+                total_income=F('total_income') + per_day(1),
+                total_expense=F('total_expense') + per_day(2),
+                updated_at=now
+            )
+
+        missing = [date for date in dates if date not in existing]
+        if missing:
+            _create_daily_balances(cashbook_id, {date: days[date] for date in missing})
+
+
+def _create_daily_balances(cashbook_id, days):
+    """
+    Create missing days, each opening from the closing balance of the day
+    before it, with one query for the surrounding snapshots and one insert.
+    Falls back to creating the days one by one if another writer created
+    one of them first.
+    """
+    from store.models import Cashbook
+    from .models import CashbookBalance
+
+    dates = sorted(days)
+    snapshots = CashbookBalance.objects.filter(cashbook_id=cashbook_id)
+    closings = dict(
+        snapshots.filter(date__lt=dates[-1]).filter(
+            Q(date__gt=dates[0]) | Q(pk=Subquery(
+                snapshots.filter(date__lt=dates[0]).order_by('-date').values('pk')[:1]
+            ))
+        ).values_list('date', 'closing_balance')
+    )
+
+    opening = None
+    known = sorted(closings)
+    if not known or known[0] > dates[0]:
+        # Without an earlier day the cashbook has no earlier completed
+        # transactions (see _create_daily_balance)
+        opening = Cashbook.objects.filter(pk=cashbook_id).values_list(
+            'initial_balance', flat=True
+        ).first()
+        if opening is None:
+            # Cashbook is being deleted
+            return
+
+    rows = []
+    for date in dates:
+        index = bisect_right(known, date)
+        if index:
+            opening = closings[known[index - 1]]
+        net, income, expense = days[date]
+        closings[date] = opening + net
+        known.insert(index, date)
+        rows.append(CashbookBalance(
+            cashbook_id=cashbook_id,
+            date=date,
+            opening_balance=opening,
+            closing_balance=opening + net,
+            total_income=income,
+            total_expense=expense
+        ))
+
+    try:
+        with db_transaction.atomic():
+            CashbookBalance.objects.bulk_create(rows)
+    except IntegrityError:
+        for date in dates:
+            _create_daily_balance(cashbook_id, date, *days[date])
+
+
+def _create_daily_balance(cashbook_id, date, net, income, expense):
+    """
+    Create a missing day, opening from the previous day's closing balance.
+
+    Without an earlier day the cashbook has no earlier completed
+    transactions, since every write since migration 0008 (which rebuilt
+    the snapshots of existing data) went through here, so it opens from
+    the initial balance.
+    """
+    from store.models import Cashbook
+    from .models import CashbookBalance
+
+    opening = CashbookBalance.objects.filter(
+        cashbook_id=cashbook_id, date__lt=date
+    ).order_by('-date').values_list('closing_balance', flat=True).first()
+    if opening is None:
+        opening = Cashbook.objects.filter(pk=cashbook_id).values_list(
+            'initial_balance', flat=True
+        ).first()
+        if opening is None:
+            # Cashbook is being deleted
+            return
+
+    try:
+        with db_transaction.atomic():
+            CashbookBalance.objects.create(
+                cashbook_id=cashbook_id,
+                date=date,
+                opening_balance=opening,
+                closing_balance=opening + net,
+                total_income=income,
+                total_expense=expense
+            )
+    except IntegrityError:
+        # Another writer created the day first
+        CashbookBalance.objects.filter(cashbook_id=cashbook_id, date=date).update(
+            closing_balance=F('closing_balance') + net,
+            total_income=F('total_income') + income,
+            total_expense=F('total_expense') + expense,
+            updated_at=timezone.now()
+        )
+
+
+def rebuild_daily_balances(cashbooks, batch_size=1000):
+    """
+    Recreate the snapshots for the given cashbooks from their completed
+    transactions using one GROUP BY query over (cashbook, day).
+
+    Args:
+        cashbooks: Cashbook queryset
+        batch_size: Rows per bulk insert
+
+    Returns:
+        Number of snapshot rows created
+    """
+    from .models import Transaction, TransactionType, CashbookBalance
+
+    initial_balances = dict(cashbooks.values_list('id', 'initial_balance'))
+    daily_totals = Transaction.objects.filter(
+        cashbook_id__in=list(initial_balances),
+        status=Transaction.STATUS_COMPLETED
+    ).values('cashbook_id', 'transaction_date').annotate(
+        income=Sum('amount', filter=Q(type__nature=TransactionType.INCOME)),
+        expense=Sum('amount', filter=~Q(type__nature=TransactionType.INCOME))
+    ).order_by('cashbook_id', 'transaction_date')
+
+    created_count = 0
+    with db_transaction.atomic():
+        CashbookBalance.objects.filter(cashbook_id__in=list(initial_balances)).delete()
+
+        batch = []
+        current_cashbook = None
+        balance = ZERO
+        for row in daily_totals.iterator():
+            if row['cashbook_id'] != current_cashbook:
+                current_cashbook = row['cashbook_id']
+                balance = initial_balances[current_cashbook]
+
+            income = to_money(row['income'])
+            expense = to_money(row['expense'])
+            opening = balance
+            balance = opening + income - expense
+            batch.append(CashbookBalance(
+                cashbook_id=current_cashbook,
+                date=row['transaction_date'],
+                opening_balance=opening,
+                closing_balance=balance,
+                total_income=income,
+                total_expense=expense
+            ))
+
+            if len(batch) >= batch_size:
+                CashbookBalance.objects.bulk_create(batch)
+                created_count += len(batch)
+                batch = []
+
+        if batch:
+            CashbookBalance.objects.bulk_create(batch)
+            created_count += len(batch)
+
+        db_transaction.on_commit(lambda: invalidate_cashbooks(list(initial_balances)))
+
+    return created_count
+
+
+def balance_at(cashbook, date):
+    """
+    Return the cashbook balance at the end of a day.
+
+    Starts from the nearest snapshot at or before the day and adds only the
+    completed transactions after it, instead of replaying the whole history
+    (see balance_series, which this is the one-date case of).
+    """
+    return balance_series(cashbook, [date])[0][1]
+
+
+def balance_series(cashbook, dates):
+    """
+    Return the end-of-day balance for many dates with a bounded number of
+    queries, whatever the number of dates.
+
+    Each date starts from the nearest snapshot at or before it, plus the
+    completed transactions on later days up to the date that have no
+    snapshot yet (normally none, as the write path keeps the snapshots
+    current). Those are read with one GROUP BY over the days without a
+    snapshot.
+
+    Returns:
+        list of (date, balance) tuples sorted by date
+    """
+    from .models import Transaction, CashbookBalance
+
+    dates = sorted(set(dates))
+    if not dates:
+        return []
+
+    snapshot_rows = CashbookBalance.objects.filter(cashbook_id=cashbook.pk).values_list('date', 'closing_balance')
+    snapshots = []
+    first = snapshot_rows.filter(date__lte=dates[0]).order_by('-date').first()
+    if first:
+        snapshots.append(first)
+    if dates[-1] > dates[0]:
+        snapshots.extend(snapshot_rows.filter(date__gt=dates[0], date__lte=dates[-1]).order_by('date'))
+    snapshot_dates = [snapshot_date for snapshot_date, _ in snapshots]
+
+    # Running net change of the completed transactions on days without a snapshot
+    uncovered = Transaction.objects.filter(
+        cashbook_id=cashbook.pk, transaction_date__lte=dates[-1]
+    ).filter(
+        ~Exists(CashbookBalance.objects.filter(cashbook_id=cashbook.pk, date=OuterRef('transaction_date')))
+    )
+    if first:
+        uncovered = uncovered.filter(transaction_date__gt=first[0])
+    uncovered_days = []
+    uncovered_totals = []
+    running = ZERO
+    for row in uncovered.values('transaction_date').annotate(**balance_aggregates()).order_by('transaction_date'):
+        running += build_balance_report(ZERO, row)['net_change']
+        uncovered_days.append(row['transaction_date'])
+        uncovered_totals.append(running)
+
+    def uncovered_through(day):
+        index = bisect_right(uncovered_days, day)
+        return uncovered_totals[index - 1] if index else ZERO
+
+    initial_balance = Decimal(str(cashbook.initial_balance))
+    series = []
+    for date in dates:
+        index = bisect_right(snapshot_dates, date)
+        if index:
+            snapshot_date, opening = snapshots[index - 1]
+            balance = opening + uncovered_through(date) - uncovered_through(snapshot_date)
+        else:
+            balance = initial_balance + uncovered_through(date)
+        series.append((date, balance))
+    return series
+
+
+def latest_snapshots(cashbooks):
+    """
+    The latest CashbookBalance snapshot of each cashbook, in one query
+    whose SQL doesn't grow with the number of cashbooks.
+
+    Every cashbook picks the id of its newest snapshot with a correlated
+    subquery, a single seek on the (cashbook, date) unique index, so the
+    cost follows the number of cashbooks rather than the number of days
+    they have snapshots for. Filter the cashbooks rather than the result:
+    with a condition on the cashbook next to the id list, SQLite starts
+    from the cashbooks and probes the whole list for each of them.
+
+    Args:
+        cashbooks: Cashbook queryset whose latest snapshots are wanted
+
+    Returns:
+        CashbookBalance queryset
+    """
+    from .models import CashbookBalance
+
+    latest_ids = cashbooks.annotate(
+        latest_snapshot_id=Subquery(
+            CashbookBalance.objects.filter(cashbook_id=OuterRef('pk')).order_by('-date').values('pk')[:1]
+        )
+    ).values('latest_snapshot_id')
+    return CashbookBalance.objects.filter(pk__in=latest_ids)
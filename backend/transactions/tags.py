@@ -0,0 +1,155 @@
+# backend/transactions/tags.py
+"""
+Indexed tag storage for transactions.
+
+Transaction.tags stays the free-form JSON list the API reads and writes.
+Every tag in it is also stored once in the Tag table and linked to the
+transaction through TransactionTag, indexed on (tag, transaction), so
+"transactions tagged X" and per-tag totals are index lookups and joins
+instead of a scan that parses every row's JSON.
+
+The links are kept in sync by the transaction signals on save() and by
+insert_transactions() on bulk inserts; deleting a transaction deletes its
+links. Writes that bypass both (queryset.update(tags=...), raw SQL) are
+repaired by the rebuild_transaction_tags command.
+"""
+from collections import defaultdict
+from django.db import transaction as db_transaction
+from django.db.models import Q
+
+
+BATCH_SIZE = 1000
+
+
+def tag_names(tags):
+    """
+    Distinct tag names from a tags value, in order.
+
+    Strings and numbers are tags; blanks and anything else (nested lists,
+    objects) are skipped. Names are stripped and cut to Tag.name's length.
+    """
+    from .models import Tag
+
+    if isinstance(tags, str):
+        tags = [tags]
+    elif not isinstance(tags, (list, tuple)):
+        return []
+
+    max_length = Tag._meta.get_field('name').max_length
+    names = []
+    for value in tags:
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            continue
+        name = str(value).strip()[:max_length]
+        if name:
+            names.append(name)
+    return list(dict.fromkeys(names))
+
+
+def parse_tag_list(value):
+    """Tag names from a comma-separated query parameter"""
+    return list(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+
+
+def get_tag_ids(names):
+    """
+    Return {name: tag id} for names, creating the tags that don't exist
+    yet. Concurrent writers creating the same tag are absorbed by the
+    unique name (ignore_conflicts) and the tag is read back.
+    """
+    from .models import Tag
+
+    names = set(names)
+    if not names:
+        return {}
+
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing = names - tag_ids.keys()
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tag_ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+    return tag_ids
+
+
+def sync_transaction_tags(transactions, created=False):
+    """
+    Make the tag links of saved transactions match their tags lists.
+
+    Args:
+        transactions: Saved Transaction instances
+        created: The transactions were just inserted and have no links
+            yet, so existing links aren't read
+
+    Returns:
+        (links added, links removed)
+    """
+    from .models import TransactionTag
+
+    wanted = {transaction.pk: tag_names(transaction.tags) for transaction in transactions}
+    tag_ids = get_tag_ids(name for names in wanted.values() for name in names)
+
+    existing = defaultdict(set)
+    if not created and wanted:
+        links = TransactionTag.objects.filter(transaction_id__in=wanted).values_list('transaction_id', 'tag_id')
+        for transaction_id, tag_id in links:
+            existing[transaction_id].add(tag_id)
+
+    missing = []
+    stale = Q()
+    removed = 0
+    for transaction_id, names in wanted.items():
+        ids = {tag_ids[name] for name in names}
+        missing.extend(
+            TransactionTag(transaction_id=transaction_id, tag_id=tag_id)
+            for tag_id in ids - existing[transaction_id]
+        )
+        stale_ids = existing[transaction_id] - ids
+        if stale_ids:
+            stale |= Q(transaction_id=transaction_id, tag_id__in=stale_ids)
+            removed += len(stale_ids)
+
+    if not (missing or removed):
+        return 0, 0
+    with db_transaction.atomic(savepoint=False):
+        if removed:
+            TransactionTag.objects.filter(stale).delete()
+        if missing:
+            TransactionTag.objects.bulk_create(missing, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(missing), removed
+
+
+def rebuild_transaction_tags(batch_size=BATCH_SIZE):
+    """
+    Recreate every tag link from the transactions' tags lists and drop
+    tags no transaction uses any more.
+
+    Returns:
+        (tagged transactions, links)
+    """
+    from store.models import Cashbook
+    from .models import Tag, Transaction, TransactionTag
+    from .report_cache import invalidate_cashbooks
+
+    tagged = 0
+    links = 0
+    with db_transaction.atomic():
+        TransactionTag.objects.all().delete()
+
+        batch = []
+        for transaction in Transaction.objects.only('pk', 'tags').iterator(chunk_size=batch_size):
+            if not tag_names(transaction.tags):
+                continue
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                links += sync_transaction_tags(batch, created=True)[0]
+                tagged += len(batch)
+                batch = []
+        if batch:
+            links += sync_transaction_tags(batch, created=True)[0]
+            tagged += len(batch)
+
+        Tag.objects.filter(transaction_links__isnull=True).delete()
+        # Cached by_tag reports may have been built from the old links
+        cashbook_ids = list(Cashbook.objects.values_list('pk', flat=True))
+        db_transaction.on_commit(lambda: invalidate_cashbooks(cashbook_ids))
+    return tagged, links
@@ -1,3 +1,1849 @@
-from django.test import TestCase
+import importlib
+import io
+import re
+import zipfile
+from datetime import date
+from unittest import mock, skipUnless
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal, emit_pre_migrate_signal
+from django.db.migrations import Migration
+from django.db import DatabaseError, IntegrityError, connection, models, transaction as db_transaction
+from django.db.models.query import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from store.access import get_cache as get_store_access_cache, is_shared_cache
+from store.models import Store, Cashbook, StoreUser
+from .models import (
+    CashbookBalance, Transaction, TransactionType, TransactionCategory, TransactionMonthlyRollup, TransactionTag
+)
+from .accumulator import atomic_with_balances
+from .balance import annotate_balance_reports, get_balance_report, report_from_annotations, transaction_effect
+from .rollups import apply_monthly_delta, rebuild_monthly_rollups, split_period
+from .snapshots import rebuild_daily_balances
+from .fast_serializers import ValuesSerializer
+from .serializers import TransactionListSerializer
+from .filters import TransactionFilter
+from . import report_cache
+from .search import (
+    POSTGRES_TABLE, SQLITE_TABLE, drop_search_triggers, install_search_triggers, search_transactions
+)
+
+
+class TransactionTestMixin:
+    """Shared fixtures for transaction tests"""
+
+    def setUp(self):
+        # Store access maps and reports are cached; ids are reused between tests
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.user = User.objects.create_user(
+            username='owner', email='owner@example.com', password='secret'
+        )
+        self.store = Store.objects.create(name='Main Store')
+        self.cashbook = Cashbook.objects.create(
+            store=self.store, name='Main Cashbook', initial_balance=Decimal('100.00')
+        )
+        self.income = TransactionType.objects.create(name='Sale', nature=TransactionType.INCOME)
+        self.expense = TransactionType.objects.create(name='Rent', nature=TransactionType.EXPENSE)
+
+    def create_transaction(self, **kwargs):
+        data = {
+            'cashbook': self.cashbook,
+            'amount': Decimal('10.00'),
+            'type': self.income,
+            'transaction_date': date(2024, 1, 15),
+            'created_by': self.user,
+        }
+        data.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaction.objects.create(**data)
+
+    def selects_from(self, queries, table):
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+        ]
+
+    def assertBalanceConsistent(self, cashbook=None):
+        cashbook = cashbook or self.cashbook
+        cashbook.refresh_from_db()
+        self.assertEqual(cashbook.current_balance, cashbook.calculate_balance())
+
+
+class BalanceReportTests(TransactionTestMixin, TestCase):
+    """Balance reports count transfers as outflows and agree however they are computed"""
+
+    def setUp(self):
+        super().setUp()
+        self.transfer = TransactionType.objects.create(name='Move', nature=TransactionType.TRANSFER)
+        self.create_transaction(amount=Decimal('40.00'))
+        self.create_transaction(amount=Decimal('15.00'), type=self.expense)
+        self.create_transaction(amount=Decimal('10.00'), type=self.transfer)
+        self.create_transaction(amount=Decimal('100.00'), status='pending')
+        self.create_transaction(amount=Decimal('7.00'), type=self.transfer, status='cancelled')
+
+    def test_transfers_are_outflows(self):
+        report = get_balance_report(self.cashbook)
+
+        self.assertEqual(report['total_transfer'], Decimal('10.00'))
+        self.assertEqual(report['net_change'], Decimal('15.00'))
+        self.assertEqual(report['calculated_balance'], Decimal('115.00'))
+        self.assertEqual(report['transaction_count'], 3)
+        self.assertEqual(report['pending_count'], 1)
+        self.assertEqual(transaction_effect('completed', Decimal('10.00'), TransactionType.TRANSFER), Decimal('-10.00'))
+        # The signals applied the same rule to the stored balance
+        self.assertBalanceConsistent()
+        self.assertEqual(self.cashbook.current_balance, Decimal('115.00'))
+
+    def test_annotated_reports_match_single_reports(self):
+        second = Cashbook.objects.create(store=self.store, name='Second', initial_balance=Decimal('20.00'))
+        self.create_transaction(cashbook=second, amount=Decimal('2.50'), type=self.transfer)
+        self.create_transaction(cashbook=second, amount=Decimal('8.25'))
+        empty = Cashbook.objects.create(store=self.store, name='Empty', initial_balance=Decimal('5.00'))
+
+        with CaptureQueriesContext(connection) as context:
+            annotated = {
+                cashbook.pk: report_from_annotations(cashbook)
+                for cashbook in annotate_balance_reports(Cashbook.objects.all())
+            }
+        self.assertEqual(len(context.captured_queries), 1)
+
+        for cashbook in (self.cashbook, second, empty):
+            with self.subTest(cashbook=cashbook.name):
+                self.assertEqual(annotated[cashbook.pk], get_balance_report(Cashbook.objects.get(pk=cashbook.pk)))
+        self.assertEqual(annotated[second.pk]['calculated_balance'], Decimal('25.75'))
+        self.assertEqual(annotated[empty.pk]['calculated_balance'], Decimal('5.00'))
+
+
+class TransactionDirtyFieldTrackingTests(TransactionTestMixin, TestCase):
+    """Updates read old values from the loaded snapshot instead of re-selecting the row"""
+
+    def test_loaded_instance_tracks_original_values(self):
+        transaction = Transaction.objects.get(pk=self.create_transaction().pk)
+        transaction.amount = Decimal('25.00')
+
+        self.assertTrue(transaction.has_changed('amount'))
+        self.assertFalse(transaction.has_changed('status'))
+        self.assertEqual(transaction.get_original('amount'), Decimal('10.00'))
+        self.assertEqual(transaction.get_changed_fields(), ['amount'])
+
+    def test_snapshot_refreshed_after_save(self):
+        transaction = Transaction.objects.get(pk=self.create_transaction().pk)
+        transaction.amount = Decimal('25.00')
+        transaction.save()
+
+        self.assertFalse(transaction.has_changed('amount'))
+        self.assertEqual(transaction.get_original('amount'), Decimal('25.00'))
+
+    def test_update_reads_stored_state_once(self):
+        transaction = Transaction.objects.select_related('type').get(pk=self.create_transaction().pk)
+        transaction.amount = Decimal('25.00')
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            transaction.save()
+        # One (locking) read of the stored row, which also brings the old nature
+        self.assertEqual(len(self.selects_from(context.captured_queries, 'transactions_transaction')), 1)
+        self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transactiontype'), [])
+        self.assertBalanceConsistent()
+
+    def test_type_change_needs_no_type_lookup(self):
+        transaction = Transaction.objects.select_related('type').get(pk=self.create_transaction().pk)
+        transaction.type = self.expense
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            transaction.save()
+        self.assertEqual(len(self.selects_from(context.captured_queries, 'transactions_transaction')), 1)
+        self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transactiontype'), [])
+        self.assertBalanceConsistent()
+
+    def test_stale_copies_apply_against_the_stored_row(self):
+        pk = self.create_transaction().pk
+        first = Transaction.objects.get(pk=pk)
+        second = Transaction.objects.get(pk=pk)
+
+        first.amount = Decimal('25.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        # Loaded with amount 10 and completed; the row now holds 25
+        second.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save()
+        self.assertBalanceConsistent()
+        self.assertEqual(self.cashbook.current_balance, Decimal('100.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            # Deleting the same row again through another copy is a no-op
+            self.assertEqual(second.delete(), (0, {}))
+        self.assertBalanceConsistent()
+
+    def test_saves_of_other_fields_leave_balance_alone(self):
+        transaction = Transaction.objects.get(pk=self.create_transaction().pk)
+        Transaction.objects.filter(pk=transaction.pk).update(amount=Decimal('70.00'))
+        transaction.description = 'Edited'
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            transaction.save(update_fields=['description'])
+        self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transaction'), [])
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('110.00'))
+
+    def test_unloaded_instance_falls_back_to_database(self):
+        original = self.create_transaction()
+        transaction = Transaction(
+            pk=original.pk,
+            transaction_id=original.transaction_id,
+            cashbook=self.cashbook,
+            amount=Decimal('40.00'),
+            type=self.income,
+            transaction_date=original.transaction_date,
+            created_by=self.user,
+            created_at=original.created_at,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.save()
+        self.assertBalanceConsistent()
+
+    def test_delete_uses_stored_values(self):
+        transaction = Transaction.objects.get(pk=self.create_transaction().pk)
+        transaction.amount = Decimal('999.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.delete()
+        self.assertBalanceConsistent()
+
+
+class CoalescedBalanceUpdateTests(TransactionTestMixin, TestCase):
+    """Balance changes made inside a database transaction are applied once on commit"""
+
+    def test_many_writes_apply_one_balance_update(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with db_transaction.atomic():
+                for day in range(1, 21):
+                    Transaction.objects.create(
+                        cashbook=self.cashbook,
+                        amount=Decimal('5.00'),
+                        type=self.income,
+                        transaction_date=date(2024, 1, day % 3 + 1),
+                        created_by=self.user,
+                    )
+
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('100.00'))
+        self.assertEqual(len(callbacks), 1)
+
+        with CaptureQueriesContext(connection) as context:
+            callbacks[0]()
+        cashbook_updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "store_cashbook"')
+        ]
+        self.assertEqual(len(cashbook_updates), 1)
+        self.assertBalanceConsistent()
+        self.assertEqual(
+            self.cashbook.balance_at(date(2024, 1, 3)), self.cashbook.calculate_balance()
+        )
+
+    def test_rolled_back_savepoint_discards_its_changes(self):
+        def create(amount):
+            Transaction.objects.create(
+                cashbook=self.cashbook,
+                amount=amount,
+                type=self.income,
+                transaction_date=date(2024, 1, 15),
+                created_by=self.user,
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with db_transaction.atomic():
+                create(Decimal('10.00'))
+                try:
+                    with db_transaction.atomic():
+                        create(Decimal('50.00'))
+                        raise ValueError
+                except ValueError:
+                    pass
+                create(Decimal('5.00'))
+
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('115.00'))
+        self.assertBalanceConsistent()
+
+    def test_changes_are_applied_before_the_block_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with atomic_with_balances():
+                for day in range(1, 4):
+                    Transaction.objects.create(
+                        cashbook=self.cashbook,
+                        amount=Decimal('5.00'),
+                        type=self.income,
+                        transaction_date=date(2024, 1, day),
+                        created_by=self.user,
+                    )
+
+            self.cashbook.refresh_from_db()
+            self.assertEqual(self.cashbook.current_balance, Decimal('115.00'))
+            self.assertBalanceConsistent()
+
+        # The fallback callback finds nothing left to apply
+        with CaptureQueriesContext(connection) as context:
+            for callback in callbacks:
+                callback()
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(('UPDATE', 'INSERT'))
+        ]
+        self.assertEqual(writes, [])
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('115.00'))
+
+    def test_failed_balance_update_rolls_back_the_row(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = {
+            'cashbook': self.cashbook.pk,
+            'amount': '10.00',
+            'type': self.income.pk,
+            'transaction_date': '2024-01-15',
+        }
+
+        with mock.patch('transactions.accumulator.apply_balance_delta', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                client.post('/api/transactions/', data, format='json')
+
+        self.assertFalse(Transaction.objects.exists())
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('100.00'))
+
+
+class TransactionBalanceSignalTests(TransactionTestMixin, TestCase):
+    """Every kind of write moves the balance, daily snapshots and counters by its effect"""
+
+    def setUp(self):
+        super().setUp()
+        self.transfer = TransactionType.objects.create(name='Move', nature=TransactionType.TRANSFER)
+        self.other = Cashbook.objects.create(
+            store=self.store, name='Other Cashbook', initial_balance=Decimal('50.00')
+        )
+        self.transaction = self.create_transaction(amount=Decimal('40.00'))
+
+    def save(self, **changes):
+        transaction = Transaction.objects.select_related('type').get(pk=self.transaction.pk)
+        for field, value in changes.items():
+            setattr(transaction, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.save()
+        return transaction
+
+    def assertBalance(self, expected, cashbook=None):
+        cashbook = cashbook or self.cashbook
+        self.assertBalanceConsistent(cashbook)
+        self.assertEqual(cashbook.current_balance, Decimal(expected))
+        # The snapshots and counters agree with the transactions too
+        self.assertEqual(cashbook.balance_at(date(2024, 12, 31)), Decimal(expected))
+        self.assertEqual(
+            cashbook.completed_transaction_count,
+            Transaction.objects.filter(cashbook=cashbook, status='completed').count()
+        )
+
+    def test_create(self):
+        self.assertBalance('140.00')
+        self.create_transaction(amount=Decimal('15.00'), type=self.expense)
+        self.create_transaction(amount=Decimal('5.00'), type=self.transfer)
+        self.assertBalance('120.00')
+
+    def test_status_transitions(self):
+        for status, expected in [
+            ('pending', '100.00'),
+            ('completed', '140.00'),
+            ('cancelled', '100.00'),
+            ('pending', '100.00'),
+            ('completed', '140.00'),
+        ]:
+            with self.subTest(status=status):
+                self.save(status=status)
+                self.assertBalance(expected)
+
+    def test_amount_edit(self):
+        self.save(amount=Decimal('25.50'))
+        self.assertBalance('125.50')
+
+    def test_type_edits(self):
+        self.save(type=self.expense)
+        self.assertBalance('60.00')
+        # Transfers count as outflows like expenses
+        self.save(type=self.transfer, amount=Decimal('30.00'))
+        self.assertBalance('70.00')
+        self.save(type=self.income)
+        self.assertBalance('130.00')
+
+    def test_date_edit_moves_the_snapshot(self):
+        self.save(transaction_date=date(2024, 3, 1))
+
+        self.assertBalance('140.00')
+        self.assertEqual(self.cashbook.balance_at(date(2024, 2, 1)), Decimal('100.00'))
+        self.assertEqual(self.cashbook.balance_at(date(2024, 3, 1)), Decimal('140.00'))
+
+    def test_move_between_cashbooks(self):
+        self.save(cashbook=self.other, amount=Decimal('45.00'))
+
+        self.assertBalance('100.00')
+        self.assertBalance('95.00', self.other)
+
+    def test_pending_move_leaves_balances_alone(self):
+        self.save(status='pending')
+        self.save(cashbook=self.other)
+
+        self.assertBalance('100.00')
+        self.assertBalance('50.00', self.other)
+
+    def test_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.get(pk=self.transaction.pk).delete()
+
+        self.assertBalance('100.00')
+        self.assertFalse(CashbookBalance.objects.filter(cashbook=self.cashbook).exclude(total_income=0).exists())
+
+
+class RunningBalanceTests(TransactionTestMixin, TestCase):
+    """by_cashbook's running_balance follows the whole ledger, not the page"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        # 25 rows over 10 days, several per day, with outflows and a pending row
+        for index in range(25):
+            self.create_transaction(
+                amount=Decimal(index + 1),
+                type=self.expense if index % 3 == 0 else self.income,
+                transaction_date=date(2024, 1, index % 10 + 1),
+                status='pending' if index == 7 else 'completed',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected_balances(self, start=None):
+        """Replay the ledger in (date, created_at, id) order"""
+        balance = self.cashbook.initial_balance
+        expected = {}
+        for transaction in Transaction.objects.select_related('type').order_by('transaction_date', 'created_at', 'id'):
+            if transaction.status == 'completed':
+                income = transaction.type.nature == TransactionType.INCOME
+                balance += transaction.amount if income else -transaction.amount
+            if start is None or transaction.transaction_date >= start:
+                expected[transaction.id] = balance
+        return expected
+
+    def ledger(self, params=''):
+        rows = []
+        url = f'/api/transactions/by_cashbook/?cashbook={self.cashbook.pk}&running_balance=true{params}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            rows.append(response.data['results'])
+            url = response.data['next']
+        return rows
+
+    def test_balance_carries_across_pages(self):
+        pages = self.ledger()
+
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        expected = self.expected_balances()
+        self.assertEqual(
+            {row['id']: Decimal(row['running_balance']) for page in pages for row in page}, expected
+        )
+        # Newest first, so the first row of the first page holds the current balance
+        self.assertEqual(Decimal(pages[0][0]['running_balance']), self.cashbook.calculate_balance())
+
+    def test_start_date_opens_from_the_earlier_balance(self):
+        pages = self.ledger('&start_date=2024-01-04&end_date=2024-01-08')
+
+        rows = [row for page in pages for row in page]
+        self.assertTrue(rows)
+        self.assertTrue(all('2024-01-04' <= row['transaction_date'] <= '2024-01-08' for row in rows))
+        expected = self.expected_balances(start=date(2024, 1, 4))
+        self.assertEqual(
+            {row['id']: Decimal(row['running_balance']) for row in rows},
+            {pk: balance for pk, balance in expected.items() if pk in {row['id'] for row in rows}}
+        )
+
+
+class TransactionBulkCreateTests(TransactionTestMixin, TestCase):
+    """Bulk creation inserts in batches and updates balances once per cashbook"""
+
+    def post_rows(self, count, days=None):
+        days = days or [f'2024-01-{day:02d}' for day in range(1, 6)]
+        client = APIClient()
+        client.force_authenticate(self.user)
+        rows = [
+            {
+                'cashbook': self.cashbook.pk,
+                'amount': '2.50',
+                'type': self.income.pk if index % 2 else self.expense.pk,
+                'transaction_date': days[index % len(days)],
+                'status': 'completed',
+            }
+            for index in range(count)
+        ]
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            response = client.post('/api/transactions/bulk_create/', {'transactions': rows}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), count)
+        return context.captured_queries
+
+    def test_query_count_does_not_grow_with_rows(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        # Warm the store access cache and create the five daily snapshots,
+        # so both posts run the same lookups and touch the same days
+        self.post_rows(5)
+
+        small = self.post_rows(10)
+        large = self.post_rows(40)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Transaction.objects.count(), 55)
+        self.assertBalanceConsistent()
+        self.assertEqual(
+            self.cashbook.balance_at(date(2024, 1, 5)), self.cashbook.calculate_balance()
+        )
+
+    def test_query_count_does_not_grow_with_days(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        # Existing days (and January rollups) on both sides of the posted days
+        self.post_rows(4, days=['2023-12-31', '2023-12-31', '2024-01-31', '2024-01-31'])
+
+        # Every row on a new day, with an existing day after them to roll forward
+        small = self.post_rows(4, days=[f'2024-01-{day:02d}' for day in range(1, 5)])
+        large = self.post_rows(24, days=[f'2024-01-{day:02d}' for day in range(5, 29)])
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(CashbookBalance.objects.count(), 30)
+        self.assertBalanceConsistent()
+        self.assertEqual(
+            self.cashbook.balance_at(date(2024, 1, 31)), self.cashbook.calculate_balance()
+        )
+
+
+@override_settings(TRANSACTION_IMPORT_CHUNK_SIZE=2)
+class TransactionImportTests(TransactionTestMixin, TestCase):
+    """CSV import creates valid rows in chunks and reports invalid ones"""
+
+    def test_csv_import_reports_row_errors(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = SimpleUploadedFile('bank.csv', (
+            'Cashbook,Amount,Type,Transaction Date\n'
+            'Main Cashbook,20.00,Sale,2024-02-01\n'
+            'main cashbook,5.00,rent,2024-02-02\n'
+            'Main Cashbook,7.50,Unknown,2024-02-03\n'
+            'Main Cashbook,-1,Sale,2024-02-04\n'
+            'Main Cashbook,3.00,Sale,2024-02-05\n'
+        ).encode())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_rows'], 5)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+        self.assertIn('type', response.data['errors'][0]['errors'])
+        self.assertIn('amount', response.data['errors'][1]['errors'])
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('118.00'))
+        self.assertBalanceConsistent()
+
+    def test_unreadable_csv_is_rejected(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # Longer than csv.field_size_limit(), which makes the reader raise csv.Error
+        upload = SimpleUploadedFile('bank.csv', (
+            'Cashbook,Amount,Type,Transaction Date,Description\n'
+            'Main Cashbook,20.00,Sale,2024-02-01,"' + 'x' * 200000 + '"\n'
+        ).encode())
+
+        response = client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Could not read the CSV file', response.data['error'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_damaged_xlsx_is_rejected(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        workbook = Workbook()
+        workbook.active.append(['Cashbook', 'Amount', 'Type', 'Transaction Date'])
+        for day in range(1, 29):
+            workbook.active.append(['Main Cashbook', 1, 'Sale', f'2024-02-{day:02d}'])
+        content = io.BytesIO()
+        workbook.save(content)
+        content = content.getvalue()
+
+        # Same archive with the sheet XML cut off after a few chunks of rows
+        damaged = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(content)) as source, zipfile.ZipFile(damaged, 'w') as target:
+            for item in source.infolist():
+                data = source.read(item)
+                if item.filename == 'xl/worksheets/sheet1.xml':
+                    data = data[:len(data) // 2]
+                target.writestr(item, data)
+
+        for name, data in [('truncated', content[:len(content) // 2]), ('damaged sheet', damaged.getvalue())]:
+            with self.subTest(name):
+                upload = SimpleUploadedFile('bank.xlsx', data)
+                response = client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], 'Could not read the XLSX file')
+                self.assertFalse(Transaction.objects.exists())
+
+
+class TransactionCursorPaginationTests(TransactionTestMixin, TestCase):
+    """?pagination=cursor walks every row once, in order, in both directions"""
+
+    def test_walks_pages_with_equal_dates(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        Transaction.objects.bulk_create([
+            Transaction(
+                cashbook=self.cashbook, amount=Decimal('1.00'), type=self.income,
+                transaction_date=date(2024, 1, index % 3 + 1), created_by=self.user
+            )
+            for index in range(25)
+        ])
+        # Rows with identical dates and timestamps are ordered by id
+        Transaction.objects.filter(transaction_date=date(2024, 1, 1)).update(
+            created_at=Transaction.objects.earliest('created_at').created_at
+        )
+        expected = list(Transaction.objects.order_by(
+            '-transaction_date', '-created_at', 'id'
+        ).values_list('id', flat=True))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = '/api/transactions/?pagination=cursor&page_size=4'
+        pages = []
+        while url:
+            response = client.get(url)
+            self.assertNotIn('count', response.data)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data['next']
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+        previous = client.get(response.data['previous']).data
+        self.assertEqual([row['id'] for row in previous['results']], pages[-2])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Plans are read with SQLite EXPLAIN QUERY PLAN')
+class TransactionQueryPlanTests(TransactionTestMixin, TestCase):
+    """The main endpoints read transactions through indexes, never a full table scan"""
+
+    COMPOSITE_INDEXES = [index.name for index in Transaction._meta.indexes]
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.create_transaction()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def query_plans(self, url):
+        """Return the query plan of every transaction SELECT run by a GET request"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        for query in context.captured_queries:
+            if query['sql'].startswith('SELECT') and '"transactions_transaction"' in query['sql']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                    plans.append('\n'.join(row[3] for row in cursor.fetchall()))
+        self.assertTrue(plans)
+        return plans
+
+    def assertNoFullScan(self, plans):
+        for plan in plans:
+            self.assertIsNone(
+                re.search(r'^SCAN transactions_transaction\b(?! USING)', plan, re.MULTILINE), plan
+            )
+
+    def test_store_wide_endpoints(self):
+        for url in [
+            '/api/transactions/',
+            '/api/transactions/?pagination=cursor',
+            f'/api/transactions/by_store/?store={self.store.pk}',
+            # Reports only read transactions for partial months
+            '/api/transactions/summary/?start_date=2024-01-10&end_date=2024-03-20',
+            '/api/transactions/by_type/?start_date=2024-01-10',
+            '/api/transactions/by_category/?end_date=2024-03-20',
+        ]:
+            with self.subTest(url=url):
+                self.assertNoFullScan(self.query_plans(url))
+
+    def test_filtered_endpoints_use_composite_indexes(self):
+        cashbook = self.cashbook.pk
+        for url in [
+            f'/api/transactions/by_cashbook/?cashbook={cashbook}',
+            f'/api/transactions/by_cashbook/?cashbook={cashbook}&running_balance=true&start_date=2024-01-10',
+            f'/api/transactions/?cashbook={cashbook}&status=completed',
+            '/api/transactions/pending/',
+            '/api/transactions/recent/?days=30',
+            '/api/transactions/by_date_range/?start_date=2024-01-01&end_date=2024-01-31',
+            f'/api/transactions/summary/?cashbook={cashbook}&start_date=2024-01-10',
+        ]:
+            with self.subTest(url=url):
+                plans = self.query_plans(url)
+                self.assertNoFullScan(plans)
+                self.assertTrue(
+                    any(name in plan for plan in plans for name in self.COMPOSITE_INDEXES),
+                    plans
+                )
+
+
+class StoreAccessCacheTests(TransactionTestMixin, TestCase):
+    """Store memberships are resolved once per request and invalidated on change"""
+
+    def setUp(self):
+        super().setUp()
+        self.membership = StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        for index in range(3):
+            Cashbook.objects.create(store=self.store, name=f'Cashbook {index}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_memberships_loaded_once_per_request(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/cashbooks/')
+        self.assertEqual(response.status_code, 200)
+        # One lookup builds the role map; user_role on every row reuses it
+        self.assertEqual(len(self.selects_from(context.captured_queries, 'store_storeuser')), 1)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/cashbooks/')
+        self.assertEqual(self.selects_from(context.captured_queries, 'store_storeuser'), [])
+
+    def test_membership_changes_invalidate_cache(self):
+        self.assertEqual(self.client.get(f'/api/cashbooks/{self.cashbook.pk}/').status_code, 200)
+
+        self.membership.role = 'staff'
+        self.membership.save()
+        response = self.client.post(f'/api/cashbooks/{self.cashbook.pk}/recalculate_balance/')
+        self.assertEqual(response.status_code, 403)
+
+        self.membership.delete()
+        self.assertEqual(self.client.get(f'/api/cashbooks/{self.cashbook.pk}/').status_code, 404)
+
+    @override_settings(STORE_ACCESS_CACHE='default')
+    def test_process_local_cache_is_not_used_across_requests(self):
+        self.assertEqual(self.client.get(f'/api/cashbooks/{self.cashbook.pk}/').status_code, 200)
+
+        # Removed by another worker: its invalidation never reaches this process
+        StoreUser.objects.filter(pk=self.membership.pk).update(store=Store.objects.create(name='Other'))
+        # A new request authenticates a freshly loaded user
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        self.assertEqual(self.client.get(f'/api/cashbooks/{self.cashbook.pk}/').status_code, 404)
+
+    def test_uses_its_own_shared_alias(self):
+        # The default cache stays local memory for everything else
+        self.assertTrue(is_shared_cache(get_store_access_cache()))
+        self.assertFalse(is_shared_cache(caches['default']))
+
+
+class TransactionCounterTests(TransactionTestMixin, TestCase):
+    """Transaction counters are maintained on write and can be rebuilt"""
+
+    def setUp(self):
+        super().setUp()
+        self.food = TransactionCategory.objects.create(name='Food')
+        self.rent = TransactionCategory.objects.create(name='Rent')
+
+    def assertCountersConsistent(self):
+        self.cashbook.refresh_from_db()
+        self.assertEqual(
+            self.cashbook.completed_transaction_count,
+            self.cashbook.transactions.filter(status='completed').count()
+        )
+        self.assertEqual(
+            self.cashbook.pending_transaction_count,
+            self.cashbook.transactions.filter(status='pending').count()
+        )
+        for item in TransactionType.objects.all():
+            self.assertEqual(item.transaction_count, item.transactions.count(), item)
+        for item in TransactionCategory.objects.all():
+            self.assertEqual(item.transaction_count, item.transaction_set.count(), item)
+
+    def test_counters_follow_writes(self):
+        first = self.create_transaction(category=self.food)
+        self.create_transaction(status='pending', type=self.expense, category=self.rent)
+        self.create_transaction(status='cancelled')
+        self.assertCountersConsistent()
+        self.assertEqual(self.cashbook.completed_transaction_count, 1)
+        self.assertEqual(self.cashbook.pending_transaction_count, 1)
+
+        first = Transaction.objects.get(pk=first.pk)
+        first.status = 'pending'
+        first.type = self.expense
+        first.category = self.rent
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertCountersConsistent()
+        self.rent.refresh_from_db()
+        self.assertEqual(self.rent.transaction_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertCountersConsistent()
+
+    def test_list_endpoints_run_no_count_queries(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.create_transaction(category=self.food)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        for url in ['/api/transactions/types/', '/api/transactions/categories/', '/api/cashbooks/']:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transaction'), [])
+
+    def test_rebuild_command_repairs_drift(self):
+        self.create_transaction(category=self.food)
+        self.create_transaction(status='pending')
+        Cashbook.objects.update(completed_transaction_count=7, pending_transaction_count=0)
+        TransactionCategory.objects.update(transaction_count=3)
+
+        call_command('rebuild_transaction_counters', stdout=io.StringIO())
+        self.assertCountersConsistent()
+
+    def test_sample_data_command_fills_counters(self):
+        # bulk_create skips the signals, so the command rebuilds the counters
+        call_command('create_sample_data', stdout=io.StringIO())
+        self.assertTrue(self.cashbook.transactions.exists())
+        self.assertCountersConsistent()
+
+
+class CashbookBalanceReportTests(TransactionTestMixin, TestCase):
+    """The balance fields of a cashbook share one report per request"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.create_transaction(amount=Decimal('40.00'))
+        self.create_transaction(amount=Decimal('15.00'), type=self.expense)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ledger_queries(self, method, url):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, 200)
+        return response, self.selects_from(context.captured_queries, 'transactions_transaction')
+
+    def test_retrieve_computes_report_once(self):
+        response, queries = self.ledger_queries('get', f'/api/cashbooks/{self.cashbook.pk}/')
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['calculated_balance'], '125.00')
+        self.assertTrue(response.data['balance_is_accurate'])
+        self.assertEqual(response.data['balance_summary']['calculated_balance'], Decimal('125.00'))
+
+    def test_recalculate_returns_computed_summary(self):
+        Cashbook.objects.filter(pk=self.cashbook.pk).update(current_balance=Decimal('0.00'))
+
+        response, queries = self.ledger_queries(
+            'post', f'/api/cashbooks/{self.cashbook.pk}/recalculate_balance/'
+        )
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['new_balance'], '125.00')
+        self.assertEqual(response.data['balance_summary']['current_balance'], Decimal('125.00'))
+        self.assertBalanceConsistent()
+
+    def test_recalculate_locks_cashbook_and_ignores_stale_annotations(self):
+        cashbook = annotate_balance_reports(Cashbook.objects.filter(pk=self.cashbook.pk)).get()
+        self.create_transaction(amount=Decimal('5.00'))
+        Cashbook.objects.filter(pk=self.cashbook.pk).update(current_balance=Decimal('0.00'))
+
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(
+            QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update
+        ) as locked:
+            summary = cashbook.recalculate_and_save_balance()
+
+        self.assertIn(Cashbook, [call.args[0].model for call in locked.call_args_list])
+        self.assertEqual(summary['calculated_balance'], Decimal('130.00'))
+        self.assertBalanceConsistent()
+
+
+class DailyBalanceSnapshotTests(TransactionTestMixin, TestCase):
+    """Daily snapshots open from everything before the day"""
+
+    def test_backfill_migration_rebuilds_openings(self):
+        # Written before the snapshots were maintained: no rows for them
+        Transaction.objects.bulk_create([
+            Transaction(
+                cashbook=self.cashbook, amount=Decimal('30.00'), type=self.income,
+                transaction_date=date(2024, 1, 1), created_by=self.user
+            ),
+            Transaction(
+                cashbook=self.cashbook, amount=Decimal('5.00'), type=self.expense,
+                transaction_date=date(2024, 1, 2), created_by=self.user
+            ),
+        ])
+        self.create_transaction(amount=Decimal('10.00'), transaction_date=date(2024, 1, 10))
+        # The write path found no earlier snapshot and opened from the initial balance
+        self.assertEqual(
+            CashbookBalance.objects.get(date=date(2024, 1, 10)).opening_balance, Decimal('100.00')
+        )
+
+        migration = importlib.import_module('transactions.migrations.0008_backfill_daily_balances')
+        migration.backfill_daily_balances(django_apps, None)
+
+        self.assertEqual(
+            list(CashbookBalance.objects.order_by('date').values_list('date', 'opening_balance', 'closing_balance')),
+            [
+                (date(2024, 1, 1), Decimal('100.00'), Decimal('130.00')),
+                (date(2024, 1, 2), Decimal('130.00'), Decimal('125.00')),
+                (date(2024, 1, 10), Decimal('125.00'), Decimal('135.00')),
+            ]
+        )
+
+
+    def test_flush_over_many_days_matches_rebuild(self):
+        for day in (2, 5, 9):
+            self.create_transaction(transaction_date=date(2024, 1, day))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with atomic_with_balances():
+                for day in (1, 5, 7, 12):
+                    Transaction.objects.create(
+                        cashbook=self.cashbook, amount=Decimal(day), type=self.income,
+                        transaction_date=date(2024, 1, day), created_by=self.user
+                    )
+                Transaction.objects.create(
+                    cashbook=self.cashbook, amount=Decimal('3.00'), type=self.expense,
+                    transaction_date=date(2024, 1, 2), created_by=self.user
+                )
+
+        fields = ('date', 'opening_balance', 'closing_balance', 'total_income', 'total_expense')
+        maintained = list(CashbookBalance.objects.order_by('date').values_list(*fields))
+        rebuild_daily_balances(Cashbook.objects.filter(pk=self.cashbook.pk))
+        self.assertEqual(maintained, list(CashbookBalance.objects.order_by('date').values_list(*fields)))
+        self.assertEqual(len(maintained), 6)
+
+
+class CashbookBalanceAtTests(TransactionTestMixin, TestCase):
+    """The single-date and series forms of balance_at agree"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.create_transaction(amount=Decimal('30.00'), transaction_date=date(2024, 1, 1))
+        self.create_transaction(amount=Decimal('5.00'), type=self.expense, transaction_date=date(2024, 1, 3))
+        self.create_transaction(amount=Decimal('7.00'), transaction_date=date(2024, 1, 5), status='pending')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/cashbooks/{self.cashbook.pk}/balance_at/'
+
+    def series(self, days):
+        response = self.client.get(self.url, {'dates': ','.join(day.isoformat() for day in days)})
+        self.assertEqual(response.status_code, 200)
+        return {item['date']: item['balance'] for item in response.data['balances']}
+
+    def single(self, day):
+        response = self.client.get(self.url, {'date': day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return response.data['balance']
+
+    def assertFormsAgree(self, expected):
+        self.assertEqual(self.series(list(expected)), expected)
+        for day, balance in expected.items():
+            self.assertEqual(self.single(day), balance)
+
+    def test_forms_agree(self):
+        self.assertFormsAgree({
+            date(2023, 12, 31): '100.00',
+            date(2024, 1, 1): '130.00',
+            date(2024, 1, 2): '130.00',
+            date(2024, 1, 4): '125.00',
+            date(2024, 1, 9): '125.00',
+        })
+
+    def test_forms_agree_when_snapshots_are_missing(self):
+        # Days the snapshots don't cover yet are added from the transactions
+        Transaction.objects.bulk_create([Transaction(
+            cashbook=self.cashbook, amount=Decimal('20.00'), type=self.income,
+            transaction_date=date(2024, 1, 8), created_by=self.user
+        )])
+        CashbookBalance.objects.filter(date=date(2024, 1, 1)).delete()
+        self.assertFormsAgree({
+            date(2024, 1, 1): '130.00',
+            date(2024, 1, 2): '130.00',
+            date(2024, 1, 3): '125.00',
+            date(2024, 1, 9): '145.00',
+        })
+
+    def test_requires_a_day(self):
+        for params in [{}, {'dates': ','}, {'dates': ' , '}, {'date': 'tomorrow'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class RecalculateBalanceCommandTests(TransactionTestMixin, TestCase):
+    """recalculate_balance finds and fixes drifted balances without losing concurrent updates"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_transaction(amount=Decimal('40.00'))
+        self.other_store = Store.objects.create(name='Other Store')
+        self.other = Cashbook.objects.create(
+            store=self.other_store, name='Other Cashbook', initial_balance=Decimal('50.00')
+        )
+        self.create_transaction(cashbook=self.other, amount=Decimal('5.00'), type=self.expense)
+        Cashbook.objects.filter(pk__in=[self.cashbook.pk, self.other.pk]).update(current_balance=Decimal('0.00'))
+
+    def run_command(self, *args):
+        output = io.StringIO()
+        call_command('recalculate_balance', *args, stdout=output)
+        return output.getvalue()
+
+    def test_fixes_drifted_balances(self):
+        output = self.run_command()
+
+        self.assertIn('Inconsistencies Found: 2', output)
+        self.assertIn('Balances Updated: 2', output)
+        self.assertBalanceConsistent()
+        self.assertBalanceConsistent(self.other)
+
+    def test_check_only_leaves_balances_alone(self):
+        for args in [('--check-only',), ('--dry-run',), ('--check-only', '--workers', '2')]:
+            with self.subTest(args=args):
+                output = self.run_command(*args)
+                self.assertIn('Inconsistencies Found: 2', output)
+                self.cashbook.refresh_from_db()
+                self.assertEqual(self.cashbook.current_balance, Decimal('0.00'))
+
+    def test_workers_split_the_stores(self):
+        output = self.run_command('--check-only', '--workers', '2')
+
+        self.assertIn('Total Cashbooks Processed: 2', output)
+        self.assertIn('Workers: 2', output)
+
+        # More workers than stores: one process per store
+        output = self.run_command('--check-only', '--workers', '5')
+        self.assertIn('Workers: 2', output)
+
+    def test_workers_cannot_be_combined_with_filters(self):
+        output = self.run_command('--workers', '2', '--store-id', str(self.store.pk))
+
+        self.assertIn('cannot be combined with --cashbook-id or --store-id', output)
+        self.assertNotIn('Summary', output)
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('0.00'))
+
+    def test_delta_committed_after_the_check_is_kept(self):
+        from store.management.commands import recalculate_balance
+
+        def read_then_write(queryset):
+            # The first (unlocked) read sees 140; a write lands right after it
+            rows = list(annotate_balance_reports(queryset))
+            if not calls:
+                self.create_transaction(amount=Decimal('3.00'))
+            calls.append(queryset)
+            return rows
+
+        calls = []
+        with mock.patch.object(recalculate_balance, 'annotate_balance_reports', side_effect=read_then_write):
+            self.run_command('--cashbook-id', str(self.cashbook.pk))
+
+        self.cashbook.refresh_from_db()
+        self.assertEqual(self.cashbook.current_balance, Decimal('143.00'))
+        self.assertBalanceConsistent()
+
+
+class TransactionReportCacheTests(TransactionTestMixin, TestCase):
+    """summary, by_category and by_type are cached until the store's data changes"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.food = TransactionCategory.objects.create(name='Food')
+        self.create_transaction(amount=Decimal('40.00'), category=self.food)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, client=None):
+        """Return the response and the report queries it ran"""
+        with CaptureQueriesContext(connection) as context:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [
+            sql for table in ('transactions_transaction', 'transactions_transactionmonthlyrollup')
+            for sql in self.selects_from(context.captured_queries, table)
+        ]
+
+    def test_repeated_reports_are_served_from_cache(self):
+        for url in [
+            '/api/transactions/summary/?start_date=2024-01-01&cashbook=' + str(self.cashbook.pk),
+            '/api/transactions/by_category/',
+            '/api/transactions/by_type/',
+        ]:
+            with self.subTest(url=url):
+                first, queries = self.get(url)
+                self.assertEqual(first['X-Report-Cache'], 'miss')
+                self.assertTrue(queries)
+
+                second, queries = self.get(url)
+                self.assertEqual(second['X-Report-Cache'], 'hit')
+                self.assertEqual(queries, [])
+                self.assertEqual(second.data, first.data)
+
+    def test_param_order_does_not_matter(self):
+        self.get(f'/api/transactions/summary/?cashbook={self.cashbook.pk}&status=completed')
+        response, _ = self.get(f'/api/transactions/summary/?status=completed&cashbook={self.cashbook.pk}&page=2')
+        self.assertEqual(response['X-Report-Cache'], 'hit')
+
+    def test_transaction_write_invalidates_store_reports(self):
+        response, _ = self.get('/api/transactions/summary/')
+        self.assertEqual(response.data['total_income'], '40.00')
+
+        self.create_transaction(amount=Decimal('2.00'))
+        response, _ = self.get('/api/transactions/summary/')
+        self.assertEqual(response['X-Report-Cache'], 'miss')
+        self.assertEqual(response.data['total_income'], '42.00')
+
+        # Edits that leave the balance alone count as writes too
+        transaction = Transaction.objects.filter(status='completed').first()
+        transaction.status = 'pending'
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.save()
+        self.create_transaction(amount=Decimal('1.00'), status='pending')
+        response, _ = self.get('/api/transactions/by_category/')
+        self.assertEqual(response['X-Report-Cache'], 'miss')
+
+    def test_category_rename_invalidates_reports(self):
+        self.get('/api/transactions/by_category/')
+
+        self.food.name = 'Groceries'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.save()
+        response, _ = self.get('/api/transactions/by_category/')
+        self.assertEqual(response['X-Report-Cache'], 'miss')
+        self.assertEqual(response.data[0]['category__name'], 'Groceries')
+
+    def test_entries_are_scoped_to_visible_stores(self):
+        self.get(f'/api/transactions/summary/?store={self.store.pk}')
+
+        outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='secret')
+        client = APIClient()
+        client.force_authenticate(outsider)
+        response, _ = self.get(f'/api/transactions/summary/?store={self.store.pk}', client)
+        self.assertEqual(response['X-Report-Cache'], 'miss')
+        self.assertEqual(response.data['total_transactions'], 0)
+
+    def test_stats_command_reports_counters(self):
+        self.get('/api/transactions/by_type/')
+        self.get('/api/transactions/by_type/')
+
+        output = io.StringIO()
+        call_command('report_cache_stats', '--reset', stdout=output)
+        self.assertIn('Hits: 1', output.getvalue())
+        self.assertIn('Misses: 1', output.getvalue())
+        self.assertIn('Hit Rate: 50.0%', output.getvalue())
+        self.assertNotIn('local to each process', output.getvalue())
+
+    def test_reports_are_shared_between_workers_by_default(self):
+        self.assertTrue(report_cache.is_shared())
+
+    @override_settings(TRANSACTION_REPORT_CACHE='default')
+    def test_stats_endpoint_reads_the_serving_process(self):
+        self.get('/api/transactions/by_type/')
+        self.get('/api/transactions/by_type/')
+        self.assertEqual(self.client.get('/api/transactions/report_cache_stats/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/transactions/report_cache_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'shared': False})
+
+        output = io.StringIO()
+        call_command('report_cache_stats', stdout=output)
+        self.assertIn('local to each process', output.getvalue())
+
+
+class TransactionMonthlyRollupTests(TransactionTestMixin, TestCase):
+    """Summary reports read whole months from the maintained monthly rollup"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.food = TransactionCategory.objects.create(name='Food')
+        for day, amount, kwargs in [
+            (date(2024, 1, 5), '10.00', {'category': self.food}),
+            (date(2024, 1, 20), '20.00', {}),
+            (date(2024, 2, 10), '30.00', {'type': self.expense}),
+            (date(2024, 3, 1), '40.00', {'category': self.food}),
+            (date(2024, 3, 25), '50.00', {'status': 'pending'}),
+        ]:
+            self.create_transaction(transaction_date=day, amount=Decimal(amount), **kwargs)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rollup_rows(self):
+        return sorted(
+            (row.month, row.type_id, row.category_id or 0, row.status, row.total_amount, row.transaction_count)
+            for row in TransactionMonthlyRollup.objects.filter(transaction_count__gt=0)
+        )
+
+    def assertRollupsConsistent(self):
+        maintained = self.rollup_rows()
+        rebuild_monthly_rollups(Cashbook.objects.all())
+        self.assertEqual(maintained, self.rollup_rows())
+
+    def test_rollups_follow_writes(self):
+        self.assertRollupsConsistent()
+
+        transaction = Transaction.objects.get(transaction_date=date(2024, 1, 20))
+        transaction.transaction_date = date(2024, 2, 3)
+        transaction.category = self.food
+        transaction.amount = Decimal('25.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.save()
+        self.assertRollupsConsistent()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.delete()
+        self.assertRollupsConsistent()
+
+    def test_whole_months_skip_transactions_table(self):
+        url = '/api/transactions/summary/?start_date=2024-01-01&end_date=2024-12-31'
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transaction'), [])
+        self.assertEqual(response.data['total_transactions'], 5)
+        self.assertEqual(response.data['total_income'], '120.00')
+        self.assertEqual(response.data['total_expense'], '30.00')
+
+    def test_partial_months_match_raw_totals(self):
+        for params in [
+            'start_date=2024-01-10&end_date=2024-03-15',
+            'start_date=2024-01-10&end_date=2024-01-25',
+            'end_date=2024-02-29&status=completed',
+            f'category={self.food.pk}&start_date=2024-01-02',
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(f'/api/transactions/summary/?{params}')
+                self.assertEqual(response.status_code, 200)
+
+                raw = Transaction.objects.all()
+                for name, value in (pair.split('=') for pair in params.split('&')):
+                    lookup = {
+                        'start_date': 'transaction_date__gte', 'end_date': 'transaction_date__lte',
+                    }.get(name, name)
+                    raw = raw.filter(**{lookup: value})
+                self.assertEqual(response.data['total_transactions'], raw.count())
+                self.assertEqual(
+                    Decimal(response.data['total_amount']),
+                    sum((row.amount for row in raw), Decimal('0'))
+                )
+
+    def test_split_period(self):
+        self.assertEqual(split_period(), (None, None, []))
+        self.assertEqual(
+            split_period(date(2024, 1, 1), date(2024, 3, 31)),
+            (date(2024, 1, 1), date(2024, 4, 1), [])
+        )
+        self.assertEqual(
+            split_period(date(2024, 1, 10), date(2024, 3, 15)),
+            (date(2024, 2, 1), date(2024, 3, 1),
+             [(date(2024, 1, 10), date(2024, 1, 31)), (date(2024, 3, 1), date(2024, 3, 15))])
+        )
+        self.assertEqual(
+            split_period(date(2024, 2, 10), date(2024, 2, 20)),
+            (date(2024, 3, 1), date(2024, 2, 1), [(date(2024, 2, 10), date(2024, 2, 20))])
+        )
+
+    def test_rebuild_command_repairs_drift(self):
+        TransactionMonthlyRollup.objects.update(total_amount=Decimal('999.00'))
+        call_command('rebuild_monthly_rollups', stdout=io.StringIO())
+
+        response = self.client.get('/api/transactions/summary/')
+        self.assertEqual(response.data['total_amount'], '150.00')
+
+    def test_rollup_key_is_unique(self):
+        for category in (self.food, None):
+            with self.subTest(category=category):
+                with self.assertRaises(IntegrityError), db_transaction.atomic():
+                    TransactionMonthlyRollup.objects.create(
+                        cashbook=self.cashbook, month=date(2024, 1, 1), type=self.income,
+                        category=category, status='completed'
+                    )
+
+    def test_losing_the_create_race_updates_the_winner(self):
+        exists = QuerySet.exists
+
+        def create_first(queryset):
+            # Another writer inserts the row between the UPDATE and the INSERT
+            if queryset.model is Cashbook:
+                TransactionMonthlyRollup.objects.create(
+                    cashbook=self.cashbook, month=date(2024, 6, 1), type=self.income,
+                    category=None, status='completed', total_amount=Decimal('4.00'), transaction_count=1
+                )
+            return exists(queryset)
+
+        with mock.patch.object(QuerySet, 'exists', autospec=True, side_effect=create_first):
+            apply_monthly_delta(self.cashbook.pk, date(2024, 6, 1), self.income.pk, None, 'completed', Decimal('6.00'), 1)
+
+        self.assertEqual(
+            list(TransactionMonthlyRollup.objects.filter(month=date(2024, 6, 1)).values_list(
+                'total_amount', 'transaction_count'
+            )),
+            [(Decimal('10.00'), 2)]
+        )
+
+    def test_category_delete_merges_into_uncategorized(self):
+        # January has Food and uncategorized income rows with the same key otherwise
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.delete()
+
+        self.assertRollupsConsistent()
+        response = self.client.get('/api/transactions/summary/')
+        self.assertEqual(response.data['total_amount'], '150.00')
+
+    def test_sample_data_command_fills_rollups(self):
+        # bulk_create skips the signals, so the command rebuilds the rollup
+        call_command('create_sample_data', stdout=io.StringIO())
+        self.assertRollupsConsistent()
+
+        response = self.client.get('/api/transactions/summary/?start_date=2000-01-01&end_date=2100-12-31')
+        self.assertEqual(response.data['total_transactions'], Transaction.objects.count())
+
+
+class ConditionalListTests(TransactionTestMixin, TestCase):
+    """Polled lists answer a matching If-None-Match with 304 Not Modified"""
+
+    URLS = ['/api/transactions/', '/api/cashbooks/', '/api/transactions/balances/']
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.create_transaction()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return response, context.captured_queries
+
+    def assertNotModified(self, url, etag):
+        response, queries = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Only the validator's aggregate ran: no paginator count, no page
+        self.assertEqual(len([query for query in queries if 'COUNT(' in query['sql']]), 1)
+        self.assertFalse([query for query in queries if 'LIMIT 20' in query['sql']])
+
+    def test_unchanged_lists_return_304(self):
+        ledger = f'/api/transactions/by_cashbook/?cashbook={self.cashbook.pk}&running_balance=true'
+        for url in self.URLS + [ledger]:
+            with self.subTest(url=url):
+                first, _ = self.get(url)
+                self.assertEqual(first.status_code, 200)
+                self.assertTrue(first['ETag'].startswith('W/"'))
+                self.assertNotModified(url, first['ETag'])
+
+    def test_writes_change_the_etag(self):
+        etags = {url: self.get(url)[0]['ETag'] for url in self.URLS}
+        self.create_transaction(transaction_date=date(2024, 1, 16))
+        for url in self.URLS:
+            with self.subTest(url=url):
+                response, _ = self.get(url, etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_balance_etag_does_not_depend_on_local_generations(self):
+        # A write served by another worker bumps the generations in that
+        # worker's cache only; the snapshot's updated_at still moves
+        url = '/api/transactions/balances/'
+        etag = self.get(url)[0]['ETag']
+        transaction = Transaction.objects.get()
+        transaction.amount = Decimal('25.00')
+        with mock.patch('transactions.accumulator.invalidate_cashbooks'), \
+                self.captureOnCommitCallbacks(execute=True):
+            transaction.save()
+        response, _ = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['closing_balance'], '125.00')
+
+    def test_cashbook_rename_changes_transaction_etag(self):
+        etag = self.get('/api/transactions/')[0]['ETag']
+        self.cashbook.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cashbook.save()
+        response, _ = self.get('/api/transactions/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['cashbook_name'], 'Renamed')
+
+    def test_cursor_pages_validate_only_their_rows(self):
+        for day in range(2, 6):
+            self.create_transaction(transaction_date=date(2024, 1, day))
+        url = '/api/transactions/?pagination=cursor&page_size=2'
+        first, queries = self.get(url)
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+        # The aggregate is limited to the page window, never the whole list
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT 3', counts[0])
+        self.assertNotModified(url, first['ETag'])
+
+        # Rows on another page don't invalidate this one; rows on it do
+        oldest = Transaction.objects.get(transaction_date=date(2024, 1, 2))
+        newest = Transaction.objects.get(transaction_date=date(2024, 1, 15))
+        for transaction, status_code in [(oldest, 304), (newest, 200)]:
+            transaction.description = 'Edited'
+            with mock.patch('transactions.accumulator.invalidate_cashbooks'), \
+                    self.captureOnCommitCallbacks(execute=True):
+                transaction.save()
+            self.assertEqual(self.get(url, first['ETag'])[0].status_code, status_code)
+
+    def test_query_params_change_the_etag(self):
+        first, _ = self.get('/api/transactions/')
+        response, _ = self.get('/api/transactions/?status=pending', first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class SparseFieldsetTests(TransactionTestMixin, TestCase):
+    """?fields= limits the response and the query to the requested fields"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.transaction = self.create_transaction(category=TransactionCategory.objects.create(name='Food'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def page_query(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            sql for sql in self.selects_from(context.captured_queries, 'transactions_transaction')
+            if 'COUNT(' not in sql and not sql.startswith('SELECT 1 AS')
+        ]
+        self.assertEqual(len(queries), 1)
+        return response, queries[0]
+
+    def test_list_loads_only_requested_columns(self):
+        response, sql = self.page_query('/api/transactions/?fields=id,amount,transaction_date,type')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'amount', 'transaction_date', 'type'})
+        # Four columns, and no join beyond the store access filter
+        self.assertEqual(sql.split(' FROM ')[0].count(','), 3)
+        self.assertEqual(sql.count('JOIN'), 1)
+
+    def test_related_fields_join_only_what_they_read(self):
+        response, sql = self.page_query(f'/api/transactions/{self.transaction.pk}/?fields=id,store_name')
+        self.assertEqual(response.data, {'id': self.transaction.pk, 'store_name': 'Main Store'})
+        self.assertIn('"store_store"', sql)
+        self.assertNotIn('"accounts_user"', sql)
+        self.assertNotIn('"transactions_transactiontype"', sql)
+
+    def test_cursor_and_ledger_pages(self):
+        for url in [
+            '/api/transactions/?pagination=cursor&page_size=1&fields=id,amount',
+            f'/api/transactions/by_cashbook/?cashbook={self.cashbook.pk}&running_balance=true&fields=id,running_balance',
+        ]:
+            with self.subTest(url=url):
+                response, _ = self.page_query(url)
+                self.assertEqual(len(response.data['results'][0]), 2)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/transactions/?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
+
+
+class ValuesSerializerTests(TransactionTestMixin, TestCase):
+    """The .values() fast path renders the same JSON as TransactionListSerializer"""
+
+    def setUp(self):
+        super().setUp()
+        food = TransactionCategory.objects.create(name='Food')
+        self.create_transaction(category=food, description='Lunch', reference_number='R-1')
+        self.create_transaction(type=self.expense, status='pending', amount=Decimal('7.5'))
+
+    def test_output_matches_serializer(self):
+        queryset = Transaction.objects.order_by('id')
+        values = ValuesSerializer(TransactionListSerializer)
+        self.assertEqual(
+            JSONRenderer().render(values.many(values.values(queryset))),
+            JSONRenderer().render(TransactionListSerializer(queryset, many=True).data)
+        )
+
+    def test_list_builds_no_model_instances(self):
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with mock.patch.object(Transaction, 'from_db', side_effect=AssertionError):
+            response = client.get('/api/transactions/?pagination=cursor&page_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_benchmark_command(self):
+        output = io.StringIO()
+        call_command('benchmark_transaction_serializers', '--rows', '5', '10', '--repeat', '1', stdout=output)
+        self.assertIn('speedup', output.getvalue())
+        self.assertEqual(Transaction.objects.count(), 2)
+
+
+class TransactionSearchTests(TransactionTestMixin, TestCase):
+    """?search= goes through the full-text index, which follows every write"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.food = TransactionCategory.objects.create(name='Food')
+        self.lunch = self.create_transaction(description='Team lunch', category=self.food)
+        self.rent = self.create_transaction(description='Office rent', type=self.expense, reference_number='INV-42')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, value):
+        response = self.client.get('/api/transactions/', {'search': value})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_matches_word_prefixes_across_fields(self):
+        self.assertEqual(self.search('lun'), [self.lunch.pk])
+        self.assertEqual(self.search('inv 42'), [self.rent.pk])
+        self.assertEqual(self.search('food team'), [self.lunch.pk])
+        self.assertEqual(self.search('Rent'), [self.rent.pk])
+        self.assertEqual(self.search(str(self.rent.transaction_id)), [self.rent.pk])
+        self.assertEqual(self.search('"OR'), [])
+
+    def test_index_follows_writes(self):
+        self.lunch.description = 'Team dinner'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunch.save()
+        self.food.name = 'Meals'
+        self.food.save()
+        Transaction.objects.bulk_create([Transaction(
+            cashbook=self.cashbook, amount=Decimal('1.00'), type=self.income,
+            transaction_date=date(2024, 1, 1), created_by=self.user, description='Dinner tips'
+        )])
+
+        self.assertEqual(self.search('lunch'), [])
+        self.assertEqual(self.search('meals'), [self.lunch.pk])
+        self.assertEqual(len(self.search('dinner')), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunch.delete()
+        self.assertEqual(len(self.search('dinner')), 1)
+
+    def test_results_are_ranked(self):
+        best = self.create_transaction(description='Rent rent rent', transaction_date=date(2023, 1, 1))
+        self.assertEqual(self.search('rent')[0], best.pk)
+        # An explicit ordering wins over the rank
+        response = self.client.get('/api/transactions/?search=rent&ordering=transaction_date')
+        self.assertEqual(response.data['results'][0]['id'], best.pk)
+        response = self.client.get('/api/transactions/?search=rent&ordering=-transaction_date')
+        self.assertEqual(response.data['results'][-1]['id'], best.pk)
+
+    def test_reports_and_filterset_accept_search(self):
+        response = self.client.get('/api/transactions/by_type/?search=rent')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['type__name'] for row in response.data], ['Rent'])
+
+        filterset = TransactionFilter({'search': 'lunch'}, queryset=Transaction.objects.all())
+        self.assertEqual(list(filterset.qs), [self.lunch])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Plans are read with SQLite EXPLAIN QUERY PLAN')
+    def test_search_uses_the_fts_index(self):
+        queryset = search_transactions(Transaction.objects.all(), 'lunch')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertNotIn('SCAN transactions_transaction ', plan + ' ')
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE if connection.vendor == "sqlite" else POSTGRES_TABLE}')
+        self.assertEqual(self.search('lunch'), [])
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search('lunch'), [self.lunch.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Only SQLite rebuilds a table to alter it')
+class SearchTriggerMigrationTests(TransactionTestMixin, TransactionTestCase):
+    """The search index still follows writes after a schema change rebuilt the table"""
+
+    def sqlite_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            return {name for (name,) in cursor.fetchall()}
+
+    def alter_description(self, old_field, new_field):
+        with connection.schema_editor() as editor:
+            editor.alter_field(Transaction, old_field, new_field)
+
+    def restore_description(self, altered, original):
+        drop_search_triggers()
+        self.alter_description(altered, original)
+        install_search_triggers()
+
+    def test_index_follows_writes_after_table_rebuild(self):
+        lunch = Transaction.objects.create(
+            cashbook=self.cashbook, amount=Decimal('10.00'), type=self.income,
+            transaction_date=date(2024, 1, 15), created_by=self.user, description='Team lunch'
+        )
+        original = Transaction._meta.get_field('description')
+        altered = models.CharField(max_length=500, blank=True, null=True)
+        altered.set_attributes_from_name('description')
+        altered.model = Transaction
+
+        # What migrate does around a migration that alters the table
+        emit_pre_migrate_signal(0, False, 'default', plan=[(Migration('0010_alter_description', 'transactions'), False)])
+        self.alter_description(original, altered)
+        self.addCleanup(self.restore_description, altered, original)
+        self.assertEqual(self.sqlite_triggers(), set())
+        # Written while the index wasn't following
+        Transaction.objects.create(
+            cashbook=self.cashbook, amount=Decimal('5.00'), type=self.income,
+            transaction_date=date(2024, 1, 16), created_by=self.user, description='Dinner tips'
+        )
+
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertIn('transactions_transaction_fts_update', self.sqlite_triggers())
+
+        lunch.description = 'Team dinner'
+        lunch.save()
+        matches = search_transactions(Transaction.objects.all(), 'team dinner')
+        self.assertEqual(list(matches), [lunch])
+        self.assertEqual(search_transactions(Transaction.objects.all(), 'dinner').count(), 2)
+        self.assertFalse(search_transactions(Transaction.objects.all(), 'lunch').exists())
+
+
+class TransactionTagTests(TransactionTestMixin, TestCase):
+    """Tags are mirrored into the indexed tag table and filtered and grouped from it"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.lunch = self.create_transaction(amount=Decimal('30.00'), tags=['food', 'team'])
+        self.coffee = self.create_transaction(amount=Decimal('5.00'), tags=['food'])
+        self.rent = self.create_transaction(amount=Decimal('50.00'), type=self.expense)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def links(self, transaction):
+        return sorted(TransactionTag.objects.filter(transaction=transaction).values_list('tag__name', flat=True))
+
+    def ids(self, params):
+        response = self.client.get('/api/transactions/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['id'] for row in response.data['results'])
+
+    def test_links_follow_writes(self):
+        self.assertEqual(self.links(self.lunch), ['food', 'team'])
+        self.assertEqual(self.links(self.rent), [])
+
+        # In-place edits of the list are picked up too
+        self.lunch.tags.remove('team')
+        self.lunch.tags.append(' office ')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunch.save()
+        self.assertEqual(self.links(self.lunch), ['food', 'office'])
+
+        # Saves that leave the tags alone don't touch the links
+        self.lunch.amount = Decimal('31.00')
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            self.lunch.save()
+        self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transactiontag'), [])
+
+        response = self.client.post('/api/transactions/bulk_create/', {'transactions': [{
+            'cashbook': self.cashbook.id, 'amount': '2.00', 'type': self.income.id,
+            'transaction_date': '2024-01-20', 'tags': ['team', 'team', 'snacks'],
+        }]}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.links(Transaction.objects.get(amount=Decimal('2.00'))), ['snacks', 'team'])
+
+    def test_tag_filters(self):
+        self.assertEqual(self.ids({'tags': 'food'}), sorted([self.lunch.pk, self.coffee.pk]))
+        self.assertEqual(self.ids({'tags': 'team,missing'}), [self.lunch.pk])
+        self.assertEqual(self.ids({'tags_all': 'food,team'}), [self.lunch.pk])
+        self.assertEqual(self.ids({'tags_all': 'food,missing'}), [])
+
+        filterset = TransactionFilter({'tags_all': 'food'}, queryset=Transaction.objects.all())
+        self.assertEqual(sorted(filterset.qs.values_list('pk', flat=True)), sorted([self.lunch.pk, self.coffee.pk]))
+
+    def test_by_tag_totals(self):
+        response = self.client.get('/api/transactions/by_tag/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['tag__name'], row['total_amount'], row['transaction_count']) for row in response.data],
+            [('food', Decimal('35.00'), 2), ('team', Decimal('30.00'), 1)]
+        )
+
+        response = self.client.get('/api/transactions/by_tag/', {'tags': 'team'})
+        self.assertEqual([row['tag__name'] for row in response.data], ['food', 'team'])
+        self.assertEqual(response.data[0]['total_amount'], Decimal('30.00'))
+
+    def test_rebuild_command(self):
+        Transaction.objects.filter(pk=self.rent.pk).update(tags=['rent'])
+        TransactionTag.objects.filter(transaction=self.lunch).delete()
+
+        call_command('rebuild_transaction_tags', stdout=io.StringIO())
+        self.assertEqual(self.links(self.lunch), ['food', 'team'])
+        self.assertEqual(self.links(self.rent), ['rent'])
+        self.assertEqual(TransactionTag.objects.count(), 4)
+
+
+class LatestBalanceTests(TransactionTestMixin, TestCase):
+    """balances/latest returns each cashbook's newest snapshot with one fixed-size query"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_latest(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/transactions/balances/latest/')
+        self.assertEqual(response.status_code, 200)
+        return response, self.selects_from(context.captured_queries, 'transactions_cashbookbalance')
+
+    def test_latest_snapshot_per_accessible_cashbook(self):
+        other = Cashbook.objects.create(store=self.store, name='Petty Cash')
+        hidden = Cashbook.objects.create(store=Store.objects.create(name='Other Store'), name='Hidden')
+        self.create_transaction(transaction_date=date(2024, 1, 10))
+        self.create_transaction(transaction_date=date(2024, 2, 1), amount=Decimal('5.00'))
+        self.create_transaction(cashbook=other, transaction_date=date(2024, 1, 20))
+        self.create_transaction(cashbook=hidden, transaction_date=date(2024, 3, 1))
+
+        response, queries = self.get_latest()
+        self.assertEqual(
+            sorted((row['cashbook'], row['date'], row['closing_balance']) for row in response.data),
+            [(self.cashbook.pk, '2024-02-01', '115.00'), (other.pk, '2024-01-20', '10.00')]
+        )
+        self.assertEqual(len(queries), 1)
+
+        # More cashbooks don't make the query any longer
+        for index in range(5):
+            self.create_transaction(cashbook=Cashbook.objects.create(store=self.store, name=f'Till {index}'))
+        response, more_queries = self.get_latest()
+        self.assertEqual(len(response.data), 7)
+        self.assertEqual(len(more_queries[0]), len(queries[0]))
+        self.assertNotIn(' OR ', more_queries[0])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_latest_balances', cashbooks=[2, 5], days=3, repeat=1, stdout=out)
+        self.assertIn('rolled back', out.getvalue())
+        self.assertFalse(Cashbook.objects.filter(name__startswith='Benchmark').exists())
+
+
+class CashFlowTimeseriesTests(TransactionTestMixin, TestCase):
+    """timeseries returns gap-filled buckets computed with a grouped query"""
+
+    def setUp(self):
+        super().setUp()
+        StoreUser.objects.create(store=self.store, user=self.user, role='owner')
+        self.food = TransactionCategory.objects.create(name='Food')
+        for day, amount, kwargs in [
+            (date(2024, 1, 1), '10.00', {'category': self.food}),
+            (date(2024, 1, 1), '5.00', {}),
+            (date(2024, 1, 3), '4.00', {'type': self.expense}),
+            (date(2024, 2, 14), '20.00', {'category': self.food}),
+        ]:
+            self.create_transaction(transaction_date=day, amount=Decimal(amount), **kwargs)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        response = self.client.get('/api/transactions/timeseries/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_daily_buckets_are_gap_filled(self):
+        data = self.get(start_date='2024-01-01', end_date='2024-01-04')
+        self.assertEqual(len(data['series']), 1)
+        self.assertEqual(
+            [(b['period'], b['income'], b['expense'], b['net'], b['transaction_count'])
+             for b in data['series'][0]['buckets']],
+            [
+                ('2024-01-01', Decimal('15.00'), Decimal('0.00'), Decimal('15.00'), 2),
+                ('2024-01-02', Decimal('0.00'), Decimal('0.00'), Decimal('0.00'), 0),
+                ('2024-01-03', Decimal('0.00'), Decimal('4.00'), Decimal('-4.00'), 1),
+                ('2024-01-04', Decimal('0.00'), Decimal('0.00'), Decimal('0.00'), 0),
+            ]
+        )
+
+    def test_weekly_and_monthly_intervals(self):
+        # Without a range the buckets span the transactions; weeks start on Monday
+        weeks = self.get(interval='week')['series'][0]['buckets']
+        self.assertEqual((weeks[0]['period'], weeks[-1]['period'], len(weeks)), ('2024-01-01', '2024-02-12', 7))
+        self.assertEqual(sum(week['transaction_count'] for week in weeks), 4)
+
+        # Whole months come from the rollup table
+        with CaptureQueriesContext(connection) as context:
+            months = self.get(interval='month', start_date='2024-01-01', end_date='2024-03-31')
+        self.assertEqual(self.selects_from(context.captured_queries, 'transactions_transaction'), [])
+        self.assertEqual(
+            [(b['period'], b['income'], b['expense']) for b in months['series'][0]['buckets']],
+            [
+                ('2024-01-01', Decimal('15.00'), Decimal('4.00')),
+                ('2024-02-01', Decimal('20.00'), Decimal('0.00')),
+                ('2024-03-01', Decimal('0.00'), Decimal('0.00')),
+            ]
+        )
+        # Partial edge months are read from transactions and give the same buckets
+        partial = self.get(interval='month', start_date='2024-01-02', end_date='2024-02-20')
+        self.assertEqual(
+            [(b['period'], b['income'], b['expense']) for b in partial['series'][0]['buckets']],
+            [('2024-01-01', Decimal('0.00'), Decimal('4.00')), ('2024-02-01', Decimal('20.00'), Decimal('0.00'))]
+        )
+
+    def test_group_by(self):
+        data = self.get(group_by='category', interval='month')
+        self.assertEqual(
+            [(series['category__name'], [b['total_amount'] for b in series['buckets']]) for series in data['series']],
+            [('Food', [Decimal('10.00'), Decimal('20.00')]), (None, [Decimal('9.00'), Decimal('0.00')])]
+        )
+
+        data = self.get(group_by='nature', cashbook=self.cashbook.pk, start_date='2024-01-03', end_date='2024-01-03')
+        self.assertEqual([series['type__nature'] for series in data['series']], ['expense'])
+
+    def test_invalid_params(self):
+        for params in [
+            {'interval': 'hour'},
+            {'group_by': 'status'},
+            {'start_date': '2024-13-01'},
+            {'start_date': '2020-01-01', 'end_date': '2024-12-31'},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/transactions/timeseries/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
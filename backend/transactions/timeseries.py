@@ -0,0 +1,163 @@
+# backend/transactions/timeseries.py
+"""
+Time-bucketed cash-flow series for charts.
+
+Transactions are grouped by a truncated transaction date (Trunc ... GROUP
+BY in the database), optionally per type nature, category or cashbook, and
+the missing buckets between the first and the last one are filled with
+zeros. The response therefore grows with the number of buckets and
+groups, never with the number of transactions.
+
+Monthly series read whole months from the monthly rollup table like the
+other reports (see transactions.rollups); daily and weekly series read the
+transactions table.
+"""
+from datetime import timedelta
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Trunc
+
+from .balance import ZERO
+
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+INTERVALS = (DAY, WEEK, MONTH)
+
+# ?group_by= values and the lookups each series is keyed by
+GROUP_BY = {
+    'nature': ['type__nature'],
+    'category': ['category__id', 'category__name'],
+    'cashbook': ['cashbook__id', 'cashbook__name'],
+}
+
+# Upper bound on buckets per series, to keep responses small
+MAX_BUCKETS = 1000
+
+
+class TooManyBuckets(ValueError):
+    pass
+
+
+def bucket_start(value, interval):
+    """First day of the bucket value falls in (weeks start on Monday, like TruncWeek)"""
+    if interval == WEEK:
+        return value - timedelta(days=value.weekday())
+    if interval == MONTH:
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value, interval):
+    """First day of the bucket after the one starting at value"""
+    if interval == WEEK:
+        return value + timedelta(days=7)
+    if interval == MONTH:
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+def bucket_range(start, end, interval):
+    """
+    Bucket start dates from the bucket of start to the bucket of end.
+
+    Raises:
+        TooManyBuckets: The range has more than MAX_BUCKETS buckets
+    """
+    buckets = []
+    current = bucket_start(start, interval)
+    while current <= end:
+        if len(buckets) >= MAX_BUCKETS:
+            raise TooManyBuckets(
+                f'More than {MAX_BUCKETS} {interval} buckets; narrow the date range or use a longer interval'
+            )
+        buckets.append(current)
+        current = next_bucket(current, interval)
+    return buckets
+
+
+def cash_flow_series(rollups, transactions, interval, group_by=None, start=None, end=None):
+    """
+    Income, expense and net per bucket, one series per group.
+
+    Args:
+        rollups: TransactionMonthlyRollup queryset for whole months, or None
+            (only used with interval=MONTH)
+        transactions: Transaction queryset with every filter applied, or None
+        interval: One of INTERVALS
+        group_by: Key of GROUP_BY, or None for a single series
+        start: First date to fill buckets from (default: first bucket with data)
+        end: Last date to fill buckets to (default: last bucket with data)
+
+    Returns:
+        dict with interval, group_by, start_date, end_date (bucket starts)
+        and series, largest total first; every series has the group's
+        lookups and one entry per bucket
+
+    Raises:
+        TooManyBuckets: The range has more than MAX_BUCKETS buckets
+    """
+    from .models import TransactionType
+
+    fields = GROUP_BY[group_by] if group_by else []
+    # A closed range is checked before anything is queried
+    buckets = bucket_range(start, end, interval) if start and end else None
+
+    sources = []
+    if rollups is not None:
+        sources.append((rollups.annotate(period=F('month')), 'total_amount', Sum('transaction_count')))
+    if transactions is not None:
+        period = Trunc('transaction_date', interval, output_field=DateField())
+        sources.append((transactions.annotate(period=period), 'amount', Count('id')))
+
+    groups = {}
+    for queryset, amount, count in sources:
+        # Aliases differ from the rollup's column names, which they would shadow
+        rows = queryset.values('period', *fields).annotate(
+            amount_sum=Sum(amount),
+            income_sum=Sum(amount, filter=Q(type__nature=TransactionType.INCOME)),
+            expense_sum=Sum(amount, filter=Q(type__nature=TransactionType.EXPENSE)),
+            row_count=count,
+        ).order_by()
+        for row in rows:
+            key = tuple(row[field] for field in fields)
+            group = groups.setdefault(key, {})
+            totals = group.setdefault(row['period'], [ZERO, ZERO, ZERO, 0])
+            totals[0] += row['amount_sum'] or 0
+            totals[1] += row['income_sum'] or 0
+            totals[2] += row['expense_sum'] or 0
+            totals[3] += row['row_count']
+
+    if buckets is None:
+        periods = [period for group in groups.values() for period in group]
+        first = start or (min(periods) if periods else None)
+        last = end or (max(periods) if periods else None)
+        buckets = bucket_range(first, last, interval) if first and last else []
+    if not fields and not groups:
+        groups[()] = {}
+
+    series = []
+    for key, group in groups.items():
+        entry = dict(zip(fields, key))
+        entry['buckets'] = []
+        for bucket in buckets:
+            total_amount, income, expense, count = group.get(bucket, (ZERO, ZERO, ZERO, 0))
+            entry['buckets'].append({
+                'period': bucket.isoformat(),
+                'income': income,
+                'expense': expense,
+                'net': income - expense,
+                'total_amount': total_amount,
+                'transaction_count': count,
+            })
+        entry['total_amount'] = sum((bucket['total_amount'] for bucket in entry['buckets']), ZERO)
+        series.append(entry)
+    series.sort(key=lambda entry: entry['total_amount'], reverse=True)
+
+    return {
+        'interval': interval,
+        'group_by': group_by,
+        'start_date': buckets[0].isoformat() if buckets else None,
+        'end_date': buckets[-1].isoformat() if buckets else None,
+        'series': series,
+    }
@@ -11,8 +11,9 @@ from .views import (
 router = DefaultRouter()
 router.register(r'types', TransactionTypeViewSet, basename='transaction-type')
 router.register(r'categories', TransactionCategoryViewSet, basename='transaction-category')
-router.register(r'', TransactionViewSet, basename='transaction')
 router.register(r'balances', CashbookBalanceViewSet, basename='cashbook-balance')
+# Registered last: its detail route would otherwise match the prefixes above
+router.register(r'', TransactionViewSet, basename='transaction')
 
 app_name = 'transactions'
 
@@ -1,10 +1,10 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q, Sum, Count, Avg
+from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from rest_framework.permissions import AllowAny
 from datetime import datetime, timedelta
@@ -18,12 +18,14 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+import io
 import json
 from rest_framework.decorators import action
 
 from decimal import Decimal
-from .models import TransactionType, TransactionCategory, Transaction, CashbookBalance
-from store.models import StoreUser, Cashbook
+from .models import TransactionType, TransactionCategory, Transaction, CashbookBalance, TransactionTag
+from store.models import Cashbook
+from store.access import get_store_ids, has_store_access
 from .serializers import (
     TransactionTypeSerializer,
     TransactionCategorySerializer,
@@ -32,8 +34,20 @@ from .serializers import (
     TransactionCreateUpdateSerializer,
     TransactionBulkCreateSerializer,
     TransactionSummarySerializer,
+    TransactionLedgerSerializer,
     CashbookBalanceSerializer
 )
+from .balance import annotate_running_balance
+from .rollups import group_totals, rollup_sources, summary_totals
+from .snapshots import latest_snapshots
+from .timeseries import DAY, GROUP_BY, INTERVALS, MONTH, TooManyBuckets, cash_flow_series
+from .pagination import TransactionCursorPagination
+from .conditional import ConditionalListMixin
+from .fieldsets import FIELDS_PARAM, parse_fields, prune_queryset
+from .fast_serializers import ValuesSerializer
+from .filters import TransactionListFilter, TransactionSearchFilter
+from .importers import ImportFileError, TransactionImporter, detect_format, iter_rows
+from . import report_cache
 
 
 class TransactionTypeViewSet(viewsets.ModelViewSet):
@@ -117,7 +131,7 @@ class TransactionCategoryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing transactions with comprehensive filtering and reporting
     
@@ -137,18 +151,77 @@ class TransactionViewSet(viewsets.ModelViewSet):
     - recent: Get recent transactions
     - pending: Get pending transactions
     - bulk_create: Create multiple transactions at once
+    - import: Import transactions from a CSV or XLSX file
     - export: Export transactions (returns data ready for CSV/Excel)
+    - by_tag: Get transactions grouped by tag with totals
+    - timeseries: Get income and expense per day, week or month for charts
+    
+    Reports:
+    - summary, by_category and by_type read whole months from the monthly
+      rollup table and only partial months at the ends of the date range
+      from transactions
+    - their responses are served from the report cache until a transaction
+      in one of the covered stores changes; the X-Report-Cache header says
+      whether a response was a hit or a miss
+    - timeseries groups by the truncated date in the database and fills
+      empty buckets with zeros, so its size follows the number of buckets;
+      monthly series read whole months from the rollup table
+    - by_tag joins the indexed tag table (see transactions.tags); a
+      transaction with several tags counts towards each of them
+    
+    Tags:
+    - ?tags=a,b keeps transactions tagged a or b, ?tags_all=a,b those
+      tagged with both; both read the indexed tag table, not the JSON
+    
+    Pagination:
+    - Page numbers by default (?page=N)
+    - ?pagination=cursor on list, by_store, by_cashbook, by_date_range, recent
+      and pending switches to keyset pagination: no COUNT(*), constant cost
+      per page, follow the next/previous links
+    
+    Search:
+    - ?search= matches word prefixes in the description, reference number
+      and cashbook, type and category names through a full-text index
+      (see transactions.search), best match first unless ?ordering= is
+      given; a full transaction_id finds that transaction
+    
+    Serialization:
+    - list and the JSON export build their rows from .values() instead of
+      model instances (see transactions.fast_serializers); the output is
+      the same as TransactionListSerializer's
+    
+    Sparse fieldsets:
+    - ?fields=id,amount,transaction_date,type on retrieve and the list
+      endpoints returns only those fields; the query loads only their
+      columns and joins only the relations they read
+    
+    Conditional GET:
+    - list, by_store, by_cashbook, by_date_range, recent and pending send a
+      weak ETag and answer a matching If-None-Match with 304 Not Modified
+      without loading the page (see transactions.conditional)
     """
     queryset = Transaction.objects.select_related(
         'cashbook', 'cashbook__store', 'type', 'category', 'created_by', 'updated_by'
     ).all()
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['cashbook', 'type', 'category', 'transaction_date', 'created_by','status']
-    search_fields = ['description', 'reference_number', 'cashbook__name', 'created_by','transaction_id']
+    # Search runs last: it orders by rank when no ?ordering= is given
+    filter_backends = [DjangoFilterBackend, OrderingFilter, TransactionSearchFilter]
+    filterset_class = TransactionListFilter
     ordering_fields = ['transaction_date', 'amount', 'created_at', 'created_by', 'updated_at']
     ordering = ['-transaction_date', '-created_at']
 
+    # List endpoints that accept ?pagination=cursor (keyset pagination)
+    CURSOR_PAGINATED_ACTIONS = ['list', 'by_store', 'by_cashbook', 'by_date_range', 'recent', 'pending']
+
+    # Read endpoints that accept ?fields= (sparse fieldsets)
+    SPARSE_FIELDSET_ACTIONS = CURSOR_PAGINATED_ACTIONS + ['retrieve']
+
+    # Filters that drop rows from a cashbook ledger, which would make a
+    # running balance meaningless
+    RUNNING_BALANCE_CONFLICTING_PARAMS = [
+        'type', 'category', 'transaction_date', 'created_by', 'status', 'search', 'tags', 'tags_all'
+    ]
+
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
         if self.action in ['create', 'update', 'partial_update']:
@@ -157,18 +230,50 @@ class TransactionViewSet(viewsets.ModelViewSet):
             return TransactionListSerializer
         elif self.action == 'bulk_create':
             return TransactionBulkCreateSerializer
+        elif self.action == 'by_cashbook' and self._wants_running_balance():
+            return TransactionLedgerSerializer
         return TransactionDetailSerializer
 
+    @property
+    def paginator(self):
+        """
+        Page-number pagination by default; keyset pagination ordered by
+        (-transaction_date, -created_at, id) when ?pagination=cursor is
+        passed to one of the list endpoints.
+        """
+        if not hasattr(self, '_paginator') and self._wants_cursor_pagination():
+            self._paginator = TransactionCursorPagination()
+        return super().paginator
+
     def get_queryset(self):
         """Filter transactions by user's store access"""
         queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Get store IDs that the user has access to
-        user_store_ids = StoreUser.objects.filter(user=user).values_list('store_id', flat=True)
         
         # Filter transactions by accessible stores
-        return queryset.filter(cashbook__store_id__in=user_store_ids)
+        queryset = queryset.filter(cashbook__store_id__in=get_store_ids(self.request.user))
+        
+        fields = self._requested_fields()
+        if fields:
+            serializer = self.get_serializer_class()(context={FIELDS_PARAM: fields})
+            queryset = prune_queryset(
+                queryset, serializer.fields,
+                annotations=['running_balance'] if self._wants_running_balance() else [],
+                # The cursor is read from the last row of the page
+                always=TransactionCursorPagination.position_fields if self._wants_cursor_pagination() else [],
+            )
+        return queryset
+
+    def get_serializer_context(self):
+        """Pass the ?fields= selection on to the serializer"""
+        context = super().get_serializer_context()
+        fields = self._requested_fields()
+        if fields:
+            context[FIELDS_PARAM] = fields
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """List transactions (filtered by user's store access)"""
+        return self._paginated_response(self.filter_queryset(self.get_queryset()))
 
     def perform_create(self, serializer):
         """Set created_by when creating transaction"""
@@ -179,20 +284,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer.save()
 
     def perform_destroy(self, instance):
-        """Reverse balance changes before deleting transaction"""
-        cashbook = instance.cashbook
-        amount = instance.amount
-        nature = instance.type.nature
-        
-        # Reverse the balance effect
-        if nature == 'income':
-            cashbook.current_balance -= amount
-        elif nature == 'expense':
-            cashbook.current_balance += amount
-        
-        cashbook.save(update_fields=['current_balance', 'updated_at'])
-        
-        # Delete the transaction
+        """Delete transaction; the delete signal reverses its balance effect"""
         instance.delete()
 
     @action(detail=False, methods=['get'])
@@ -201,21 +293,11 @@ class TransactionViewSet(viewsets.ModelViewSet):
         Get transaction summary with totals and statistics
         Query params: store, cashbook, start_date, end_date
         """
-        queryset = self._apply_filters(request, self.get_queryset())
-        
+        return self._cached_report(request, self._build_summary)
+
+    def _build_summary(self, request):
         # Calculate summary statistics
-        summary_data = queryset.aggregate(
-            total_transactions=Count('id'),
-            total_amount=Sum('amount'),
-            total_income=Sum('amount', filter=Q(type__nature='income')),
-            total_expense=Sum('amount', filter=Q(type__nature='expense')),
-            average_transaction=Avg('amount')
-        )
-        
-        # Handle None values
-        for key in ['total_amount', 'total_income', 'total_expense', 'average_transaction']:
-            if summary_data[key] is None:
-                summary_data[key] = 0
+        summary_data = summary_totals(*self._report_sources(request))
         
         # Calculate net balance
         summary_data['net_balance'] = (summary_data['total_income'] or 0) - (summary_data['total_expense'] or 0)
@@ -225,7 +307,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
         summary_data['period_end'] = request.query_params.get('end_date')
         
         serializer = TransactionSummarySerializer(summary_data)
-        return Response(serializer.data)
+        return dict(serializer.data)
 
     @action(detail=False, methods=['get'])
     def by_store(self, request):
@@ -251,7 +333,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def by_cashbook(self, request):
-        """Get transactions for a specific cashbook"""
+        """
+        Get transactions for a specific cashbook
+        Query params:
+        - cashbook: Cashbook ID (required)
+        - running_balance: 'true' to add the cashbook balance after each
+          transaction (can be combined with start_date/end_date only)
+        """
         cashbook_id = request.query_params.get('cashbook')
         if not cashbook_id:
             return Response(
@@ -277,6 +365,35 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 )
         
         queryset = self._apply_filters(request, queryset)
+        
+        if self._wants_running_balance():
+            conflicting = [
+                param for param in self.RUNNING_BALANCE_CONFLICTING_PARAMS
+                if request.query_params.get(param)
+            ]
+            if conflicting:
+                return Response(
+                    {"error": f"running_balance can only be combined with start_date/end_date, "
+                              f"not with: {', '.join(conflicting)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # The cursor condition would hide earlier rows from the running sum
+            if self._wants_cursor_pagination():
+                return Response(
+                    {"error": "running_balance is only available with page-number pagination"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            try:
+                opening_balance = self._get_opening_balance(cashbook_id, request.query_params.get('start_date'))
+            except ValueError as e:
+                return Response(
+                    {"error": f"Invalid date format: {str(e)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = annotate_running_balance(queryset, opening_balance)
+        
         return self._paginated_response(queryset)
 
     @action(detail=False, methods=['get'])
@@ -342,6 +459,43 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def import_file(self, request):
+        """
+        Import transactions from an uploaded CSV or XLSX file
+        Form fields:
+        - file: the .csv or .xlsx file (header row required; columns: cashbook,
+          amount, type, category, description, reference_number,
+          transaction_date, value_date, status, tags)
+        - cashbook: optional cashbook id or name for rows without one
+        - format: optional 'csv' or 'xlsx' when the file name has no extension
+        Valid rows are created; invalid rows are reported by row number.
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response(
+                {"error": "A CSV or XLSX file is required in the 'file' field"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            import_format = detect_format(upload, request.data.get('format'))
+            importer = TransactionImporter(request, default_cashbook=request.data.get('cashbook'))
+            summary = importer.run(iter_rows(upload, import_format))
+        except ImportFileError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if summary['total_rows'] == 0:
+            return Response(
+                {"error": "The file contains no transaction rows"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            summary,
+            status=status.HTTP_201_CREATED if summary['created'] else status.HTTP_400_BAD_REQUEST
+        )
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def export(self, request):
         """
@@ -410,12 +564,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
     
     def _export_json(self, queryset, filters_applied, user):
         """Export transactions as JSON"""
-        serializer = TransactionListSerializer(queryset, many=True)
+        values = ValuesSerializer(TransactionListSerializer)
+        data = values.many(values.values(queryset))
         
         response_data = {
             "success": True,
-            "count": queryset.count(),
-            "data": serializer.data,
+            "count": len(data),
+            "data": data,
             "exported_at": timezone.now().isoformat(),
             "exported_by": user.username,
             "filters_applied": filters_applied,
@@ -627,7 +782,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
     def _get_applied_filters(self, request):
         """Get dictionary of applied filters"""
         filters_applied = {}
-        filter_params = ['store', 'cashbook', 'start_date', 'end_date', 'type', 'category', 'status']
+        filter_params = ['store', 'cashbook', 'start_date', 'end_date', 'type', 'category', 'status', 'tags', 'tags_all']
         
         for param in filter_params:
             value = request.query_params.get(param)
@@ -638,30 +793,90 @@ class TransactionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """Get transactions grouped by category with totals"""
-        queryset = self._apply_filters(request, self.get_queryset())
-        
-        category_summary = queryset.values(
-            'category__name', 'category__id'
-        ).annotate(
-            total_amount=Sum('amount'),
-            transaction_count=Count('id')
-        ).order_by('-total_amount')
-        
-        return Response(list(category_summary))
+        return self._cached_report(request, self._build_category_summary)
+
+    def _build_category_summary(self, request):
+        return group_totals(*self._report_sources(request), ['category__name', 'category__id'])
 
     @action(detail=False, methods=['get'])
     def by_type(self, request):
         """Get transactions grouped by type with totals"""
+        return self._cached_report(request, self._build_type_summary)
+
+    def _build_type_summary(self, request):
+        return group_totals(*self._report_sources(request), ['type__name', 'type__id', 'type__nature'])
+
+    @action(detail=False, methods=['get'])
+    def by_tag(self, request):
+        """Get transactions grouped by tag with totals"""
+        return self._cached_report(request, self._build_tag_summary)
+
+    def _build_tag_summary(self, request):
+        # The rollup has no tag column, so this always reads the tag links
         queryset = self._apply_filters(request, self.get_queryset())
+        rows = TransactionTag.objects.filter(
+            transaction_id__in=queryset.values('pk')
+        ).values('tag__name', 'tag__id').annotate(
+            total_amount=Sum('transaction__amount'),
+            transaction_count=Count('transaction_id')
+        ).order_by('-total_amount', 'tag__name')
+        return list(rows)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def report_cache_stats(self, request):
+        """
+        Get the report cache hit/miss counters as seen by the serving
+        process (staff only)
+        """
+        return Response(report_cache.get_stats())
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Get income, expense and net per time bucket, for charts
+        Query params:
+        - interval: day (default), week or month
+        - group_by: nature, category or cashbook for one series per group
+        - start_date, end_date: range to fill empty buckets over (default:
+          the first to the last bucket with transactions)
+        - store, cashbook and the other transaction filters
+        """
+        interval = request.query_params.get('interval', DAY)
+        if interval not in INTERVALS:
+            return Response(
+                {"error": f"interval must be one of: {', '.join(INTERVALS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        type_summary = queryset.values(
-            'type__name', 'type__id', 'type__nature'
-        ).annotate(
-            total_amount=Sum('amount'),
-            transaction_count=Count('id')
-        ).order_by('-total_amount')
+        group_by = request.query_params.get('group_by') or None
+        if group_by is not None and group_by not in GROUP_BY:
+            return Response(
+                {"error": f"group_by must be one of: {', '.join(GROUP_BY)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response(list(type_summary))
+        try:
+            start, end = (
+                datetime.strptime(value, '%Y-%m-%d').date() if value else None
+                for value in (request.query_params.get('start_date'), request.query_params.get('end_date'))
+            )
+        except ValueError as e:
+            return Response(
+                {"error": f"Invalid date format: {str(e)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def build(request):
+            if interval == MONTH:
+                rollups, transactions = self._report_sources(request)
+            else:
+                rollups, transactions = None, self._apply_filters(request, self.get_queryset())
+            return cash_flow_series(rollups, transactions, interval, group_by, start, end)
+        
+        try:
+            return self._cached_report(request, build)
+        except TooManyBuckets as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     # Helper methods
     def _apply_filters(self, request, queryset):
@@ -690,12 +905,87 @@ class TransactionViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def _report_sources(self, request):
+        """
+        (rollups, transactions) a report is computed from: monthly rollup
+        rows for whole months plus the transactions of partial edge months,
+        or only transactions when a filter has no rollup column
+        """
+        queryset = self._apply_filters(request, self.get_queryset())
+        return rollup_sources(queryset, request.query_params, get_store_ids(request.user))
+
+    def _cached_report(self, request, build):
+        """
+        Serve a report from the report cache, building it with build(request)
+        on a miss. The key covers the stores the report can include: the
+        ?store param when given (it narrows the user's stores to one),
+        otherwise every store the user can see.
+        """
+        store_ids = get_store_ids(request.user)
+        store_param = request.query_params.get('store')
+        if store_param:
+            store_ids = [store_id for store_id in store_ids if str(store_id) == store_param]
+        
+        key = report_cache.build_key(self.action, store_ids, request.query_params)
+        data, hit = report_cache.get_or_compute(key, lambda: build(request))
+        
+        response = Response(data)
+        response['X-Report-Cache'] = 'hit' if hit else 'miss'
+        return response
+
+    def _requested_fields(self):
+        """Field names from ?fields=, or None when all fields are wanted"""
+        if self.action not in self.SPARSE_FIELDSET_ACTIONS:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            available = self.get_serializer_class()().fields
+            self._sparse_fields = parse_fields(self.request.query_params.get(FIELDS_PARAM), available)
+        return self._sparse_fields
+
+    def _wants_running_balance(self):
+        """Check if the running balance column was requested"""
+        return self.request.query_params.get('running_balance') == 'true'
+
+    def _wants_cursor_pagination(self):
+        """Check if keyset pagination was requested on a list endpoint"""
+        return (
+            self.action in self.CURSOR_PAGINATED_ACTIONS
+            and self.request.query_params.get('pagination') == 'cursor'
+        )
+
+    def _get_opening_balance(self, cashbook_id, start_date=None):
+        """
+        Balance a running-balance ledger starts from: the initial balance, or
+        the balance at the end of the day before start_date.
+        """
+        cashbook = Cashbook.objects.get(id=cashbook_id)
+        if not start_date:
+            return cashbook.initial_balance
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        return cashbook.balance_at(start_date - timedelta(days=1))
+
     def _verify_store_access(self, user, store_id):
         """Verify user has access to a store"""
-        return StoreUser.objects.filter(user=user, store_id=store_id).exists()
+        return has_store_access(user, store_id)
+
+    def get_etag_queryset(self, queryset):
+        """
+        Keyset pages are validated by the rows of the page window only, so
+        they keep their constant cost: no aggregate over the whole list
+        """
+        if not self._wants_cursor_pagination():
+            return queryset
+        window = self.paginator.page_window(queryset, self.request)
+        return queryset.model.objects.filter(pk__in=window.values('pk'))
 
     def _paginated_response(self, queryset):
-        """Return paginated response"""
+        """Return paginated response, or 304 when the client's copy is current"""
+        return self.conditional_response(queryset, lambda: self._render_page(queryset))
+    
+    def _render_page(self, queryset):
+        if self.get_serializer_class() is TransactionListSerializer:
+            return self._render_values_page(queryset)
+        
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -703,13 +993,27 @@ class TransactionViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
+    
+    def _render_values_page(self, queryset):
+        """Paginate and serialize .values() rows instead of model instances"""
+        values = ValuesSerializer(TransactionListSerializer, self.get_serializer_context())
+        extra = []
+        if self._wants_cursor_pagination():
+            # The cursor is read from the last row of the page
+            extra = ['id', *TransactionCursorPagination.position_fields]
+        rows = values.values(queryset, extra=extra)
+        
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values.many(page))
+        return Response(values.many(rows))
 
 
-class CashbookBalanceViewSet(viewsets.ReadOnlyModelViewSet):
+class CashbookBalanceViewSet(ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing cashbook balances (read-only)
     
-    list: Get all cashbook balances
+    list: Get all cashbook balances (answers a matching If-None-Match with 304)
     retrieve: Get a specific cashbook balance
     
     Custom actions:
@@ -728,10 +1032,7 @@ class CashbookBalanceViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Filter by user's store access"""
         queryset = super().get_queryset()
-        user = self.request.user
-        
-        user_store_ids = StoreUser.objects.filter(user=user).values_list('store_id', flat=True)
-        return queryset.filter(cashbook__store_id__in=user_store_ids)
+        return queryset.filter(cashbook__store_id__in=get_store_ids(self.request.user))
 
     @action(detail=False, methods=['get'])
     def by_cashbook(self, request):
@@ -749,21 +1050,9 @@ class CashbookBalanceViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def latest(self, request):
-        """Get the latest balance for each cashbook"""
-        from django.db.models import Max
-        
-        queryset = self.get_queryset()
-        
-        # Get latest date for each cashbook
-        latest_dates = queryset.values('cashbook').annotate(
-            latest_date=Max('date')
-        )
-        
-        # Build Q objects for filtering
-        q_objects = Q()
-        for item in latest_dates:
-            q_objects |= Q(cashbook=item['cashbook'], date=item['latest_date'])
-        
-        latest_balances = queryset.filter(q_objects)
+        """Get the latest balance for each cashbook, in a single query"""
+        # Store access is applied to the cashbooks, see latest_snapshots
+        cashbooks = Cashbook.objects.filter(store_id__in=get_store_ids(request.user))
+        latest_balances = latest_snapshots(cashbooks).select_related('cashbook', 'cashbook__store')
         serializer = self.get_serializer(latest_balances, many=True)
         return Response(serializer.data)
\ No newline at end of file